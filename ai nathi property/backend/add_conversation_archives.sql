@@ -0,0 +1,28 @@
+-- Conversation archival: conversations idle past CONVERSATION_IDLE_DAYS are
+-- summarized and their messages moved out of conversation_messages into one
+-- archive row (gzipped NDJSON, base64 encoded).
+-- Run this in your Supabase SQL editor on databases created before
+-- conversation archival. Safe to run more than once.
+
+CREATE TABLE IF NOT EXISTS conversation_archives (
+    conversation_id UUID PRIMARY KEY,
+    user_id TEXT,
+    summary TEXT NOT NULL,
+    message_count INTEGER NOT NULL DEFAULT 0,
+    first_message_at TIMESTAMP WITH TIME ZONE,
+    last_message_at TIMESTAMP WITH TIME ZONE,
+    messages TEXT NOT NULL,
+    archived_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_conversation_archives_user_id ON conversation_archives(user_id);
+
+-- History reads filter by conversation and order by timestamp
+CREATE INDEX IF NOT EXISTS idx_conversation_messages_conversation_timestamp
+    ON conversation_messages(conversation_id, timestamp);
+
+ALTER TABLE conversation_archives ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Allow all operations on conversation_archives" ON conversation_archives;
+CREATE POLICY "Allow all operations on conversation_archives" ON conversation_archives
+    FOR ALL USING (true);
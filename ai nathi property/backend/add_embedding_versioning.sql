@@ -0,0 +1,24 @@
+-- Embedding lifecycle: one row per (content, chunk, model)
+-- Run this in your Supabase SQL editor on databases created before chunked,
+-- versioned embeddings. Safe to run more than once.
+
+ALTER TABLE vector_embeddings ADD COLUMN IF NOT EXISTS chunk_index INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE vector_embeddings ADD COLUMN IF NOT EXISTS model TEXT NOT NULL DEFAULT 'text-embedding-3-small';
+ALTER TABLE vector_embeddings ADD COLUMN IF NOT EXISTS content_hash TEXT;
+
+-- Chunked rows written before this migration kept their position in metadata
+UPDATE vector_embeddings
+SET chunk_index = (metadata->>'chunk_index')::INTEGER
+WHERE metadata ? 'chunk_index' AND chunk_index = 0;
+
+-- Keep only the newest row for each key; updates used to insert a new row every time
+DELETE FROM vector_embeddings v
+USING vector_embeddings newer
+WHERE v.content_id = newer.content_id
+  AND v.content_type = newer.content_type
+  AND v.chunk_index = newer.chunk_index
+  AND v.model = newer.model
+  AND (v.created_at, v.id) < (newer.created_at, newer.id);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_vector_embeddings_chunk_version
+    ON vector_embeddings(content_id, content_type, chunk_index, model);
@@ -0,0 +1,24 @@
+-- Resumable scraper ingests: one checkpoint row per upload
+-- Run this in your Supabase SQL editor on databases created before ingest
+-- checkpoints. Safe to run more than once.
+
+CREATE TABLE IF NOT EXISTS ingest_jobs (
+    id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
+    source TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'running' CHECK (status IN ('running', 'failed', 'completed')),
+    records_committed INTEGER NOT NULL DEFAULT 0,
+    counts JSONB DEFAULT '{}'::jsonb,
+    errors JSONB DEFAULT '[]'::jsonb,
+    last_error TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_ingest_jobs_status ON ingest_jobs(status);
+
+ALTER TABLE ingest_jobs ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Allow all operations on ingest_jobs" ON ingest_jobs;
+CREATE POLICY "Allow all operations on ingest_jobs" ON ingest_jobs
+    FOR ALL USING (true);
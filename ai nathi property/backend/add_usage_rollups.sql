@@ -0,0 +1,28 @@
+-- OpenAI usage rollups: tokens, estimated cost and wall time per user,
+-- conversation and endpoint. Each API worker inserts its own increments
+-- every USAGE_FLUSH_SECONDS; queries sum them.
+-- Run this in your Supabase SQL editor on databases created before usage
+-- accounting. Safe to run more than once.
+
+CREATE TABLE IF NOT EXISTS usage_rollups (
+    id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
+    period_start TIMESTAMP WITH TIME ZONE NOT NULL,
+    dimension TEXT NOT NULL CHECK (dimension IN ('user', 'conversation', 'endpoint')),
+    key TEXT NOT NULL,
+    calls INTEGER NOT NULL DEFAULT 0,
+    prompt_tokens BIGINT NOT NULL DEFAULT 0,
+    completion_tokens BIGINT NOT NULL DEFAULT 0,
+    cached_tokens BIGINT NOT NULL DEFAULT 0,
+    cost_usd DOUBLE PRECISION NOT NULL DEFAULT 0,
+    seconds DOUBLE PRECISION NOT NULL DEFAULT 0,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_usage_rollups_dimension_period ON usage_rollups(dimension, period_start);
+CREATE INDEX IF NOT EXISTS idx_usage_rollups_dimension_key ON usage_rollups(dimension, key);
+
+ALTER TABLE usage_rollups ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Allow all operations on usage_rollups" ON usage_rollups;
+CREATE POLICY "Allow all operations on usage_rollups" ON usage_rollups
+    FOR ALL USING (true);
@@ -1,31 +1,119 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request, Response, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from datetime import datetime
+from contextlib import suppress
+import asyncio
+import time
 import uuid
 
+from app.core.config import settings
 from app.services.supabase_client import supabase_client
 from app.services.openai_client import openai_client
+from app.services.market_data import get_market_snapshot
+from app.services.chat_tools import ChatTools
+from app.services.user_context import get_user_context
+from app.services.cache import cache
+from app.services.db import execute
 from app.models.database import ConversationMessage
+from app.services.pagination import (
+    PaginationError, NEXT_CURSOR_HEADER, page_size, requested_fields, select_columns, keyset_page, split_page, project
+)
+from app.services.export import check_format, iter_rows, export_response
+from app.services.model_router import route_metrics
+from app.services.usage import tag_usage
+from app.services.conversation_archive import conversation_window_key, summary_message, get_summary, get_archive
+from app.core.throttle import charge_caller, off_loop, pace_caller
+from app.core.auth import current_user, requested_user, acting_user
 
 router = APIRouter()
 
+CONVERSATION_WINDOW_TTL_SECONDS = 1800
+# A WebSocket session rebuilds its standing context after this long
+SESSION_CONTEXT_TTL_SECONDS = 600
+MESSAGE_FIELDS = ["id", "conversation_id", "user_id", "role", "content", "timestamp", "metadata", "created_at"]
+
+def upgrade_prompt(question: str) -> str:
+    """Host Track upsell appended to answers about prices, the market or analytics"""
+    question = question.lower()
+    if "price" in question or "market" in question or "analytics" in question:
+        return "\n\n🚀 Want detailed analytics for your properties? Get comprehensive insights with Host Track!"
+    return ""
+
+def message_row(conversation_id: str, user_id: str, role: str, content: str) -> Dict[str, Any]:
+    return {
+        "id": str(uuid.uuid4()),
+        "conversation_id": conversation_id,
+        "user_id": user_id,
+        "role": role,
+        "content": content,
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+async def load_history_messages(conversation_id: str, user_id: str) -> List[Dict[str, str]]:
+    """The user's history of a conversation for the model: the summary of archived messages, if any, then the live ones"""
+    supabase = supabase_client.get_client()
+    history_result, summary = await asyncio.gather(
+        execute(supabase.table("conversation_messages").select("role, content").eq(
+            "conversation_id", conversation_id
+        ).eq("user_id", user_id).order("timestamp")),
+        get_summary(conversation_id, user_id)
+    )
+    messages = [summary_message(summary)] if summary else []
+    messages.extend({"role": msg["role"], "content": msg["content"]} for msg in history_result.data)
+    return messages
+
+async def record_turn(window_key: str, window: List[Dict[str, str]], turn: List[Dict[str, str]]):
+    """Append a turn's messages to the shared conversation window, atomically across workers.
+    
+    ``window`` is the history the turn was answered from, ending with
+    ``turn``; it seeds the window only when none is cached any more.
+    """
+    if cache.shared is None:
+        # Without a shared tier windows are never read back
+        return
+    
+    def append(current: Optional[List[Dict[str, str]]]):
+        return (window if current is None else current + turn), None
+    
+    await cache.update_async(window_key, append, CONVERSATION_WINDOW_TTL_SECONDS)
+
 class ChatMessage(BaseModel):
     message: str
     conversation_id: Optional[str] = None
-    user_id: str = "default_user"  # For MVP, we'll use a default user
+    user_id: Optional[str] = None  # Taken from the token; anonymous requests default to "default_user"
 
 class ChatResponse(BaseModel):
     response: str
     conversation_id: str
     timestamp: datetime
 
+class BatchChatRequest(BaseModel):
+    messages: List[str]
+    user_id: Optional[str] = None
+    concurrency: Optional[int] = None  # Capped at CHAT_BATCH_MAX_CONCURRENCY
+    stream: bool = False  # NDJSON results in completion order instead of one JSON body
+
+class BatchChatResult(BaseModel):
+    index: int
+    message: str
+    response: Optional[str] = None
+    error: Optional[str] = None
+    seconds: float
+
+class BatchChatResponse(BaseModel):
+    results: List[BatchChatResult]
+    elapsed_seconds: float
+
 @router.post("/", response_model=ChatResponse)
-async def chat_endpoint(message: ChatMessage):
+async def chat_endpoint(message: ChatMessage, request: Request, subject: Optional[str] = Depends(current_user)):
     """Main chat endpoint that handles user messages and returns AI responses"""
     try:
+        user_id = acting_user(request, subject, message.user_id)
         # Generate conversation ID if not provided
         conversation_id = message.conversation_id or str(uuid.uuid4())
+        tag_usage("chat", user_id, conversation_id)
         
         # Store conversation history and retrieve context
         supabase = supabase_client.get_client()
@@ -34,46 +122,44 @@ async def chat_endpoint(message: ChatMessage):
         user_message_data = {
             "id": str(uuid.uuid4()),
             "conversation_id": conversation_id,
-            "user_id": message.user_id,
+            "user_id": user_id,
             "role": "user",
             "content": message.message,
             "timestamp": datetime.utcnow().isoformat()
         }
-        supabase.table("conversation_messages").insert(user_message_data).execute()
-        
-        # Retrieve conversation history
-        history_result = supabase.table("conversation_messages").select("*").eq(
-            "conversation_id", conversation_id
-        ).order("timestamp").execute()
+        await execute(supabase.table("conversation_messages").insert(user_message_data))
         
-        # Prepare messages for OpenAI with full conversation history
-        messages = []
-        for msg in history_result.data:
-            messages.append({
-                "role": msg["role"],
-                "content": msg["content"]
-            })
+        # Retrieve conversation history, from the shared cache when another turn already loaded it
+        window_key = conversation_window_key(conversation_id, user_id)
+        messages = await cache.get_async(window_key, shared_only=True)
+        if messages is None:
+            # Prepare messages for OpenAI with full conversation history
+            messages = await load_history_messages(conversation_id, user_id)
+        else:
+            messages.append({"role": "user", "content": message.message})
         
         # Get relevant context from user memory and scraped data
-        context = await get_relevant_context(message.message, message.user_id)
+        context = await get_relevant_context(message.message, user_id)
         
         # Get AI response with real market data context
-        ai_response = await openai_client.get_chat_completion(messages, context)
+        ai_response = await openai_client.get_chat_completion(messages, context, tools=ChatTools(user_id))
         
         # Add Host Track upgrade prompt to responses
-        if "price" in message.message.lower() or "market" in message.message.lower() or "analytics" in message.message.lower():
-            ai_response += "\n\n🚀 Want detailed analytics for your properties? Get comprehensive insights with Host Track!"
+        ai_response += upgrade_prompt(message.message)
         
         # Store the AI response
         ai_message_data = {
             "id": str(uuid.uuid4()),
             "conversation_id": conversation_id,
-            "user_id": message.user_id,
+            "user_id": user_id,
             "role": "assistant",
             "content": ai_response,
             "timestamp": datetime.utcnow().isoformat()
         }
-        supabase.table("conversation_messages").insert(ai_message_data).execute()
+        await execute(supabase.table("conversation_messages").insert(ai_message_data))
+        
+        messages.append({"role": "assistant", "content": ai_response})
+        await record_turn(window_key, messages, messages[-2:])
         
         return ChatResponse(
             response=ai_response,
@@ -81,102 +167,234 @@ async def chat_endpoint(message: ChatMessage):
             timestamp=datetime.utcnow()
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Chat error: {str(e)}")
 
-async def get_relevant_context(query: str, user_id: str) -> str:
-    """Retrieve relevant context from real market data"""
+async def client_disconnected(request: Request, poll_seconds: float = 1.0):
+    """Returns once the client has closed the connection"""
+    while not await request.is_disconnected():
+        await asyncio.sleep(poll_seconds)
+
+@router.post("/batch", response_model=BatchChatResponse)
+async def chat_batch(batch: BatchChatRequest, request: Request, subject: Optional[str] = Depends(current_user)):
+    """Answer many independent single-turn questions concurrently.
+    
+    The user's context is built once and shared, and completions run with
+    bounded concurrency. Nothing is stored in conversation history. With
+    ``stream`` each result is sent as an NDJSON line as soon as it completes.
+    Every message counts against the caller's rate limit: each waits for a
+    token before it is sent, so a large batch is paced rather than refused.
+    Completions still queued are cancelled if the client disconnects.
+    """
     try:
-        supabase = supabase_client.get_client()
-        context_parts = []
+        if not batch.messages:
+            raise HTTPException(status_code=400, detail="messages must not be empty")
+        if len(batch.messages) > settings.CHAT_BATCH_MAX_MESSAGES:
+            raise HTTPException(status_code=400, detail=f"At most {settings.CHAT_BATCH_MAX_MESSAGES} messages per batch")
         
-        # Get real Cape Town competitor data for market insights
-        competitors_result = supabase.table("cape_town_competitors").select("*").execute()
+        user_id = acting_user(request, subject, batch.user_id)
         
-        if competitors_result.data:
-            context_parts.append("🏙️ Cape Town Market Data (Live):")
-            
-            # Calculate market statistics
-            prices = [comp['current_price'] for comp in competitors_result.data if comp['current_price']]
-            ratings = [comp['rating'] for comp in competitors_result.data if comp['rating']]
-            areas = [comp['area'] for comp in competitors_result.data if comp['area']]
-            
-            if prices:
-                avg_price = sum(prices) / len(prices)
-                min_price = min(prices)
-                max_price = max(prices)
-                context_parts.append(f"- Average Price: R{avg_price:.0f}/night")
-                context_parts.append(f"- Price Range: R{min_price:.0f} - R{max_price:.0f}")
-            
-            if ratings:
-                avg_rating = sum(ratings) / len(ratings)
-                context_parts.append(f"- Average Rating: {avg_rating:.1f}/5")
-            
-            # Show top properties by area
-            area_stats = {}
-            for comp in competitors_result.data:
-                area = comp.get('area', 'Unknown')
-                if area not in area_stats:
-                    area_stats[area] = []
-                area_stats[area].append(comp)
-            
-            context_parts.append("\n📍 Area Breakdown:")
-            for area, props in area_stats.items():
-                if props:
-                    area_prices = [p['current_price'] for p in props if p['current_price']]
-                    if area_prices:
-                        avg_area_price = sum(area_prices) / len(area_prices)
-                        context_parts.append(f"- {area}: R{avg_area_price:.0f}/night ({len(props)} properties)")
-            
-            # Show top performing properties
-            top_properties = sorted([comp for comp in competitors_result.data if comp['rating']], 
-                                  key=lambda x: x['rating'], reverse=True)[:3]
+        started = time.perf_counter()
+        tag_usage("chat_batch", user_id)
+        context = await get_relevant_context("", user_id)
+        tools = ChatTools(user_id)
+        concurrency = max(1, min(batch.concurrency or settings.CHAT_BATCH_MAX_CONCURRENCY, settings.CHAT_BATCH_MAX_CONCURRENCY))
+        slots = asyncio.Semaphore(concurrency)
+        # Messages take their rate limit tokens in order
+        pacing = asyncio.Lock()
+        
+        async def answer(index: int, text: str) -> BatchChatResult:
+            async with slots:
+                # The middleware took the first message's token with the request itself
+                if index > 0:
+                    async with pacing:
+                        await pace_caller(request.scope, subject)
+                item_started = time.perf_counter()
+                try:
+                    response = await openai_client.get_chat_completion(
+                        [{"role": "user", "content": text}], context, tools=tools
+                    )
+                    return BatchChatResult(index=index, message=text, response=response, seconds=time.perf_counter() - item_started)
+                except Exception as e:
+                    return BatchChatResult(index=index, message=text, error=str(e), seconds=time.perf_counter() - item_started)
+        
+        tasks = [asyncio.create_task(answer(index, text)) for index, text in enumerate(batch.messages)]
+        
+        if batch.stream:
+            async def stream_results():
+                try:
+                    for next_done in asyncio.as_completed(tasks):
+                        result = await next_done
+                        yield result.model_dump_json() + "\n"
+                finally:
+                    # The client went away: stop the completions still queued
+                    for task in tasks:
+                        task.cancel()
             
-            if top_properties:
-                context_parts.append("\n⭐ Top Performing Properties:")
-                for prop in top_properties:
-                    context_parts.append(f"- {prop['title']} in {prop['area']}: R{prop['current_price']}/night, {prop['rating']}/5 ({prop['review_count']} reviews)")
+            return StreamingResponse(stream_results(), media_type="application/x-ndjson")
         
-        # Get user profile information
+        gathered = asyncio.gather(*tasks)
+        disconnected = asyncio.create_task(client_disconnected(request))
         try:
-            profile_result = supabase.table("profiles").select("*").eq("id", user_id).execute()
+            await asyncio.wait([gathered, disconnected], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            disconnected.cancel()
+            client_left = not gathered.done()
+            if client_left:
+                # The client went away: stop the completions still queued
+                gathered.cancel()
+                with suppress(asyncio.CancelledError):
+                    await gathered
+        if client_left:
+            raise HTTPException(status_code=499, detail="Client closed the connection")
+        return BatchChatResponse(results=gathered.result(), elapsed_seconds=time.perf_counter() - started)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Batch chat error: {str(e)}")
+
+class ChatSession:
+    """Conversation state a WebSocket connection keeps between turns.
+    
+    History is read from the database once when the connection opens and
+    from the shared window before each turn, so turns taken over HTTP or
+    other connections meanwhile are seen. Context and tools (with their
+    retrieval results) are rebuilt only every SESSION_CONTEXT_TTL_SECONDS.
+    """
+    
+    def __init__(self, user_id: str, conversation_id: str):
+        self.user_id = user_id
+        self.conversation_id = conversation_id
+        self.messages: List[Dict[str, str]] = []
+        self.context = ""
+        self.tools: Optional[ChatTools] = None
+        self.context_built_at = 0.0
+    
+    @property
+    def window_key(self) -> str:
+        return conversation_window_key(self.conversation_id, self.user_id)
+    
+    async def load_history(self):
+        messages = await cache.get_async(self.window_key, shared_only=True)
+        if messages is None:
+            messages = await load_history_messages(self.conversation_id, self.user_id)
+        self.messages = messages
+    
+    async def refresh_history(self):
+        # Keep our own copy when the shared window expired or there is none
+        messages = await cache.get_async(self.window_key, shared_only=True)
+        if messages is not None:
+            self.messages = messages
+    
+    async def refresh_context(self):
+        if self.tools is not None and time.monotonic() - self.context_built_at < SESSION_CONTEXT_TTL_SECONDS:
+            return
+        self.context = await get_relevant_context("", self.user_id)
+        self.tools = ChatTools(self.user_id)
+        self.context_built_at = time.monotonic()
+    
+    async def turn(self, text: str, websocket: WebSocket):
+        supabase = supabase_client.get_client()
+        await execute(supabase.table("conversation_messages").insert(
+            message_row(self.conversation_id, self.user_id, "user", text)
+        ))
+        await self.refresh_history()
+        self.messages.append({"role": "user", "content": text})
+        await self.refresh_context()
+        
+        parts = []
+        async for piece in openai_client.stream_chat_completion(self.messages, self.context, tools=self.tools):
+            parts.append(piece)
+            await websocket.send_json({"type": "token", "content": piece})
+        suffix = upgrade_prompt(text)
+        if suffix:
+            parts.append(suffix)
+            await websocket.send_json({"type": "token", "content": suffix})
+        ai_response = "".join(parts)
+        
+        await execute(supabase.table("conversation_messages").insert(
+            message_row(self.conversation_id, self.user_id, "assistant", ai_response)
+        ))
+        self.messages.append({"role": "assistant", "content": ai_response})
+        # HTTP turns on the same conversation pick up from here
+        await record_turn(self.window_key, self.messages, self.messages[-2:])
+        
+        await websocket.send_json({
+            "type": "done",
+            "response": ai_response,
+            "conversation_id": self.conversation_id,
+            "timestamp": datetime.utcnow().isoformat()
+        })
+
+@router.websocket("/ws")
+async def chat_websocket(
+    websocket: WebSocket,
+    user_id: str = Depends(requested_user),
+    subject: Optional[str] = Depends(current_user),
+    conversation_id: Optional[str] = None
+):
+    """Chat over a WebSocket, streaming answers token by token.
+    
+    Client frames are {"message": "..."}. The server replies with a
+    "session" frame on connect, then "token" frames and a "done" frame per
+    turn, or an "error" frame.
+    """
+    await websocket.accept()
+    session = ChatSession(user_id, conversation_id or str(uuid.uuid4()))
+    tag_usage("chat_ws", user_id, session.conversation_id)
+    try:
+        await session.load_history()
+        await websocket.send_json({"type": "session", "conversation_id": session.conversation_id})
+        
+        while True:
+            data = await websocket.receive_json()
+            text = (data.get("message") or "").strip() if isinstance(data, dict) else ""
+            if not text:
+                await websocket.send_json({"type": "error", "detail": "message is required"})
+                continue
             
-            if profile_result.data:
-                profile = profile_result.data[0]
-                context_parts.append(f"\n👤 User Profile:")
-                context_parts.append(f"- Name: {profile.get('name', 'Unknown')}")
-                context_parts.append(f"- Currency: {profile.get('settings', {}).get('currency', 'ZAR')}")
-                context_parts.append(f"- Timezone: {profile.get('settings', {}).get('timezone', 'Africa/Johannesburg')}")
-        except:
-            pass  # Skip if profiles table doesn't exist
-        
-        # Get user's properties from Host Track (if any)
-        try:
-            properties_result = supabase.table("properties").select("*").eq(
-                "user_id", user_id
-            ).eq("status", "active").execute()
+            # HTTP throttling does not see WebSocket frames, so each turn is charged here
+            retry_after = await off_loop(charge_caller, websocket.scope, subject)
+            if retry_after > 0:
+                await websocket.send_json({"type": "error", "detail": "Too many requests", "retry_after": round(retry_after, 1)})
+                continue
             
-            if properties_result.data:
-                context_parts.append("\n🏠 Your Properties:")
-                for prop in properties_result.data:
-                    context_parts.append(f"- {prop['name']}: {prop['property_type']} with {prop['bedrooms']} bedrooms")
-        except:
-            pass  # Skip if properties table doesn't exist
-        
-        # Get recent bookings
-        try:
-            if 'properties_result' in locals() and properties_result.data:
-                property_ids = [prop['id'] for prop in properties_result.data]
-                bookings_result = supabase.table("bookings").select("*").in_(
-                    "property_id", property_ids
-                ).eq("status", "confirmed").order("check_in", desc=True).limit(5).execute()
-                
-                if bookings_result.data:
-                    context_parts.append("\n📅 Recent Bookings:")
-                    for booking in bookings_result.data:
-                        context_parts.append(f"- {booking['guest_name']}: {booking['check_in']} to {booking['check_out']} ({booking['nights']} nights)")
-        except:
-            pass  # Skip if bookings table doesn't exist
+            try:
+                await session.turn(text, websocket)
+            except WebSocketDisconnect:
+                raise
+            except Exception as e:
+                await websocket.send_json({"type": "error", "detail": f"Chat error: {str(e)}"})
+    
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        print(f"Chat WebSocket error: {e}")
+        await websocket.close(code=1011)
+
+async def get_relevant_context(query: str, user_id: str) -> str:
+    """Short standing context for every turn.
+    
+    Market details, comparable listings and bookings are not included: the
+    model fetches them through ChatTools when the question needs them.
+    """
+    try:
+        context_parts = []
+        
+        market_snapshot = await get_market_snapshot()
+        if market_snapshot.get("listing_count") and market_snapshot.get("average_price") is not None:
+            context_parts.append(
+                f"🏙️ Cape Town market: {market_snapshot['listing_count']} listings, "
+                f"average R{market_snapshot['average_price']:.0f}/night across {len(market_snapshot['areas'])} areas"
+            )
+        
+        # Profile and properties come pre-rendered from the materialized user context
+        user_context = await get_user_context(user_id)
+        if user_context["text"]:
+            context_parts.append(user_context["text"])
         
         return "\n".join(context_parts)
         
@@ -184,16 +402,102 @@ async def get_relevant_context(query: str, user_id: str) -> str:
         print(f"Error getting context: {e}")
         return ""
 
+@router.get("/routing/metrics")
+async def get_routing_metrics():
+    """Requests, latency percentiles, tokens and estimated cost per model route (this worker only)"""
+    return route_metrics.report()
+
 @router.get("/conversations/{conversation_id}")
-async def get_conversation(conversation_id: str):
-    """Get conversation history"""
+async def get_conversation(
+    conversation_id: str,
+    response: Response,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    subject: Optional[str] = Depends(current_user)
+):
+    """Get conversation history, oldest first, one page at a time.
+    
+    Messages of conversations left idle past CONVERSATION_IDLE_DAYS are moved
+    to the conversation's archive (see /conversations/{id}/archive).
+    """
     try:
         supabase = supabase_client.get_client()
-        result = supabase.table("conversation_messages").select("*").eq(
-            "conversation_id", conversation_id
-        ).order("timestamp").execute()
+        try:
+            size = page_size(limit)
+            selected = requested_fields(fields, MESSAGE_FIELDS)
+            query = supabase.table("conversation_messages").select(select_columns(selected, ["id", "timestamp"])).eq(
+                "conversation_id", conversation_id
+            )
+            if subject is not None:
+                query = query.eq("user_id", subject)
+            query = keyset_page(query, "timestamp", cursor, size, descending=False)
+        except PaginationError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
-        return {"messages": result.data}
+        rows, next_cursor = split_page((await execute(query)).data, size, "timestamp")
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
         
+        return {"messages": project(rows, selected), "next_cursor": next_cursor}
+        
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving conversation: {str(e)}")
+
+@router.get("/conversations/{conversation_id}/archive")
+async def get_conversation_archive(
+    conversation_id: str,
+    include_messages: bool = False,
+    subject: Optional[str] = Depends(current_user)
+):
+    """Summary of a conversation's archived messages, and the messages themselves with ``include_messages``"""
+    try:
+        archive = await get_archive(conversation_id, include_messages, user_id=subject)
+        if archive is None:
+            raise HTTPException(status_code=404, detail="Conversation has no archive")
+        return archive
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error retrieving conversation archive: {str(e)}")
+
+@router.get("/export")
+async def export_conversations(
+    user_id: str = Depends(requested_user),
+    conversation_id: Optional[str] = None,
+    export_format: str = Query("ndjson", alias="format"),
+    gzip: bool = False,
+    fields: Optional[str] = None
+):
+    """Download a user's chat history (or one conversation) as NDJSON or CSV.
+    
+    The file is streamed page by page, so exports of any length start at once
+    and use constant memory.
+    """
+    try:
+        try:
+            check_format(export_format)
+            selected = requested_fields(fields, MESSAGE_FIELDS)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        supabase = supabase_client.get_client()
+        columns = select_columns(selected, ["id", "timestamp"])
+        
+        def messages_query():
+            query = supabase.table("conversation_messages").select(columns).eq("user_id", user_id)
+            if conversation_id:
+                query = query.eq("conversation_id", conversation_id)
+            return query
+        
+        rows = iter_rows(messages_query, "timestamp", selected)
+        filename = f"conversation-{conversation_id}" if conversation_id else f"chat-history-{user_id}"
+        return export_response(rows, selected, export_format, filename, compress=gzip)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error exporting conversations: {str(e)}")
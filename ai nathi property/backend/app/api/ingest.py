@@ -1,170 +1,547 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File
+from fastapi import APIRouter, HTTPException, UploadFile, File, Response, Query
 from pydantic import BaseModel
-from typing import List, Dict, Any
-from datetime import datetime
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
+from datetime import date, datetime, time
+from functools import lru_cache
+import asyncio
 import uuid
 import json
-import pandas as pd
-import io
+import math
 
 from app.services.supabase_client import supabase_client
+from app.services.db import execute
 from app.services.openai_client import openai_client
+from app.services.search import search_engine, property_document, SHARED_OWNER
+from app.services.chunking import chunk_with_header
+from app.services.embedding_store import embedding_store, register_content_source, content_hash
+from app.services.upload_formats import read_upload, skip_rows, UnsupportedUpload
+from app.services.ingest_jobs import ingest_jobs, upload_fingerprint
+from app.services.pagination import (
+    PaginationError, NEXT_CURSOR_HEADER, page_size, requested_fields, select_columns, keyset_page, split_page, project
+)
+from app.services.export import check_format, iter_rows, export_response
+from app.services.usage import tag_usage
 
 router = APIRouter()
 
+# Scraped property ids are derived from the record key, so re-ingesting a record
+# upserts the same row instead of creating a duplicate
+RECORD_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "https://hosttrack.co.za/scraped_properties")
+EXTERNAL_ID_FIELDS = ['external_id', 'Id', 'id', 'listing_id', 'hotel_id', 'property_id']
+PLATFORM_FIELDS = ['platform', 'source_platform']
+# Filename fragment -> platform, for exports that do not name their platform per record
+FILENAME_PLATFORMS = {'booking': 'booking', 'airbnb': 'airbnb', 'bnb': 'airbnb', 'lekkeslaap': 'lekkeslaap'}
+INGEST_BATCH_SIZE = 200
+PROPERTY_FIELDS = ['id', 'source', 'property_data', 'processed_at', 'metadata']
+
+# Standard field -> source columns, in order of preference
+FIELD_MAPPING = {
+    'address': ['address', 'location', 'property_address', 'street_address'],
+    'price': ['price', 'rental_price', 'monthly_rent', 'rate'],
+    'bedrooms': ['bedrooms', 'beds', 'bed_count'],
+    'bathrooms': ['bathrooms', 'baths', 'bath_count'],
+    'square_feet': ['square_feet', 'sqft', 'size', 'area'],
+    'property_type': ['property_type', 'type', 'category'],
+    'amenities': ['amenities', 'features', 'facilities'],
+    'description': ['description', 'details', 'summary'],
+    'location': ['location', 'neighborhood', 'area', 'city'],
+    'availability': ['availability', 'available', 'status']
+}
+PRICE_FIELDS = ['price']
+COUNT_FIELDS = ['bedrooms', 'bathrooms', 'square_feet']
+# Field -> label in the text that gets embedded
+EMBEDDING_FIELDS = [
+    ('address', 'Address'),
+    ('price', 'Price'),
+    ('bedrooms', 'Bedrooms'),
+    ('bathrooms', 'Bathrooms'),
+    ('property_type', 'Type'),
+    ('description', 'Description'),
+    ('amenities', 'Amenities')
+]
+# "R1,105 ZAR" / "R 1 105" -> "1105"
+THOUSANDS_SEPARATOR = r'(?<=\d)[\s,](?=\d{3}\b)'
+FIRST_NUMBER = r'(-?\d+(?:\.\d+)?)'
+
 class IngestResponse(BaseModel):
     message: str
     records_processed: int
     records_stored: int
+    records_new: int = 0
+    records_updated: int = 0
+    records_unchanged: int = 0
+    records_duplicate: int = 0  # Repeats of a listing earlier in the same batch
     errors: List[str]
+    job_id: Optional[str] = None
+
+class IngestBatchError(Exception):
+    """A batch could not be stored; the job stops at its last checkpoint"""
+
+def open_upload(file: UploadFile):
+    # Parse the upload as it streams from the spooled request body
+    try:
+        return read_upload(file.file, file.filename)
+    except UnsupportedUpload as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+async def run_ingest_job(job: Dict[str, Any], frames: Iterable[Any]) -> IngestResponse:
+    tag_usage("ingest")
+    try:
+        return await store_records(frames, job)
+    except Exception as e:
+        await ingest_jobs.finish(job, "failed", str(e))
+        resume = f" Resume with POST /api/ingest/jobs/{job['id']}/resume." if job.get("id") else ""
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error ingesting data after {job['records_committed']} records: {str(e)}.{resume}"
+        )
 
 @router.post("/scraper", response_model=IngestResponse)
 async def ingest_scraper_data(file: UploadFile = File(...)):
-    """Ingest CSV or JSON data from scrapers"""
+    """Ingest CSV, JSON, NDJSON, Parquet or Arrow data from scrapers, optionally gzip/zstd compressed"""
     try:
-        # Read file content
-        content = await file.read()
+        job = await ingest_jobs.create(file.filename, upload_fingerprint(file.file))
+        return await run_ingest_job(job, open_upload(file))
         
-        # Determine file type and parse
-        if file.filename.endswith('.csv'):
-            df = pd.read_csv(io.StringIO(content.decode('utf-8')))
-            records = df.to_dict('records')
-        elif file.filename.endswith('.json'):
-            records = json.loads(content.decode('utf-8'))
-        else:
-            raise HTTPException(status_code=400, detail="Unsupported file type. Please upload CSV or JSON.")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error ingesting data: {str(e)}")
+
+@router.post("/jobs/{job_id}/resume", response_model=IngestResponse)
+async def resume_ingest_job(job_id: str, file: UploadFile = File(...)):
+    """Continue a failed or interrupted ingest from its last checkpoint; upload the same file again.
+    
+    A job still marked running is only taken over once its last checkpoint
+    is older than STALE_JOB_SECONDS.
+    """
+    try:
+        job = await ingest_jobs.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Ingest job not found")
+        if job["status"] == "completed":
+            raise HTTPException(status_code=409, detail="Ingest job already completed")
+        if job["status"] == "running" and not ingest_jobs.is_stale(job):
+            raise HTTPException(status_code=409, detail="Ingest job is still running; it can be resumed once it stops checkpointing")
+        if upload_fingerprint(file.file) != job["fingerprint"]:
+            raise HTTPException(status_code=409, detail="Uploaded file does not match the file of this ingest job")
+        if not await ingest_jobs.claim(job):
+            raise HTTPException(status_code=409, detail="Ingest job was resumed by another request")
         
-        # Process and store records
-        processed_count = 0
-        stored_count = 0
-        errors = []
+        job["counts"] = job.get("counts") or {"new": 0, "updated": 0, "unchanged": 0, "duplicates": 0}
+        job["errors"] = job.get("errors") or []
+        frames = skip_rows(open_upload(file), job["records_committed"])
+        return await run_ingest_job(job, frames)
         
-        supabase = supabase_client.get_client()
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error resuming ingest job: {str(e)}")
+
+@router.get("/jobs/{job_id}")
+async def get_ingest_job(job_id: str):
+    """Status and checkpoint of an ingest job"""
+    try:
+        job = await ingest_jobs.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Ingest job not found")
+        return job
         
-        for record in records:
-            try:
-                # Normalize the record
-                normalized_record = normalize_property_data(record)
-                
-                # Store in database
-                property_data = {
-                    "id": str(uuid.uuid4()),
-                    "source": file.filename,
-                    "property_data": normalized_record,
-                    "processed_at": datetime.utcnow().isoformat()
-                }
-                
-                result = supabase.table("scraped_properties").insert(property_data).execute()
-                
-                # Create embedding for the property data
-                await create_property_embedding(
-                    property_data["id"], 
-                    format_property_for_embedding(normalized_record)
-                )
-                
-                stored_count += 1
-                
-            except Exception as e:
-                errors.append(f"Error processing record {processed_count}: {str(e)}")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error retrieving ingest job: {str(e)}")
+
+def _present(value: Any) -> bool:
+    return value is not None and value != "" and not (isinstance(value, float) and math.isnan(value))
+
+def detect_platform(record: Dict[str, Any], filename: str) -> str:
+    """The listing platform a record came from, from the record itself or the export's filename"""
+    for field in PLATFORM_FIELDS:
+        if _present(record.get(field)):
+            return str(record[field]).strip().lower()
+    name = (filename or "").lower()
+    for fragment, platform in FILENAME_PLATFORMS.items():
+        if fragment in name:
+            return platform
+    return "unknown"
+
+def record_key(normalized: Dict[str, Any], filename: str) -> str:
+    """Stable identity of a scraped listing: platform plus its external id, else a content hash"""
+    platform = detect_platform(normalized, filename)
+    for field in EXTERNAL_ID_FIELDS:
+        if _present(normalized.get(field)):
+            return f"{platform}:{external_id(normalized[field])}"
+    return f"{platform}:sha256:{record_hash(normalized)}"
+
+def external_id(value: Any) -> str:
+    # An integer id column with gaps is read as floats: 123.0 is the same listing as 123
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+def record_hash(normalized: Dict[str, Any]) -> str:
+    return content_hash(json.dumps(normalized, sort_keys=True, default=str))
+
+async def fetch_existing_metadata(property_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    supabase = supabase_client.get_client()
+    result = await execute(supabase.table("scraped_properties").select("id, metadata").in_("id", property_ids))
+    return {row["id"]: row.get("metadata") or {} for row in result.data or []}
+
+async def store_batch(
+    records: List[Dict[str, Any]],
+    headers: List[str],
+    source: str,
+    first_index: int,
+    counts: Dict[str, int],
+    errors: List[str]
+):
+    """Upsert one batch of normalized records, embedding only records whose content changed"""
+    supabase = supabase_client.get_client()
+    
+    # Later duplicates of a key within the batch replace earlier ones and are counted apart
+    batch: Dict[str, Dict[str, Any]] = {}
+    duplicates = 0
+    for offset, normalized_record in enumerate(records):
+        try:
+            key = record_key(normalized_record, source)
+            chunks = format_property_chunks(normalized_record, headers[offset])
+            property_id = str(uuid.uuid5(RECORD_NAMESPACE, key))
+            if property_id in batch:
+                duplicates += 1
+            batch[property_id] = {
+                "id": property_id,
+                "source": source,
+                "property_data": normalized_record,
+                "processed_at": datetime.utcnow().isoformat(),
+                "metadata": {
+                    "record_key": key,
+                    "content_hash": record_hash(normalized_record),
+                    "embedding_hash": content_hash("\n".join(chunks))
+                },
+                "_chunks": chunks
+            }
+        except Exception as e:
+            errors.append(f"Error processing record {first_index + offset}: {str(e)}")
+    counts["duplicates"] = counts.get("duplicates", 0) + duplicates
+    if not batch:
+        return
+    
+    try:
+        existing = await fetch_existing_metadata(list(batch))
+        changed = []
+        to_embed = []
+        batch_counts = {"new": 0, "updated": 0, "unchanged": 0}
+        for property_id, row in batch.items():
+            previous = existing.get(property_id)
+            embedding_hash = row["metadata"]["embedding_hash"]
+            if previous is None or previous.get("embedding_hash") != embedding_hash:
+                # Recorded only once the embedding exists, so an interrupted batch is re-embedded on resume
+                row["metadata"]["embedding_hash"] = None
+                to_embed.append((row, embedding_hash))
             
-            processed_count += 1
-        
-        return IngestResponse(
-            message=f"Successfully processed {processed_count} records",
-            records_processed=processed_count,
-            records_stored=stored_count,
-            errors=errors
-        )
+            if previous is None:
+                batch_counts["new"] += 1
+            elif previous.get("content_hash") != row["metadata"]["content_hash"]:
+                batch_counts["updated"] += 1
+            else:
+                batch_counts["unchanged"] += 1
+                continue
+            changed.append(row)
         
+        if changed:
+            await execute(supabase.table("scraped_properties").upsert([strip_chunks(row) for row in changed]))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error ingesting data: {str(e)}")
-
-def normalize_property_data(record: Dict[str, Any]) -> Dict[str, Any]:
-    """Normalize property data to a standard format"""
-    normalized = {}
-    
-    # Common property fields mapping
-    field_mapping = {
-        'address': ['address', 'location', 'property_address', 'street_address'],
-        'price': ['price', 'rental_price', 'monthly_rent', 'rate'],
-        'bedrooms': ['bedrooms', 'beds', 'bed_count'],
-        'bathrooms': ['bathrooms', 'baths', 'bath_count'],
-        'square_feet': ['square_feet', 'sqft', 'size', 'area'],
-        'property_type': ['property_type', 'type', 'category'],
-        'amenities': ['amenities', 'features', 'facilities'],
-        'description': ['description', 'details', 'summary'],
-        'location': ['location', 'neighborhood', 'area', 'city'],
-        'availability': ['availability', 'available', 'status']
-    }
-    
-    # Map fields
-    for standard_field, possible_fields in field_mapping.items():
-        for field in possible_fields:
-            if field in record and record[field] is not None:
-                normalized[standard_field] = record[field]
-                break
+        raise IngestBatchError(f"Error storing records {first_index}-{first_index + len(records) - 1}: {str(e)}")
     
-    # Add any unmapped fields
-    for key, value in record.items():
-        if key not in normalized and value is not None:
-            normalized[key] = value
+    # All of the batch's chunks go to the embeddings API together
+    embedded = await create_property_embeddings({row["id"]: row["_chunks"] for row, _ in to_embed})
+    for row, embedding_hash in to_embed:
+        if row["id"] in embedded:
+            row["metadata"]["embedding_hash"] = embedding_hash
+    
+    if embedded:
+        try:
+            await execute(supabase.table("scraped_properties").upsert(
+                [strip_chunks(row) for row, _ in to_embed if row["id"] in embedded]
+            ))
+        except Exception as e:
+            raise IngestBatchError(f"Error recording embeddings for records {first_index}-{first_index + len(records) - 1}: {str(e)}")
+    
+    indexed = {row["id"]: row for row in changed + [row for row, _ in to_embed]}.values()
+    if indexed:
+        await search_engine.upsert_many(
+            "property", SHARED_OWNER, [property_document(row, embedded.get(row["id"])) for row in indexed]
+        )
     
-    return normalized
+    for outcome, count in batch_counts.items():
+        counts[outcome] = counts.get(outcome, 0) + count
 
-def format_property_for_embedding(property_data: Dict[str, Any]) -> str:
-    """Format property data for embedding creation"""
-    parts = []
+def strip_chunks(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: value for key, value in row.items() if key != "_chunks"}
+
+async def store_records(frames: Iterable[Any], job: Dict[str, Any]) -> IngestResponse:
+    """Normalize and store each DataFrame of an upload in batches of INGEST_BATCH_SIZE,
+    checkpointing the job after every batch"""
+    processed_count = job["records_committed"]
+    counts = job["counts"]
+    errors = job["errors"]
+    frames = iter(frames)
     
-    if 'address' in property_data:
-        parts.append(f"Address: {property_data['address']}")
+    while True:
+        # Decoding and normalizing a frame is CPU-bound pandas/pyarrow work, kept off the event loop
+        batches = await asyncio.to_thread(prepare_next_frame, frames)
+        if batches is None:
+            break
+        for records, headers in batches:
+            await store_batch(records, headers, job["source"], processed_count, counts, errors)
+            processed_count += len(records)
+            job["records_committed"] = processed_count
+            await ingest_jobs.checkpoint(job)
     
-    if 'price' in property_data:
-        parts.append(f"Price: {property_data['price']}")
+    await ingest_jobs.finish(job, "completed")
+    stored_count = counts["new"] + counts["updated"]
+    return IngestResponse(
+        message=f"Successfully processed {processed_count} records "
+                f"({counts['new']} new, {counts['updated']} updated, {counts['unchanged']} unchanged, "
+                f"{counts.get('duplicates', 0)} duplicates)",
+        records_processed=processed_count,
+        records_stored=stored_count,
+        records_new=counts["new"],
+        records_updated=counts["updated"],
+        records_unchanged=counts["unchanged"],
+        records_duplicate=counts.get("duplicates", 0),
+        errors=errors,
+        job_id=job.get("id")
+    )
+
+@lru_cache(maxsize=64)
+def resolve_field_mapping(columns: Tuple[str, ...]) -> Dict[str, List[str]]:
+    """Standard field -> the file's columns that can fill it, resolved once per file schema"""
+    present = set(columns)
+    mapping = {}
+    for standard_field, possible_fields in FIELD_MAPPING.items():
+        sources = [field for field in possible_fields if field in present]
+        if sources:
+            mapping[standard_field] = sources
+    return mapping
+
+def coerce_numbers(series, price: bool = False):
+    """Parse a column to numbers, keeping the original text where it is not numeric (e.g. "Studio")"""
+    import pandas as pd
     
-    if 'bedrooms' in property_data:
-        parts.append(f"Bedrooms: {property_data['bedrooms']}")
+    if pd.api.types.is_numeric_dtype(series):
+        numbers = series
+    else:
+        text = series.astype("string")
+        if price:
+            text = text.str.replace(THOUSANDS_SEPARATOR, "", regex=True).str.extract(FIRST_NUMBER, expand=False)
+        numbers = pd.to_numeric(text, errors="coerce")
     
-    if 'bathrooms' in property_data:
-        parts.append(f"Bathrooms: {property_data['bathrooms']}")
+    valid = numbers.dropna()
+    if len(valid) and (valid % 1 == 0).all():
+        numbers = numbers.astype("Int64")
+    return numbers.astype(object).where(numbers.notna(), series)
+
+def iso_timestamps(series):
+    """Dates and timestamps (e.g. Parquet timestamp columns) as ISO strings the Supabase client can send"""
+    import pandas as pd
     
-    if 'property_type' in property_data:
-        parts.append(f"Type: {property_data['property_type']}")
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series.map(lambda value: value.isoformat(), na_action="ignore")
+    if series.dtype == object:
+        dated = series.map(lambda value: isinstance(value, (date, time)))
+        if dated.any():
+            # Only the dated cells change, so integers in the column stay integers
+            series = series.copy()
+            series[dated] = [value.isoformat() for value in series[dated]]
+    return series
+
+def normalize_property_frame(df):
+    """Normalize a whole file to the standard fields column by column.
+
+    Each standard field takes the first non-null of its source columns, the
+    original columns are kept alongside, and prices and counts are coerced
+    to numbers, dates and timestamps to ISO strings.
+    """
+    import pandas as pd
     
-    if 'description' in property_data:
-        parts.append(f"Description: {property_data['description']}")
+    df = df.rename(columns=str)
+    columns = {}
+    for standard_field, sources in resolve_field_mapping(tuple(df.columns)).items():
+        series = df[sources[0]]
+        for source in sources[1:]:
+            series = series.combine_first(df[source])
+        columns[standard_field] = series
     
-    if 'amenities' in property_data:
-        parts.append(f"Amenities: {property_data['amenities']}")
+    # Add any unmapped fields
+    for column in df.columns:
+        if column not in columns:
+            columns[column] = df[column]
     
+    normalized = pd.DataFrame(columns, index=df.index)
+    for field in PRICE_FIELDS + COUNT_FIELDS:
+        if field in normalized:
+            normalized[field] = coerce_numbers(normalized[field], price=field in PRICE_FIELDS)
+    for column in normalized.columns:
+        normalized[column] = iso_timestamps(normalized[column])
+    return normalized.astype(object).where(normalized.notna(), None)
+
+def prepare_next_frame(frames: Iterator[Any]) -> Optional[List[Tuple[List[Dict[str, Any]], List[str]]]]:
+    """Decode the upload's next DataFrame and split it into INGEST_BATCH_SIZE batches of
+    (normalized records, embedding headers); None once the upload is exhausted"""
+    df = next(frames, None)
+    if df is None:
+        return None
+    normalized = normalize_property_frame(df)
+    headers = format_property_headers(normalized)
+    return [
+        (frame_to_records(normalized.iloc[start:start + INGEST_BATCH_SIZE]), headers[start:start + INGEST_BATCH_SIZE])
+        for start in range(0, len(normalized), INGEST_BATCH_SIZE)
+    ]
+
+def frame_to_records(normalized) -> List[Dict[str, Any]]:
+    """Rows of a normalized frame as dicts without their empty fields"""
+    columns = list(normalized.columns)
+    return [
+        {column: value for column, value in zip(columns, row) if value is not None}
+        for row in normalized.itertuples(index=False, name=None)
+    ]
+
+def format_property_headers(normalized) -> List[str]:
+    """format_property_for_embedding for every row of a normalized frame"""
+    parts = [
+        (f"{label}: " + normalized[field].astype(str)).where(normalized[field].notna())
+        for field, label in EMBEDDING_FIELDS if field in normalized and field != 'description'
+    ]
+    if not parts:
+        return [""] * len(normalized)
+    return [" | ".join(part for part in row if isinstance(part, str)) for row in zip(*parts)]
+
+def format_property_for_embedding(property_data: Dict[str, Any]) -> str:
+    """Format property data for embedding creation"""
+    parts = [
+        f"{label}: {property_data[field]}"
+        for field, label in EMBEDDING_FIELDS if field in property_data
+    ]
     return " | ".join(parts)
 
-async def create_property_embedding(property_id: str, content: str):
-    """Create embedding for property data"""
+def format_property_chunks(property_data: Dict[str, Any], header: Optional[str] = None) -> List[str]:
+    """Split a property into embedding chunks: the key fields, then the description
+    in overlapping windows that each repeat the key fields for context"""
+    if header is None:
+        header_fields = {key: value for key, value in property_data.items() if key != 'description'}
+        header = format_property_for_embedding(header_fields)
+    description = property_data.get('description')
+    return chunk_with_header(header, f"Description: {description}" if description else "")
+
+async def create_property_embeddings(chunks_by_id: Dict[str, List[str]]) -> Dict[str, List[List[float]]]:
+    """Create one embedding per chunk of each property, in batched requests across properties"""
+    if not chunks_by_id:
+        return {}
     try:
-        embedding = await openai_client.get_embedding(content)
-        
-        supabase = supabase_client.get_client()
-        supabase.table("vector_embeddings").insert({
-            "content_id": property_id,
-            "content_type": "property",
-            "content": content,
-            "embedding": embedding,
-            "created_at": datetime.utcnow().isoformat()
-        }).execute()
+        return await embedding_store.upsert_many("property", chunks_by_id)
         
     except Exception as e:
-        print(f"Error creating property embedding: {e}")
+        # The properties keep no embedding_hash, so a resumed or repeated upload embeds them again
+        print(f"Error creating property embeddings: {e}")
+        return {}
 
 @router.get("/properties")
-async def get_scraped_properties(limit: int = 50):
-    """Get scraped properties"""
+async def get_scraped_properties(
+    response: Response,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None
+):
+    """Get scraped properties, most recently processed first, one page at a time.
+    
+    ``fields`` may pick single keys of the listing, e.g. "id,property_data.price,property_data.location".
+    """
     try:
         supabase = supabase_client.get_client()
-        result = supabase.table("scraped_properties").select("*").order(
-            "processed_at", desc=True
-        ).limit(limit).execute()
+        try:
+            size = page_size(limit)
+            selected = requested_fields(fields, PROPERTY_FIELDS, json_columns=['property_data'])
+            query = supabase.table("scraped_properties").select(select_columns(selected, ["id", "processed_at"]))
+            query = keyset_page(query, "processed_at", cursor, size)
+        except PaginationError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
-        return {"properties": result.data}
+        rows, next_cursor = split_page((await execute(query)).data, size, "processed_at")
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
         
+        return {"properties": project(rows, selected), "next_cursor": next_cursor}
+        
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving properties: {str(e)}")
+
+@router.get("/properties/export")
+async def export_scraped_properties(
+    export_format: str = Query("ndjson", alias="format"),
+    gzip: bool = False,
+    fields: Optional[str] = None
+):
+    """Download all scraped properties as NDJSON or CSV, streamed page by page.
+    
+    In CSV, picked listing keys ("property_data.price") get a column each and
+    whole JSON columns are written as JSON text.
+    """
+    try:
+        try:
+            check_format(export_format)
+            selected = requested_fields(fields, PROPERTY_FIELDS, json_columns=['property_data'])
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        supabase = supabase_client.get_client()
+        columns = select_columns(selected, ["id", "processed_at"])
+        rows = iter_rows(lambda: supabase.table("scraped_properties").select(columns), "processed_at", selected)
+        return export_response(rows, selected, export_format, "scraped-properties", compress=gzip)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error exporting properties: {str(e)}")
+
+@router.get("/properties/search")
+async def search_scraped_properties(q: str, area: Optional[str] = None, property_type: Optional[str] = None, limit: int = 10):
+    """Hybrid keyword + semantic search over scraped properties"""
+    try:
+        tag_usage("property_search")
+        try:
+            query_embedding = await openai_client.get_embedding(q)
+        except Exception as e:
+            # Keyword matches are still useful without the embeddings API
+            print(f"Error embedding search query: {e}")
+            query_embedding = None
+        
+        hits = await search_engine.search(
+            "property", SHARED_OWNER, q, query_embedding,
+            filters={"area": area, "property_type": property_type},
+            limit=limit
+        )
+        if not hits:
+            return {"properties": []}
+        
+        supabase = supabase_client.get_client()
+        result = await execute(supabase.table("scraped_properties").select("*").in_(
+            "id", [hit.doc_id for hit in hits]
+        ))
+        rows = {row["id"]: row for row in result.data}
+        
+        return {"properties": [
+            {**rows[hit.doc_id], "score": hit.score}
+            for hit in hits if hit.doc_id in rows
+        ]}
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error searching properties: {str(e)}")
+
+register_content_source(
+    "property", "scraped_properties", "id, property_data",
+    lambda row: format_property_chunks(row["property_data"])
+)
@@ -1,19 +1,30 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
 from pydantic import BaseModel
 from typing import List, Optional
-from datetime import datetime
+from datetime import datetime, timezone
 import uuid
 
+from app.core.auth import current_user, requested_user, acting_user, owns
 from app.services.supabase_client import supabase_client
+from app.services.db import execute
 from app.services.openai_client import openai_client
+from app.services.search import search_engine, memory_document
+from app.services.chunking import chunk_text
+from app.services.embedding_store import embedding_store, register_content_source
+from app.services.usage import tag_usage
+from app.services.pagination import (
+    PaginationError, NEXT_CURSOR_HEADER, page_size, requested_fields, select_columns, keyset_page, split_page, project
+)
 
 router = APIRouter()
 
+MEMORY_FIELDS = ["id", "title", "content", "category", "created_at", "updated_at"]
+
 class MemoryCreate(BaseModel):
     title: str
     content: str
     category: Optional[str] = None
-    user_id: str = "default_user"
+    user_id: Optional[str] = None  # Taken from the token; anonymous requests default to "default_user"
 
 class MemoryUpdate(BaseModel):
     title: Optional[str] = None
@@ -28,15 +39,37 @@ class MemoryResponse(BaseModel):
     created_at: datetime
     updated_at: datetime
 
+class MemoryListItem(BaseModel):
+    """A memory with only the requested fields (all of them by default)"""
+    id: str
+    title: Optional[str] = None
+    content: Optional[str] = None
+    category: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+class MemorySearchRequest(BaseModel):
+    query: str
+    user_id: Optional[str] = None
+    category: Optional[str] = None
+    created_after: Optional[datetime] = None
+    created_before: Optional[datetime] = None
+    limit: int = 10
+
+class MemorySearchResult(MemoryResponse):
+    score: float
+
 @router.post("/", response_model=MemoryResponse)
-async def create_memory(memory: MemoryCreate):
+async def create_memory(memory: MemoryCreate, request: Request, subject: Optional[str] = Depends(current_user)):
     """Create a new memory entry"""
     try:
+        user_id = acting_user(request, subject, memory.user_id)
+        tag_usage("memory", user_id)
         supabase = supabase_client.get_client()
         
         memory_data = {
             "id": str(uuid.uuid4()),
-            "user_id": memory.user_id,
+            "user_id": user_id,
             "title": memory.title,
             "content": memory.content,
             "category": memory.category,
@@ -44,10 +77,11 @@ async def create_memory(memory: MemoryCreate):
             "updated_at": datetime.utcnow().isoformat()
         }
         
-        result = supabase.table("user_memory").insert(memory_data).execute()
+        result = await execute(supabase.table("user_memory").insert(memory_data))
         
-        # Create embedding for the memory
-        await create_memory_embedding(memory_data["id"], memory.content)
+        # Create embedding for the memory and add it to the user's search index
+        embeddings = await create_memory_embedding(memory_data["id"], memory.content)
+        await search_engine.upsert("memory", user_id, memory_document(memory_data, embeddings))
         
         return MemoryResponse(
             id=memory_data["id"],
@@ -58,42 +92,127 @@ async def create_memory(memory: MemoryCreate):
             updated_at=datetime.fromisoformat(memory_data["updated_at"])
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creating memory: {str(e)}")
 
-@router.get("/", response_model=List[MemoryResponse])
-async def get_memories(user_id: str = "default_user"):
-    """Get all memories for a user"""
+@router.get("/", response_model=List[MemoryListItem], response_model_exclude_unset=True)
+async def get_memories(
+    response: Response,
+    user_id: str = Depends(requested_user),
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None
+):
+    """Get a user's memories, newest first, one page at a time.
+    
+    The next page's cursor is returned in the X-Next-Cursor header; ``fields``
+    is a comma-separated subset of the memory fields (id is always included).
+    """
+    try:
+        supabase = supabase_client.get_client()
+        try:
+            size = page_size(limit)
+            selected = requested_fields(fields, MEMORY_FIELDS)
+            if "id" not in selected:
+                selected.insert(0, "id")
+            query = supabase.table("user_memory").select(select_columns(selected, ["id", "created_at"])).eq(
+                "user_id", user_id
+            )
+            query = keyset_page(query, "created_at", cursor, size)
+        except PaginationError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        rows, next_cursor = split_page((await execute(query)).data, size, "created_at")
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
+        
+        return [MemoryListItem(**memory) for memory in project(rows, selected)]
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error retrieving memories: {str(e)}")
+
+@router.post("/search", response_model=List[MemorySearchResult])
+async def search_memories(search: MemorySearchRequest, request: Request, subject: Optional[str] = Depends(current_user)):
+    """Rank a user's memories against a natural-language query"""
     try:
+        user_id = acting_user(request, subject, search.user_id)
+        tag_usage("memory_search", user_id)
+        try:
+            query_embedding = await openai_client.get_embedding(search.query)
+        except Exception as e:
+            # Keyword matches are still useful without the embeddings API
+            print(f"Error embedding search query: {e}")
+            query_embedding = None
+        
+        filters = {"category": search.category}
+        if search.created_after or search.created_before:
+            filters["created_at"] = created_between(search.created_after, search.created_before)
+        
+        hits = await search_engine.search(
+            "memory", user_id, search.query, query_embedding,
+            filters=filters, limit=search.limit
+        )
+        if not hits:
+            return []
+        
         supabase = supabase_client.get_client()
-        result = supabase.table("user_memory").select("*").eq(
-            "user_id", user_id
-        ).order("created_at", desc=True).execute()
+        result = await execute(supabase.table("user_memory").select("*").in_(
+            "id", [hit.doc_id for hit in hits]
+        ))
+        memories = {memory["id"]: memory for memory in result.data}
         
-        memories = []
-        for memory in result.data:
-            memories.append(MemoryResponse(
+        results = []
+        for hit in hits:
+            memory = memories.get(hit.doc_id)
+            if memory is None:
+                continue
+            results.append(MemorySearchResult(
                 id=memory["id"],
                 title=memory["title"],
                 content=memory["content"],
                 category=memory["category"],
                 created_at=datetime.fromisoformat(memory["created_at"]),
-                updated_at=datetime.fromisoformat(memory["updated_at"])
+                updated_at=datetime.fromisoformat(memory["updated_at"]),
+                score=hit.score
             ))
         
-        return memories
+        return results
         
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error retrieving memories: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error searching memories: {str(e)}")
+
+def created_between(after: Optional[datetime], before: Optional[datetime]):
+    """Build a search filter accepting created_at timestamps inside [after, before]"""
+    def as_utc(value: datetime) -> datetime:
+        return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+    
+    def matches(created_at: Optional[str]) -> bool:
+        if not created_at:
+            return False
+        created = as_utc(datetime.fromisoformat(created_at))
+        if after and created < as_utc(after):
+            return False
+        if before and created > as_utc(before):
+            return False
+        return True
+    
+    return matches
 
 @router.get("/{memory_id}", response_model=MemoryResponse)
-async def get_memory(memory_id: str):
+async def get_memory(memory_id: str, subject: Optional[str] = Depends(current_user)):
     """Get a specific memory by ID"""
     try:
         supabase = supabase_client.get_client()
-        result = supabase.table("user_memory").select("*").eq("id", memory_id).execute()
+        result = await execute(supabase.table("user_memory").select("*").eq("id", memory_id))
         
-        if not result.data:
+        # Another user's memory is reported as missing rather than forbidden
+        if not result.data or not owns(subject, result.data[0]["user_id"]):
             raise HTTPException(status_code=404, detail="Memory not found")
         
         memory = result.data[0]
@@ -112,15 +231,16 @@ async def get_memory(memory_id: str):
         raise HTTPException(status_code=500, detail=f"Error retrieving memory: {str(e)}")
 
 @router.put("/{memory_id}", response_model=MemoryResponse)
-async def update_memory(memory_id: str, memory_update: MemoryUpdate):
+async def update_memory(memory_id: str, memory_update: MemoryUpdate, subject: Optional[str] = Depends(current_user)):
     """Update a memory entry"""
     try:
         supabase = supabase_client.get_client()
         
         # Get existing memory
-        existing = supabase.table("user_memory").select("*").eq("id", memory_id).execute()
-        if not existing.data:
+        existing = await execute(supabase.table("user_memory").select("*").eq("id", memory_id))
+        if not existing.data or not owns(subject, existing.data[0]["user_id"]):
             raise HTTPException(status_code=404, detail="Memory not found")
+        tag_usage("memory", existing.data[0]["user_id"])
         
         # Prepare update data
         update_data = {"updated_at": datetime.utcnow().isoformat()}
@@ -132,13 +252,15 @@ async def update_memory(memory_id: str, memory_update: MemoryUpdate):
             update_data["category"] = memory_update.category
         
         # Update memory
-        result = supabase.table("user_memory").update(update_data).eq("id", memory_id).execute()
+        result = await execute(supabase.table("user_memory").update(update_data).eq("id", memory_id))
         
         # Update embedding if content changed
+        embeddings = None
         if memory_update.content is not None:
-            await create_memory_embedding(memory_id, memory_update.content)
+            embeddings = await create_memory_embedding(memory_id, memory_update.content)
         
         updated_memory = result.data[0]
+        await search_engine.upsert("memory", updated_memory["user_id"], memory_document(updated_memory, embeddings))
         return MemoryResponse(
             id=updated_memory["id"],
             title=updated_memory["title"],
@@ -154,21 +276,22 @@ async def update_memory(memory_id: str, memory_update: MemoryUpdate):
         raise HTTPException(status_code=500, detail=f"Error updating memory: {str(e)}")
 
 @router.delete("/{memory_id}")
-async def delete_memory(memory_id: str):
+async def delete_memory(memory_id: str, subject: Optional[str] = Depends(current_user)):
     """Delete a memory entry"""
     try:
         supabase = supabase_client.get_client()
         
         # Check if memory exists
-        existing = supabase.table("user_memory").select("*").eq("id", memory_id).execute()
-        if not existing.data:
+        existing = await execute(supabase.table("user_memory").select("*").eq("id", memory_id))
+        if not existing.data or not owns(subject, existing.data[0]["user_id"]):
             raise HTTPException(status_code=404, detail="Memory not found")
         
         # Delete memory
-        supabase.table("user_memory").delete().eq("id", memory_id).execute()
+        await execute(supabase.table("user_memory").delete().eq("id", memory_id))
         
-        # Delete associated embedding
-        supabase.table("vector_embeddings").delete().eq("content_id", memory_id).execute()
+        # Delete associated embeddings
+        await embedding_store.delete(memory_id, "memory")
+        await search_engine.remove("memory", existing.data[0]["user_id"], memory_id)
         
         return {"message": "Memory deleted successfully"}
         
@@ -177,19 +300,13 @@ async def delete_memory(memory_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error deleting memory: {str(e)}")
 
-async def create_memory_embedding(memory_id: str, content: str):
-    """Create embedding for memory content"""
+async def create_memory_embedding(memory_id: str, content: str) -> Optional[List[List[float]]]:
+    """Create one embedding per chunk of the memory content"""
     try:
-        embedding = await openai_client.get_embedding(content)
-        
-        supabase = supabase_client.get_client()
-        supabase.table("vector_embeddings").insert({
-            "content_id": memory_id,
-            "content_type": "memory",
-            "content": content,
-            "embedding": embedding,
-            "created_at": datetime.utcnow().isoformat()
-        }).execute()
+        return await embedding_store.upsert_chunks(memory_id, "memory", chunk_text(content))
         
     except Exception as e:
         print(f"Error creating memory embedding: {e}")
+        return None
+
+register_content_source("memory", "user_memory", "id, content", lambda memory: chunk_text(memory["content"]))
@@ -0,0 +1,67 @@
+from fastapi import APIRouter, HTTPException, Depends
+from typing import Any, Dict, Optional
+from datetime import datetime, timedelta
+
+from app.core.auth import authenticate, current_user, is_admin
+from app.services.supabase_client import supabase_client
+from app.services.db import db
+from app.services.search import fetch_all_rows
+from app.services.usage import USAGE_DIMENSIONS, summarize_rollups
+
+router = APIRouter()
+
+DEFAULT_USAGE_WINDOW = timedelta(days=1)
+MAX_USAGE_RESULTS = 500
+
+@router.get("/rollups")
+async def get_usage_rollups(
+    dimension: str = "user",
+    key: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    by_period: bool = False,
+    limit: int = 50,
+    claims: Optional[Dict[str, Any]] = Depends(authenticate),
+    subject: Optional[str] = Depends(current_user)
+):
+    """OpenAI tokens, estimated cost and latency per user, conversation or endpoint.
+    
+    Sums the flushed rollups from every worker between ``since`` (default: the
+    last 24 hours) and ``until``, most expensive first. With ``by_period``
+    each key is broken down per rollup period. Only admins see every key;
+    other users see their own user rollups.
+    """
+    try:
+        if dimension not in USAGE_DIMENSIONS:
+            raise HTTPException(status_code=400, detail=f"dimension must be one of: {', '.join(USAGE_DIMENSIONS)}")
+        if subject is not None and not is_admin(claims):
+            if dimension != "user" or (key is not None and key != subject):
+                raise HTTPException(status_code=403, detail="Only admins can see other users' usage")
+            key = subject
+        since = since or datetime.utcnow() - DEFAULT_USAGE_WINDOW
+        limit = max(1, min(limit, MAX_USAGE_RESULTS))
+        
+        supabase = supabase_client.get_client()
+        
+        def rollups_query():
+            query = supabase.table("usage_rollups").select("*").eq("dimension", dimension).gte(
+                "period_start", since.isoformat()
+            )
+            if key is not None:
+                query = query.eq("key", key)
+            if until is not None:
+                query = query.lt("period_start", until.isoformat())
+            return query.order("id")
+        
+        rows = await db.run(fetch_all_rows, rollups_query)
+        return {
+            "dimension": dimension,
+            "since": since,
+            "until": until,
+            "rollups": summarize_rollups(rows, by_period)[:limit]
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error retrieving usage rollups: {str(e)}")
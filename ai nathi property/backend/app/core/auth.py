@@ -0,0 +1,97 @@
+from typing import Any, Dict, Optional
+
+from fastapi import Depends, HTTPException, WebSocketException, status
+from starlette.requests import HTTPConnection
+
+from app.core.config import settings
+from app.utils.security import verify_token_cached
+
+
+def bearer_token(connection: HTTPConnection) -> Optional[str]:
+    authorization = connection.headers.get("authorization")
+    if authorization and authorization.lower().startswith("bearer "):
+        return authorization[7:].strip()
+    if connection.scope["type"] == "websocket":
+        # Browsers cannot set headers on a WebSocket handshake
+        return connection.query_params.get("token")
+    return None
+
+
+# The user anonymous requests act for when they name none (AUTH_REQUIRED off)
+DEFAULT_USER_ID = "default_user"
+
+
+def _reject(connection: HTTPConnection, detail: str):
+    if connection.scope["type"] == "websocket":
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason=detail)
+    raise HTTPException(status_code=401, detail=detail, headers={"WWW-Authenticate": "Bearer"})
+
+
+def _forbid(connection: HTTPConnection, detail: str):
+    if connection.scope["type"] == "websocket":
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason=detail)
+    raise HTTPException(status_code=403, detail=detail)
+
+
+async def authenticate(connection: HTTPConnection) -> Optional[Dict[str, Any]]:
+    """Router-wide dependency: verify the bearer token and attach its claims as ``state.user``.
+
+    A bad or expired token is always rejected. Requests without a token are
+    rejected too when AUTH_REQUIRED is on. Works for HTTP and WebSocket
+    routes alike.
+    """
+    token = bearer_token(connection)
+    if token is None:
+        if settings.AUTH_REQUIRED:
+            _reject(connection, "Not authenticated")
+        connection.state.user = None
+        return None
+
+    claims = verify_token_cached(token)
+    if claims is None:
+        _reject(connection, "Invalid or expired token")
+    connection.state.user = claims
+    return claims
+
+
+async def current_user(connection: HTTPConnection, claims: Optional[Dict[str, Any]] = Depends(authenticate)) -> Optional[str]:
+    """The verified token's subject (the user id), or None for an anonymous request"""
+    if claims is None:
+        return None
+    subject = claims.get("sub")
+    if not subject:
+        _reject(connection, "Token has no subject")
+    return str(subject)
+
+
+def acting_user(connection: HTTPConnection, subject: Optional[str], requested: Optional[str]) -> str:
+    """The user a request acts for.
+
+    With a token that is always its subject, and naming a different
+    ``user_id`` is refused with 403. Only anonymous requests, which need
+    AUTH_REQUIRED off, act for the user they name.
+    """
+    if subject is None:
+        return requested or DEFAULT_USER_ID
+    if requested and requested != subject:
+        _forbid(connection, "Not allowed to act for another user")
+    return subject
+
+
+async def requested_user(
+    connection: HTTPConnection,
+    user_id: Optional[str] = None,
+    subject: Optional[str] = Depends(current_user)
+) -> str:
+    """Dependency for routes taking a ``user_id`` query parameter; see acting_user"""
+    return acting_user(connection, subject, user_id)
+
+
+def owns(subject: Optional[str], owner: Optional[str]) -> bool:
+    """Whether the caller may see a row owned by ``owner``; anonymous callers are not checked"""
+    return subject is None or subject == owner
+
+
+def is_admin(claims: Optional[Dict[str, Any]]) -> bool:
+    """Whether the token carries the admin role (``"role": "admin"``)"""
+    return bool(claims) and claims.get("role") == "admin"
@@ -0,0 +1,44 @@
+import asyncio
+import random
+from typing import Awaitable, Callable, List, Tuple
+
+# Periodic maintenance jobs run by every worker's event loop. Jobs must be
+# idempotent: with several workers each one runs its own schedule.
+_periodic_tasks: List[Tuple[str, Callable[[], float], Callable[[], Awaitable[None]]]] = []
+_running: List[asyncio.Task] = []
+
+
+def register_periodic_task(name: str, interval_seconds: Callable[[], float], job: Callable[[], Awaitable[None]]):
+    """Run ``job`` periodically once the app has started.
+
+    ``interval_seconds`` is read at startup (usually from settings, which are
+    not available at import time); an interval of 0 disables the job.
+    """
+    _periodic_tasks.append((name, interval_seconds, job))
+
+
+async def _run_periodically(name: str, interval_seconds: float, job: Callable[[], Awaitable[None]]):
+    # Jitter the first run so workers started together do not run in lockstep
+    await asyncio.sleep(random.uniform(0.1, 1.0) * interval_seconds)
+    while True:
+        try:
+            await job()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Background task {name} failed: {e}")
+        await asyncio.sleep(interval_seconds)
+
+
+def start_background_tasks():
+    for name, interval_seconds, job in _periodic_tasks:
+        interval = interval_seconds()
+        if interval > 0:
+            _running.append(asyncio.create_task(_run_periodically(name, interval, job), name=name))
+
+
+async def stop_background_tasks():
+    for task in _running:
+        task.cancel()
+    await asyncio.gather(*_running, return_exceptions=True)
+    _running.clear()
@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import List, Optional
+from app.core.lazy import LazyService
 
 class Settings(BaseSettings):
     # Supabase Configuration
@@ -7,6 +8,8 @@ class Settings(BaseSettings):
     SUPABASE_KEY: str
     SUPABASE_SERVICE_ROLE_KEY: str
     
+    DB_MAX_CONCURRENCY: int = 16  # Supabase queries in flight per worker
+    
     # OpenAI Configuration
     OPENAI_API_KEY: str
     
@@ -14,6 +17,10 @@ class Settings(BaseSettings):
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    AUTH_REQUIRED: bool = False  # Reject requests without a bearer token; needs clients that send API tokens
+    AUTH_TOKEN_CACHE_ENTRIES: int = 4096  # Decoded token claims kept per worker
+    AUTH_TOKEN_CACHE_TTL_SECONDS: int = 300  # Upper bound; entries never outlive the token's exp
+    AUTH_HASH_WORKERS: int = 2  # Threads reserved for bcrypt
     
     # CORS Configuration
     FRONTEND_URL: str = "https://hosttrack.co.za"
@@ -21,7 +28,73 @@ class Settings(BaseSettings):
     # Environment
     ENVIRONMENT: str = "development"
     
+    # Cache Configuration
+    CACHE_MAX_ENTRIES: int = 2048
+    CACHE_DEFAULT_TTL_SECONDS: int = 300
+    CACHE_SHARED_BACKEND: str = "none"  # "none", "redis" or "shm"
+    REDIS_URL: Optional[str] = None
+    CACHE_SHM_PATH: str = "/dev/shm/ai_nathi_cache.sqlite3"
+    CACHE_SHM_SWEEP_SECONDS: int = 300  # Deletes expired rows from the shm tier; 0 disables
+    
+    # Chat Model Routing ("quick" for short lookups, "analysis" for the rest)
+    CHAT_QUICK_MODEL: str = "gpt-4o-mini"
+    CHAT_QUICK_MAX_TOKENS: int = 300
+    CHAT_QUICK_TIMEOUT_SECONDS: float = 10
+    CHAT_ANALYSIS_MODEL: str = "gpt-4o-mini"
+    CHAT_ANALYSIS_MAX_TOKENS: int = 1000
+    CHAT_ANALYSIS_TIMEOUT_SECONDS: float = 45
+    CHAT_FALLBACK_MODEL: Optional[str] = "gpt-4o-mini"  # Retried once when a route times out; empty disables
+    CHAT_FALLBACK_TIMEOUT_SECONDS: float = 60
+    CHAT_BATCH_MAX_MESSAGES: int = 200
+    CHAT_BATCH_MAX_CONCURRENCY: int = 8  # Completions in flight per batch request
+    USER_CONTEXT_POLL_SECONDS: int = 30  # How often changed profiles/properties/bookings are looked for; 0 disables
+    USAGE_FLUSH_SECONDS: int = 60  # How often OpenAI usage rollups are written to usage_rollups; 0 disables
+    USAGE_ROLLUP_PERIOD_SECONDS: int = 3600  # Time bucket of each rollup row
+    CONVERSATION_IDLE_DAYS: int = 30  # Conversations idle this long are summarized and archived
+    CONVERSATION_COMPACTION_SECONDS: int = 3600  # How often idle conversations are archived; 0 disables
+    CONVERSATION_COMPACTION_BATCH: int = 50  # Conversations archived per run
+    
+    # Throttling Configuration (token buckets: sustained rate per minute, burst size)
+    THROTTLE_ENABLED: bool = True
+    THROTTLE_USER_PER_MINUTE: float = 30
+    THROTTLE_USER_BURST: int = 10
+    THROTTLE_IP_PER_MINUTE: float = 120
+    THROTTLE_IP_BURST: int = 40
+    THROTTLE_TRUST_FORWARDED_FOR: bool = False  # Enable behind a proxy that appends X-Forwarded-For
+    
+    # Search Configuration
+    SEARCH_MAX_PARTITIONS: int = 256
+    VECTOR_INDEX_DTYPE: str = "int8"  # "float32", "float16" or "int8"
+    VECTOR_RERANK_CANDIDATES: int = 50  # 0 disables full-precision re-ranking
+    VECTOR_SPILL_DIR: Optional[str] = None  # Where full-precision vectors are kept (default: system temp)
+    VECTOR_SNAPSHOT_DIR: Optional[str] = "data/search_index"  # Empty disables on-disk index snapshots
+    VECTOR_SNAPSHOT_COMPACT_ENTRIES: int = 500  # Delta log entries that trigger a new snapshot
+    VECTOR_SNAPSHOT_INTERVAL_SECONDS: int = 10 * 60
+    
+    # Embedding Configuration
+    CHUNK_MAX_TOKENS: int = 300
+    CHUNK_OVERLAP_TOKENS: int = 40
+    EMBEDDING_BATCH_SIZE: int = 96
+    EMBEDDING_GC_INTERVAL_SECONDS: int = 6 * 60 * 60  # 0 disables GC and re-embedding
+    EMBEDDING_REEMBED_BATCH: int = 500
+    
     class Config:
         env_file = ".env"
 
-settings = Settings()
+class CorsSettings(BaseSettings):
+    """The subset of settings needed to build the app, without any secrets"""
+    FRONTEND_URL: str = "https://hosttrack.co.za"
+    
+    class Config:
+        env_file = ".env"
+        extra = "ignore"
+
+def get_cors_origins() -> List[str]:
+    return [
+        CorsSettings().FRONTEND_URL,
+        "http://localhost:3000",  # Local development
+        "http://localhost:5000"   # Alternative local port
+    ]
+
+# Validated on first use, so importing the app does not require every secret
+settings: Settings = LazyService(Settings, "settings")
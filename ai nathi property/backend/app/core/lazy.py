@@ -0,0 +1,64 @@
+import threading
+from typing import Any, Callable, Generic, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Every LazyService created so far, so the app lifespan can close them on shutdown
+_services: List["LazyService"] = []
+
+
+class LazyService(Generic[T]):
+    """Module-level stand-in that builds the real object on first attribute access.
+
+    Keeps ``from app.services.x import x_client`` working while deferring
+    construction (and any settings validation or heavy imports it needs)
+    until the first request that actually uses the service.
+    """
+
+    def __init__(self, factory: Callable[[], T], name: Optional[str] = None):
+        self._factory = factory
+        self._name = name or getattr(factory, "__name__", "service")
+        self._instance: Optional[T] = None
+        self._lock = threading.Lock()
+        _services.append(self)
+
+    def get_instance(self) -> T:
+        instance = self._instance
+        if instance is None:
+            with self._lock:
+                if self._instance is None:
+                    self._instance = self._factory()
+                instance = self._instance
+        return instance
+
+    def is_built(self) -> bool:
+        return self._instance is not None
+
+    def drop_instance(self):
+        """Forget the built object, e.g. after fork so workers never share sockets"""
+        with self._lock:
+            self._instance = None
+
+    def close_instance(self):
+        """Close the built object (if it has a ``close``) and forget it"""
+        with self._lock:
+            instance, self._instance = self._instance, None
+        if instance is not None and hasattr(instance, "close"):
+            try:
+                instance.close()
+            except Exception as e:
+                print(f"Error closing {self._name}: {e}")
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.get_instance(), name)
+
+    def __repr__(self) -> str:
+        state = "built" if self.is_built() else "not built"
+        return f"<LazyService {self._name} ({state})>"
+
+
+def close_services():
+    """Close every service that was built during the app's lifetime"""
+    for service in reversed(_services):
+        service.close_instance()
+
@@ -0,0 +1,73 @@
+import asyncio
+import gc
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+# Loaders for read-mostly data that every worker needs. When the app is served
+# by the pre-forking launcher (gunicorn.conf.py) they run once in the master
+# process, so forked workers share the resulting pages copy-on-write.
+_preloaders: List[Tuple[str, Callable[[], Awaitable[Any]]]] = []
+_preloaded: Dict[str, float] = {}
+
+worker_state: Dict[str, Any] = {
+    "ready": False,
+    "pid": None,
+    "started_at": None
+}
+
+
+def register_preloader(name: str, loader: Callable[[], Awaitable[Any]]):
+    """Register an async loader to run before workers are forked"""
+    _preloaders.append((name, loader))
+
+
+async def run_preloaders(force: bool = False) -> Dict[str, float]:
+    """Run registered loaders not yet run in this process, returning their timings"""
+    timings = {}
+    for name, loader in _preloaders:
+        if name in _preloaded and not force:
+            continue
+        start = time.perf_counter()
+        try:
+            await loader()
+            _preloaded[name] = time.time()
+            timings[name] = time.perf_counter() - start
+        except Exception as e:
+            print(f"Preload of {name} failed: {e}")
+    return timings
+
+
+def preload_shared_data(force: bool = False):
+    """Run the preloaders in the master process and freeze the heap before forking.
+
+    ``gc.freeze`` moves everything allocated so far into the permanent
+    generation, so collections in the workers never write to (and therefore
+    never copy) the shared pages.
+    """
+    timings = asyncio.run(run_preloaders(force=force))
+    for name, seconds in timings.items():
+        print(f"Preloaded {name} in {seconds * 1000:.0f} ms")
+    gc.collect()
+    gc.freeze()
+
+
+async def mark_worker_ready():
+    """Finish warming this worker (anything the master did not preload) and mark it ready"""
+    await run_preloaders()
+    worker_state["pid"] = os.getpid()
+    worker_state["started_at"] = time.time()
+    worker_state["ready"] = True
+
+
+def mark_worker_draining():
+    worker_state["ready"] = False
+
+
+def readiness_report() -> Dict[str, Any]:
+    return {
+        "ready": worker_state["ready"],
+        "pid": worker_state["pid"] or os.getpid(),
+        "started_at": worker_state["started_at"],
+        "preloaded": sorted(_preloaded)
+    }
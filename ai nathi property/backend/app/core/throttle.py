@@ -0,0 +1,156 @@
+import asyncio
+import math
+import time
+from typing import Any, Callable, List, Optional, Tuple
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.config import settings
+from app.services.cache import cache
+from app.utils.security import verify_token_cached
+
+THROTTLED_PREFIX = "/api/"
+
+
+def take_token(
+    state: Optional[List[float]], now: float, rate: float, burst: float, cost: float = 1
+) -> Tuple[List[float], float]:
+    """Token bucket step: (new [tokens, updated_at], seconds to wait or 0 if the request may proceed)"""
+    tokens, updated_at = state if state else (burst, now)
+    tokens = min(burst, tokens + max(0.0, now - updated_at) * rate)
+    if tokens >= cost:
+        return [tokens - cost, now], 0.0
+    return [tokens, now], (cost - tokens) / rate
+
+
+def throttle(key: str, per_minute: float, burst: float, cost: float = 1) -> float:
+    """Take ``cost`` requests from ``key``'s bucket, all or none; returns the Retry-After delay (0 when allowed)"""
+    if per_minute <= 0 or cost <= 0:
+        return 0.0
+    rate = per_minute / 60.0
+    now = time.time()
+    # A bucket left alone this long is full again, so it can expire
+    ttl = math.ceil(burst / rate) + 1
+    return cache.update(f"throttle:{key}", lambda state: take_token(state, now, rate, burst, cost), ttl)
+
+
+def _header(scope: Scope, name: bytes) -> Optional[str]:
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def client_ip(scope: Scope) -> str:
+    if settings.THROTTLE_TRUST_FORWARDED_FOR:
+        forwarded = _header(scope, b"x-forwarded-for")
+        if forwarded:
+            # The last address is the one our own proxy appended; earlier ones are client-supplied
+            return forwarded.split(",")[-1].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+def request_user(scope: Scope) -> Optional[str]:
+    """The verified token's subject; None for anonymous callers, who only have the per-IP bucket"""
+    authorization = _header(scope, b"authorization")
+    if authorization and authorization.lower().startswith("bearer "):
+        claims = verify_token_cached(authorization[7:].strip())
+        if claims and claims.get("sub"):
+            return str(claims["sub"])
+    return None
+
+
+async def off_loop(check: Callable[..., float], *args: Any) -> float:
+    """Run a throttle check, in a thread when the buckets live in a shared tier (SQLite or Redis I/O)"""
+    if cache.shared is None:
+        return check(*args)
+    return await asyncio.to_thread(check, *args)
+
+
+def caller_bucket(scope: Scope, user_id: Optional[str]) -> Tuple[str, float, float]:
+    """(key, per_minute, burst) of the bucket a caller is charged to: its user's, else its IP's"""
+    if user_id is not None:
+        return f"user:{user_id}", settings.THROTTLE_USER_PER_MINUTE, settings.THROTTLE_USER_BURST
+    return f"ip:{client_ip(scope)}", settings.THROTTLE_IP_PER_MINUTE, settings.THROTTLE_IP_BURST
+
+
+def charge_caller(scope: Scope, user_id: Optional[str], cost: float = 1, charged: float = 0) -> float:
+    """Charge ``cost`` requests to the caller's bucket, ``charged`` of which were taken already.
+
+    Returns the Retry-After delay (0 when allowed), infinite when ``cost``
+    exceeds the bucket's burst.
+    """
+    if not settings.THROTTLE_ENABLED:
+        return 0.0
+    key, per_minute, burst = caller_bucket(scope, user_id)
+    if per_minute > 0 and cost > burst:
+        return math.inf
+    return throttle(key, per_minute, burst, cost - charged)
+
+
+async def pace_caller(scope: Scope, user_id: Optional[str]):
+    """Take one request from the caller's bucket, waiting for a token instead of failing"""
+    while True:
+        try:
+            retry_after = await off_loop(charge_caller, scope, user_id)
+        except Exception as e:
+            # Fail open, like the middleware
+            print(f"Error checking request throttle: {e}")
+            return
+        if retry_after <= 0:
+            return
+        if math.isinf(retry_after):
+            raise ValueError("The rate limit allows no requests")
+        await asyncio.sleep(retry_after)
+
+
+class ThrottleMiddleware:
+    """Per-IP and per-user token buckets in front of the /api routes.
+
+    Buckets live in the cache's shared tier when one is configured, so the
+    limits hold across workers, and are then checked off the event loop;
+    otherwise each worker enforces them alone, in process.
+    Over-limit requests get 429 with Retry-After before any handler runs.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] == "OPTIONS"
+            or not scope["path"].startswith(THROTTLED_PREFIX)
+            or not settings.THROTTLE_ENABLED
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        retry_after = await off_loop(self._check, scope)
+        if retry_after > 0:
+            response = JSONResponse(
+                status_code=429,
+                content={"detail": "Too many requests"},
+                headers={"Retry-After": str(math.ceil(retry_after))}
+            )
+            await response(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+
+    def _check(self, scope: Scope) -> float:
+        try:
+            retry_after = throttle(
+                f"ip:{client_ip(scope)}", settings.THROTTLE_IP_PER_MINUTE, settings.THROTTLE_IP_BURST
+            )
+            if retry_after > 0:
+                return retry_after
+            user_id = request_user(scope)
+            if user_id is None:
+                return 0.0
+            return throttle(f"user:{user_id}", settings.THROTTLE_USER_PER_MINUTE, settings.THROTTLE_USER_BURST)
+        except Exception as e:
+            # Fail open: a cache outage must not take the API down with it
+            print(f"Error checking request throttle: {e}")
+            return 0.0
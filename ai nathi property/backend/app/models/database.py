@@ -28,11 +28,26 @@ class ScrapedProperty(BaseModel):
     processed_at: datetime
     metadata: Optional[Dict[str, Any]] = None
 
+class IngestJob(BaseModel):
+    id: Optional[str] = None
+    source: str
+    fingerprint: str
+    status: str = "running"  # "running", "failed" or "completed"
+    records_committed: int = 0
+    counts: Optional[Dict[str, int]] = None
+    errors: Optional[List[str]] = None
+    last_error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
 class VectorEmbedding(BaseModel):
     id: Optional[str] = None
     content_id: str
     content_type: str  # "conversation", "memory", "property"
+    chunk_index: int = 0
+    model: str = "text-embedding-3-small"
     content: str
+    content_hash: Optional[str] = None
     embedding: List[float]
     metadata: Optional[Dict[str, Any]] = None
     created_at: datetime
@@ -0,0 +1,380 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.core.background import register_periodic_task
+from app.core.config import settings
+from app.core.lazy import LazyService
+
+KEY_PREFIX = "nathi:"
+
+# update() callbacks take the current value (None if missing) and return (new value, result)
+Updater = Callable[[Optional[Any]], Tuple[Any, Any]]
+
+
+class LRUCache:
+    """Bounded in-process LRU cache with per-entry expiry"""
+
+    def __init__(self, max_entries: int = 2048):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def update(self, key: str, updater: Updater, ttl: Optional[int] = None) -> Any:
+        """Atomically replace a value with ``updater(value)[0]`` and return ``updater(value)[1]``"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            value = entry[0] if entry is not None and (entry[1] is None or entry[1] > now) else None
+            value, result = updater(value)
+            self._entries[key] = (value, now + ttl if ttl else None)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return result
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class RedisCacheTier:
+    """Shared tier backed by a local Redis-compatible server"""
+
+    def __init__(self, url: str):
+        import redis  # Optional dependency, only needed for CACHE_SHARED_BACKEND=redis
+
+        self.client = redis.Redis.from_url(url)
+        self.watch_error = redis.WatchError
+
+    def get(self, key: str) -> Optional[Any]:
+        raw = self.client.get(key)
+        return json.loads(raw) if raw is not None else None
+
+    def get_entry(self, key: str) -> Tuple[Optional[Any], Optional[float]]:
+        """(value, seconds until it expires or None if it never does)"""
+        with self.client.pipeline(transaction=False) as pipe:
+            raw, remaining = pipe.get(key).pttl(key).execute()
+        if raw is None:
+            return None, None
+        return json.loads(raw), remaining / 1000 if remaining is not None and remaining >= 0 else None
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        self.client.set(key, json.dumps(value), ex=ttl)
+
+    def update(self, key: str, updater: Updater, ttl: Optional[int] = None) -> Any:
+        # Optimistic transaction: retried if another client changes the key meanwhile
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    raw = pipe.get(key)
+                    value, result = updater(json.loads(raw) if raw is not None else None)
+                    pipe.multi()
+                    pipe.set(key, json.dumps(value), ex=ttl)
+                    pipe.execute()
+                    return result
+                except self.watch_error:
+                    continue
+
+    def delete(self, key: str):
+        self.client.delete(key)
+
+
+class SharedMemoryCacheTier:
+    """Shared tier backed by a SQLite file on a tmpfs such as /dev/shm"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        connection = self._connection()
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+        )
+        connection.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread and process; SQLite handles cross-process
+        # locking but a connection must never be used on both sides of a fork
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=OFF")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def get(self, key: str) -> Optional[Any]:
+        return self.get_entry(key)[0]
+
+    def get_entry(self, key: str) -> Tuple[Optional[Any], Optional[float]]:
+        """(value, seconds until it expires or None if it never does)"""
+        row = self._connection().execute(
+            "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None, None
+        value, expires_at = row
+        now = time.time()
+        if expires_at is not None and expires_at <= now:
+            self.delete(key)
+            return None, None
+        return json.loads(value), expires_at - now if expires_at is not None else None
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        expires_at = time.time() + ttl if ttl else None
+        self._connection().execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, json.dumps(value), expires_at)
+        )
+
+    def update(self, key: str, updater: Updater, ttl: Optional[int] = None) -> Any:
+        connection = self._connection()
+        now = time.time()
+        # IMMEDIATE takes the write lock up front, so the read-modify-write is atomic across workers
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            current = json.loads(row[0]) if row is not None and (row[1] is None or row[1] > now) else None
+            value, result = updater(current)
+            connection.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), now + ttl if ttl else None)
+            )
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        return result
+
+    def delete(self, key: str):
+        self._connection().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def sweep(self) -> int:
+        """Delete expired rows, which reads only drop when they happen to hit them; returns how many"""
+        return self._connection().execute(
+            "DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),)
+        ).rowcount
+
+
+class TieredCache:
+    """In-process LRU in front of an optional tier shared by all workers on the host.
+
+    Values must be JSON-serialisable so that they can live in the shared tier.
+    The shared tier blocks on SQLite locks or Redis round trips, so coroutines
+    use the ``*_async`` methods, which do that I/O in a thread.
+    """
+
+    def __init__(self, local: LRUCache, shared: Optional[Any] = None, default_ttl: int = 300):
+        self.local = local
+        self.shared = shared
+        self.default_ttl = default_ttl
+        self._inflight: Dict[str, asyncio.Lock] = {}
+
+    def get(self, key: str, shared_only: bool = False) -> Optional[Any]:
+        key = KEY_PREFIX + key
+        if not shared_only:
+            value = self.local.get(key)
+            if value is not None:
+                return value
+
+        if self.shared is None:
+            return None
+
+        try:
+            value, remaining = self.shared.get_entry(key)
+        except Exception as e:
+            print(f"Shared cache read failed: {e}")
+            return None
+
+        if value is not None and not shared_only:
+            # The local copy expires with the shared entry, not a full TTL later
+            ttl = remaining if remaining is not None else self.default_ttl
+            if ttl > 0:
+                self.local.set(key, value, ttl)
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None, shared_only: bool = False):
+        """Store a value in both tiers.
+
+        ``shared_only`` skips the per-worker tier for data that other workers
+        may modify, such as conversation windows.
+        """
+        key = KEY_PREFIX + key
+        ttl = ttl or self.default_ttl
+        if not shared_only:
+            self.local.set(key, value, ttl)
+
+        if self.shared is not None:
+            try:
+                self.shared.set(key, value, ttl)
+            except Exception as e:
+                print(f"Shared cache write failed: {e}")
+
+    def update(self, key: str, updater: Updater, ttl: Optional[int] = None) -> Any:
+        """Atomic read-modify-write of a counter-like value; see LRUCache.update.
+
+        Runs in the shared tier when there is one, so all workers see the same
+        value, and falls back to this worker's tier if the shared one fails.
+        """
+        key = KEY_PREFIX + key
+        ttl = ttl or self.default_ttl
+        if self.shared is not None:
+            try:
+                return self.shared.update(key, updater, ttl)
+            except Exception as e:
+                print(f"Shared cache update failed: {e}")
+        return self.local.update(key, updater, ttl)
+
+    def delete(self, key: str):
+        key = KEY_PREFIX + key
+        self.local.delete(key)
+        if self.shared is not None:
+            try:
+                self.shared.delete(key)
+            except Exception as e:
+                print(f"Shared cache delete failed: {e}")
+
+    async def _off_loop(self, method: Callable[..., Any], *args: Any) -> Any:
+        # Only the shared tier does I/O; the in-process tier is cheaper to use inline
+        if self.shared is None:
+            return method(*args)
+        return await asyncio.to_thread(method, *args)
+
+    async def get_async(self, key: str, shared_only: bool = False) -> Optional[Any]:
+        """get() with the shared tier read off the event loop"""
+        if not shared_only:
+            value = self.local.get(KEY_PREFIX + key)
+            if value is not None:
+                return value
+        return await self._off_loop(self.get, key, shared_only)
+
+    async def get_many_async(self, keys: List[str]) -> List[Optional[Any]]:
+        """get() for several keys, with one trip off the event loop for the local misses"""
+        values = [self.local.get(KEY_PREFIX + key) for key in keys]
+        missing = [i for i, value in enumerate(values) if value is None]
+        if missing and self.shared is not None:
+            found = await asyncio.to_thread(lambda: [self.get(keys[i]) for i in missing])
+            for i, value in zip(missing, found):
+                values[i] = value
+        return values
+
+    async def set_async(self, key: str, value: Any, ttl: Optional[int] = None, shared_only: bool = False):
+        await self._off_loop(self.set, key, value, ttl, shared_only)
+
+    async def set_many_async(self, values: Dict[str, Any], ttl: Optional[int] = None):
+        def set_all():
+            for key, value in values.items():
+                self.set(key, value, ttl)
+        await self._off_loop(set_all)
+
+    async def update_async(self, key: str, updater: Updater, ttl: Optional[int] = None) -> Any:
+        return await self._off_loop(self.update, key, updater, ttl)
+
+    async def delete_async(self, key: str):
+        await self._off_loop(self.delete, key)
+
+    async def get_or_compute(
+        self,
+        key: str,
+        loader: Callable[[], Awaitable[Any]],
+        ttl: Optional[int] = None
+    ) -> Any:
+        """Return the cached value, computing it at most once per worker on a miss"""
+        value = await self.get_async(key)
+        if value is not None:
+            return value
+
+        lock = self._inflight.setdefault(key, asyncio.Lock())
+        try:
+            async with lock:
+                # Another coroutine (or worker, via the shared tier) may have filled it
+                value = await self.get_async(key)
+                if value is None:
+                    value = await loader()
+                    if value is not None:
+                        await self.set_async(key, value, ttl)
+        finally:
+            self._inflight.pop(key, None)
+        return value
+
+
+def build_cache() -> TieredCache:
+    """Build the cache described by the CACHE_* settings"""
+    shared = None
+    backend = settings.CACHE_SHARED_BACKEND.lower()
+    try:
+        if backend == "redis" and settings.REDIS_URL:
+            shared = RedisCacheTier(settings.REDIS_URL)
+        elif backend == "shm":
+            shared = SharedMemoryCacheTier(settings.CACHE_SHM_PATH)
+    except Exception as e:
+        print(f"Shared cache unavailable, using in-process cache only: {e}")
+
+    return TieredCache(
+        LRUCache(settings.CACHE_MAX_ENTRIES),
+        shared,
+        settings.CACHE_DEFAULT_TTL_SECONDS
+    )
+
+# Global instance, built on first use
+cache: TieredCache = LazyService(build_cache, "cache")
+
+
+def _claim(state: Any):
+    # The first worker to look in an interval takes the run
+    if state is not None:
+        return state, False
+    return os.getpid(), True
+
+
+async def claim_run(job: str, interval_seconds: float) -> bool:
+    """Take this interval's run of a periodic job; False when another worker sharing the cache already has it"""
+    return await cache.update_async(f"{job}:run", _claim, max(1, int(interval_seconds) - 1))
+
+
+async def sweep_shared_cache():
+    if cache.is_built() and isinstance(cache.shared, SharedMemoryCacheTier):
+        swept = await asyncio.to_thread(cache.shared.sweep)
+        if swept:
+            print(f"Swept {swept} expired entries from the shared cache")
+
+
+register_periodic_task(
+    "shared_cache_sweep",
+    lambda: settings.CACHE_SHM_SWEEP_SECONDS if settings.CACHE_SHARED_BACKEND.lower() == "shm" else 0,
+    sweep_shared_cache
+)
@@ -0,0 +1,173 @@
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.services.cache import cache
+from app.services.db import execute
+from app.services.market_data import get_market_snapshot
+from app.services.search import search_engine, SHARED_OWNER
+from app.services.supabase_client import supabase_client
+from app.services.user_context import get_user_context, RECENT_BOOKINGS
+
+COMPARABLES_TTL_SECONDS = 300
+MAX_TOOL_RESULTS = 10
+
+# Function specs sent with each completion; the model calls them only when it needs the data
+TOOL_DEFINITIONS: List[Dict[str, Any]] = [
+    {
+        "type": "function",
+        "function": {
+            "name": "get_area_stats",
+            "description": "Cape Town short-term rental market statistics: average nightly price and listing count, overall and per area.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "area": {"type": "string", "description": "Area or suburb, e.g. \"Sea Point\". Omit for every area."}
+                }
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "find_comparable_listings",
+            "description": "Scraped listings similar to a property, for price and amenity comparisons.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "area": {"type": "string"},
+                    "property_type": {"type": "string", "description": "e.g. apartment, house, villa"},
+                    "bedrooms": {"type": "integer"},
+                    "description": {"type": "string", "description": "Free-text features to match, e.g. \"sea view pool\""},
+                    "limit": {"type": "integer", "minimum": 1, "maximum": MAX_TOOL_RESULTS}
+                }
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "get_my_properties",
+            "description": "The user's own active properties in Host Track.",
+            "parameters": {"type": "object", "properties": {}}
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "get_my_bookings",
+            "description": "The user's most recent confirmed bookings across their properties.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "limit": {"type": "integer", "minimum": 1, "maximum": RECENT_BOOKINGS}
+                }
+            }
+        }
+    }
+]
+
+
+def _limit(value: Any, default: int = 5) -> int:
+    try:
+        return max(1, min(MAX_TOOL_RESULTS, int(value)))
+    except (TypeError, ValueError):
+        return default
+
+
+class ChatTools:
+    """The tools one user's chat turn (or WebSocket session) may call, each answered from cached queries.
+
+    Results are also kept on the instance, so repeating a call with the same
+    arguments within a session costs nothing.
+    """
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.results: Dict[Tuple[str, str], str] = {}
+        self.handlers: Dict[str, Callable[..., Awaitable[Any]]] = {
+            "get_area_stats": self.get_area_stats,
+            "find_comparable_listings": self.find_comparable_listings,
+            "get_my_properties": self.get_my_properties,
+            "get_my_bookings": self.get_my_bookings
+        }
+
+    @property
+    def definitions(self) -> List[Dict[str, Any]]:
+        return TOOL_DEFINITIONS
+
+    async def call(self, name: str, arguments: str) -> str:
+        """Run a tool call from the model; errors are reported back to the model rather than raised"""
+        handler = self.handlers.get(name)
+        if handler is None:
+            return json.dumps({"error": f"Unknown tool {name}"})
+        key = (name, arguments or "{}")
+        if key in self.results:
+            return self.results[key]
+        try:
+            kwargs = json.loads(arguments or "{}")
+            self.results[key] = json.dumps(await handler(**kwargs), default=str)
+            return self.results[key]
+        except Exception as e:
+            print(f"Error running chat tool {name}: {e}")
+            return json.dumps({"error": str(e)})
+
+    async def get_area_stats(self, area: Optional[str] = None) -> Dict[str, Any]:
+        snapshot = await get_market_snapshot()
+        stats = {
+            "listing_count": snapshot.get("listing_count"),
+            "average_price": snapshot.get("average_price"),
+            "min_price": snapshot.get("min_price"),
+            "max_price": snapshot.get("max_price"),
+            "average_rating": snapshot.get("average_rating")
+        }
+        areas = snapshot.get("areas", {})
+        if area:
+            wanted = area.strip().lower()
+            matches = {name: value for name, value in areas.items() if wanted in name.lower()}
+            stats["areas"] = matches or {"note": f"No listings found for {area}", "known_areas": sorted(areas)}
+        else:
+            stats["areas"] = areas
+        return stats
+
+    async def find_comparable_listings(
+        self,
+        area: Optional[str] = None,
+        property_type: Optional[str] = None,
+        bedrooms: Optional[int] = None,
+        description: Optional[str] = None,
+        limit: Any = 5
+    ) -> List[Dict[str, Any]]:
+        limit = _limit(limit)
+        query = " ".join(str(part) for part in (
+            description, property_type, f"{bedrooms} bedrooms" if bedrooms else None, area
+        ) if part)
+        key = hashlib.sha256(json.dumps([area, property_type, query, limit]).encode("utf-8")).hexdigest()
+
+        async def load():
+            # Keyword ranking only: no embedding call on the chat path
+            hits = await search_engine.search(
+                "property", SHARED_OWNER, query or "property",
+                filters={"area": area, "property_type": property_type},
+                limit=limit
+            )
+            if not hits:
+                return []
+            supabase = supabase_client.get_client()
+            result = await execute(supabase.table("scraped_properties").select("id, property_data").in_(
+                "id", [hit.doc_id for hit in hits]
+            ))
+            rows = {row["id"]: row["property_data"] or {} for row in result.data or []}
+            fields = ("title", "location", "property_type", "price", "bedrooms", "bathrooms", "rating", "amenities")
+            return [
+                {field: rows[hit.doc_id].get(field) for field in fields if rows[hit.doc_id].get(field) is not None}
+                for hit in hits if hit.doc_id in rows
+            ]
+
+        return await cache.get_or_compute(f"chat_tools:comparables:{key}", load, COMPARABLES_TTL_SECONDS)
+
+    async def get_my_properties(self) -> List[Dict[str, Any]]:
+        return (await get_user_context(self.user_id))["properties"]
+
+    async def get_my_bookings(self, limit: Any = RECENT_BOOKINGS) -> List[Dict[str, Any]]:
+        return (await get_user_context(self.user_id))["bookings"][:_limit(limit)]
@@ -0,0 +1,71 @@
+import math
+import re
+from typing import Callable, List, Optional, Tuple
+
+from app.core.config import settings
+
+WORD_PATTERN = re.compile(r"\S+\s*")
+# English text averages about 0.75 words per cl100k token
+WORDS_PER_TOKEN = 0.75
+
+_tokenizer: Optional[Tuple[Callable[[str], list], Callable[[list], str], float]] = None
+
+
+def get_tokenizer() -> Tuple[Callable[[str], list], Callable[[list], str], float]:
+    """(encode, decode, units per token) for the embedding model's tokenizer.
+
+    Uses tiktoken's cl100k_base (the text-embedding-3 encoding) when it is
+    installed. Otherwise it falls back to whitespace-delimited words, which
+    are fewer than tokens, so budgets are scaled by WORDS_PER_TOKEN to
+    stay within the token limit.
+    """
+    global _tokenizer
+    if _tokenizer is None:
+        try:
+            import tiktoken  # Optional dependency
+
+            encoding = tiktoken.get_encoding("cl100k_base")
+            _tokenizer = (encoding.encode, encoding.decode, 1.0)
+        except Exception:
+            _tokenizer = (WORD_PATTERN.findall, "".join, WORDS_PER_TOKEN)
+    return _tokenizer
+
+
+def count_tokens(text: str) -> int:
+    """Tokens in ``text``; an estimate from the word count without tiktoken"""
+    encode, _, units_per_token = get_tokenizer()
+    return math.ceil(len(encode(text)) / units_per_token)
+
+
+def chunk_text(text: str, max_tokens: Optional[int] = None, overlap: Optional[int] = None) -> List[str]:
+    """Split text into windows of at most ``max_tokens`` tokens overlapping by ``overlap``"""
+    max_tokens = max_tokens or settings.CHUNK_MAX_TOKENS
+    overlap = settings.CHUNK_OVERLAP_TOKENS if overlap is None else overlap
+    overlap = min(overlap, max_tokens // 2)
+
+    encode, decode, units_per_token = get_tokenizer()
+    # Budgets in the tokenizer's own units (words in fallback mode)
+    size = max(1, int(max_tokens * units_per_token))
+    overlap = int(overlap * units_per_token)
+    units = encode(text)
+    if len(units) <= size:
+        return [text]
+
+    chunks = []
+    step = size - overlap
+    for start in range(0, len(units), step):
+        chunks.append(decode(units[start:start + size]).strip())
+        if start + size >= len(units):
+            break
+    return chunks
+
+
+def chunk_with_header(header: str, body: str, max_tokens: Optional[int] = None) -> List[str]:
+    """Chunk ``body`` and prefix every chunk with ``header`` so each one stands alone"""
+    max_tokens = max_tokens or settings.CHUNK_MAX_TOKENS
+    if not body:
+        return [header]
+
+    header_tokens = count_tokens(header) if header else 0
+    body_budget = max(max_tokens - header_tokens, max_tokens // 2)
+    return [f"{header} | {chunk}" if header else chunk for chunk in chunk_text(body, body_budget)]
@@ -0,0 +1,183 @@
+import base64
+import gzip
+import json
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set
+
+from app.core.background import register_periodic_task
+from app.core.config import settings
+from app.services.cache import cache, claim_run
+from app.services.db import db, execute
+from app.services.openai_client import openai_client
+from app.services.search import fetch_all_rows
+from app.services.supabase_client import supabase_client
+from app.services.usage import tag_usage
+
+ARCHIVE_COLUMNS = "conversation_id, user_id, summary, message_count, first_message_at, last_message_at, archived_at"
+# Transcript characters sent for summarization, most recent kept
+SUMMARY_TRANSCRIPT_CHARS = 12000
+# Old messages scanned per run while looking for idle conversations
+CANDIDATE_PAGE_SIZE = 1000
+CANDIDATE_MAX_PAGES = 10
+
+
+def encode_messages(rows: List[Dict[str, Any]]) -> str:
+    """Gzipped NDJSON, base64 encoded for a text column"""
+    ndjson = "".join(json.dumps(row, default=str) + "\n" for row in rows)
+    return base64.b64encode(gzip.compress(ndjson.encode("utf-8"))).decode("ascii")
+
+
+def decode_messages(archived: Optional[str]) -> List[Dict[str, Any]]:
+    if not archived:
+        return []
+    ndjson = gzip.decompress(base64.b64decode(archived)).decode("utf-8")
+    return [json.loads(line) for line in ndjson.splitlines() if line]
+
+
+def format_transcript(rows: List[Dict[str, Any]]) -> str:
+    transcript = "\n".join(f"{row['role']}: {row['content']}" for row in rows)
+    return transcript[-SUMMARY_TRANSCRIPT_CHARS:]
+
+
+def conversation_window_key(conversation_id: str, user_id: str) -> str:
+    return f"conversation:{user_id}:{conversation_id}:window"
+
+
+def summary_message(summary: str) -> Dict[str, str]:
+    """History entry standing in for a conversation's archived messages"""
+    return {"role": "system", "content": f"Summary of the earlier conversation:\n{summary}"}
+
+
+async def get_archive(
+    conversation_id: str,
+    include_messages: bool = False,
+    user_id: Optional[str] = None
+) -> Optional[Dict[str, Any]]:
+    """The conversation's archive row (summary and bounds), with its decoded messages if asked for.
+
+    With ``user_id`` only that user's archive is returned.
+    """
+    supabase = supabase_client.get_client()
+    columns = f"{ARCHIVE_COLUMNS}, messages" if include_messages else ARCHIVE_COLUMNS
+    query = supabase.table("conversation_archives").select(columns).eq("conversation_id", conversation_id)
+    if user_id is not None:
+        query = query.eq("user_id", user_id)
+    result = await execute(query)
+    if not result.data:
+        return None
+    archive = result.data[0]
+    if include_messages:
+        archive["messages"] = decode_messages(archive.get("messages"))
+    return archive
+
+
+async def get_summary(conversation_id: str, user_id: str) -> Optional[str]:
+    """Summary of the user's archived messages in the conversation; None when there are none"""
+    try:
+        archive = await get_archive(conversation_id, user_id=user_id)
+    except Exception as e:
+        # History still loads without the archive table
+        print(f"Error reading archive of conversation {conversation_id}: {e}")
+        return None
+    return archive.get("summary") if archive else None
+
+
+async def archive_conversation(conversation_id: str, cutoff: str) -> int:
+    """Summarize a conversation and move its messages up to ``cutoff`` into conversation_archives.
+
+    A conversation archived before keeps its earlier messages and builds on
+    its earlier summary. The archive row is written before any message is
+    deleted, so an interrupted run only leaves messages to archive again.
+    Returns the number of messages moved.
+    """
+    supabase = supabase_client.get_client()
+    rows = (await execute(supabase.table("conversation_messages").select("*").eq(
+        "conversation_id", conversation_id
+    ).lte("timestamp", cutoff).order("timestamp"))).data or []
+    if not rows:
+        return 0
+
+    previous = await get_archive(conversation_id, include_messages=True)
+    # Messages already archived by an interrupted run are not archived twice
+    archived_ids = {message["id"] for message in previous["messages"]} if previous else set()
+    messages = (previous["messages"] if previous else []) + [row for row in rows if row["id"] not in archived_ids]
+
+    tag_usage("conversation_compaction", rows[0].get("user_id"), conversation_id)
+    summary = await openai_client.summarize_conversation(
+        format_transcript(rows), previous["summary"] if previous else ""
+    )
+    await execute(supabase.table("conversation_archives").upsert({
+        "conversation_id": conversation_id,
+        "user_id": rows[0].get("user_id"),
+        "summary": summary,
+        "message_count": len(messages),
+        "first_message_at": messages[0]["timestamp"],
+        "last_message_at": messages[-1]["timestamp"],
+        "messages": encode_messages(messages),
+        "archived_at": datetime.utcnow().isoformat()
+    }))
+    # Only what was read: a message arriving meanwhile stays in the hot table
+    for start in range(0, len(rows), 200):
+        await execute(supabase.table("conversation_messages").delete().in_(
+            "id", [row["id"] for row in rows[start:start + 200]]
+        ))
+    await cache.delete_async(conversation_window_key(conversation_id, rows[0].get("user_id")))
+    return len(rows)
+
+
+def find_idle_conversations(cutoff: str, limit: int) -> List[str]:
+    """Conversations whose newest message is older than ``cutoff``, oldest activity first"""
+    supabase = supabase_client.get_client()
+    candidates: List[str] = []
+    seen: Set[str] = set()
+    after = None
+    for _ in range(CANDIDATE_MAX_PAGES):
+        query = supabase.table("conversation_messages").select("conversation_id, timestamp").lte("timestamp", cutoff)
+        if after is not None:
+            query = query.gt("timestamp", after)
+        page = query.order("timestamp").limit(CANDIDATE_PAGE_SIZE).execute().data or []
+        page_ids = [row["conversation_id"] for row in page if row["conversation_id"] not in seen]
+        page_ids = list(dict.fromkeys(page_ids))
+        seen.update(page_ids)
+
+        if page_ids:
+            active = {row["conversation_id"] for row in fetch_all_rows(
+                lambda: supabase.table("conversation_messages").select("conversation_id").in_(
+                    "conversation_id", page_ids
+                ).gt("timestamp", cutoff).order("id")
+            )}
+            candidates.extend(conversation_id for conversation_id in page_ids if conversation_id not in active)
+        if len(candidates) >= limit or len(page) < CANDIDATE_PAGE_SIZE:
+            break
+        after = page[-1]["timestamp"]
+    return candidates[:limit]
+
+
+async def compact_idle_conversations() -> Dict[str, int]:
+    """Periodic task: archive up to CONVERSATION_COMPACTION_BATCH conversations idle past CONVERSATION_IDLE_DAYS"""
+    report = {"conversations": 0, "messages": 0}
+    # Each run costs summarization calls, so workers sharing a cache tier take turns
+    if not await claim_run("conversation_compaction", settings.CONVERSATION_COMPACTION_SECONDS):
+        return report
+
+    cutoff = (datetime.utcnow() - timedelta(days=settings.CONVERSATION_IDLE_DAYS)).isoformat()
+    conversation_ids = await db.run(find_idle_conversations, cutoff, settings.CONVERSATION_COMPACTION_BATCH)
+    for conversation_id in conversation_ids:
+        try:
+            moved = await archive_conversation(conversation_id, cutoff)
+        except Exception as e:
+            print(f"Error archiving conversation {conversation_id}: {e}")
+            continue
+        report["conversations"] += 1
+        report["messages"] += moved
+
+    if report["conversations"]:
+        print(f"Archived {report['messages']} messages from {report['conversations']} idle conversations")
+    return report
+
+
+register_periodic_task(
+    "conversation_compaction",
+    lambda: settings.CONVERSATION_COMPACTION_SECONDS,
+    compact_idle_conversations
+)
@@ -0,0 +1,44 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from app.core.config import settings
+from app.core.lazy import LazyService
+
+
+class QueryRunner:
+    """Runs blocking supabase-py calls on a bounded thread pool.
+
+    supabase-py 2.3 (postgrest-py 0.13) only has a synchronous client, and
+    calling ``.execute()`` inside an ``async def`` stalls every other request
+    on the worker for the length of the round trip. Here queries overlap
+    instead, with at most DB_MAX_CONCURRENCY in flight per worker so a burst
+    cannot exhaust the HTTP connection pool.
+    """
+
+    def __init__(self, workers: int):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="supabase")
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run any blocking function (e.g. a helper issuing several queries) on the pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(fn, *args, **kwargs))
+
+    async def execute(self, query: Any) -> Any:
+        return await self.run(query.execute)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+
+def build_query_runner() -> QueryRunner:
+    return QueryRunner(settings.DB_MAX_CONCURRENCY)
+
+# Global instance, built on first use
+db: QueryRunner = LazyService(build_query_runner, "db")
+
+
+async def execute(query: Any) -> Any:
+    """``await execute(query)`` is the async form of ``query.execute()``"""
+    return await db.execute(query)
@@ -0,0 +1,193 @@
+import hashlib
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from app.core.background import register_periodic_task
+from app.core.config import settings
+from app.services.cache import claim_run
+from app.services.openai_client import openai_client, EMBEDDING_MODEL
+from app.services.supabase_client import supabase_client
+from app.services.usage import tag_usage
+from app.services.db import db, execute
+
+UPSERT_CONFLICT_COLUMNS = "content_id,content_type,chunk_index,model"
+DELETE_BATCH_SIZE = 200
+# Chunk rows per upsert request; each carries a full embedding vector
+UPSERT_BATCH_SIZE = 100
+PAGE_SIZE = 1000
+
+# content_type -> (source table, columns the chunker needs, chunker for one source row)
+ChunkBuilder = Callable[[Dict[str, Any]], List[str]]
+_content_sources: Dict[str, Tuple[str, str, ChunkBuilder]] = {}
+
+
+def register_content_source(content_type: str, table: str, columns: str, chunker: ChunkBuilder):
+    """Tell the store where the live content for ``content_type`` lives and how to chunk it.
+
+    Used by garbage collection (to find orphans) and by the re-embed job.
+    """
+    _content_sources[content_type] = (table, columns, chunker)
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _fetch_rows(table: str, columns: str, build_query: Optional[Callable[[Any], Any]] = None) -> List[Dict[str, Any]]:
+    supabase = supabase_client.get_client()
+    rows: List[Dict[str, Any]] = []
+    start = 0
+    while True:
+        query = supabase.table(table).select(columns)
+        if build_query is not None:
+            query = build_query(query)
+        page = query.range(start, start + PAGE_SIZE - 1).execute().data or []
+        rows.extend(page)
+        if len(page) < PAGE_SIZE:
+            return rows
+        start += PAGE_SIZE
+
+
+class EmbeddingStore:
+    """vector_embeddings rows keyed by (content_id, content_type, chunk_index, model).
+
+    Writes upsert on that key and then drop chunks the new version no longer
+    has, so the table holds exactly one vector per live chunk and model.
+    """
+
+    async def upsert_chunks(self, content_id: str, content_type: str, chunks: List[str]) -> Optional[List[List[float]]]:
+        """Embed each chunk (one batched request) and upsert one row per chunk"""
+        return (await self.upsert_many(content_type, {content_id: chunks})).get(content_id)
+
+    async def upsert_many(self, content_type: str, chunks_by_id: Dict[str, List[str]]) -> Dict[str, List[List[float]]]:
+        """upsert_chunks for many contents, with all their chunks embedded in batched requests together.
+
+        Returns each content id's chunk embeddings; contents without chunks are skipped.
+        """
+        chunks_by_id = {content_id: chunks for content_id, chunks in chunks_by_id.items() if chunks}
+        if not chunks_by_id:
+            return {}
+
+        vectors = await openai_client.get_embeddings([chunk for chunks in chunks_by_id.values() for chunk in chunks])
+        embeddings: Dict[str, List[List[float]]] = {}
+        start = 0
+        for content_id, chunks in chunks_by_id.items():
+            embeddings[content_id] = vectors[start:start + len(chunks)]
+            start += len(chunks)
+
+        # One shared timestamp marks the rows as a single version of each content
+        created_at = datetime.utcnow().isoformat()
+        rows = [
+            {
+                "content_id": content_id,
+                "content_type": content_type,
+                "chunk_index": index,
+                "model": EMBEDDING_MODEL,
+                "content": chunk,
+                "content_hash": content_hash(chunk),
+                "embedding": embedding,
+                "metadata": {"chunk_count": len(chunks)},
+                "created_at": created_at
+            }
+            for content_id, chunks in chunks_by_id.items()
+            for index, (chunk, embedding) in enumerate(zip(chunks, embeddings[content_id]))
+        ]
+
+        supabase = supabase_client.get_client()
+        for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+            await execute(supabase.table("vector_embeddings").upsert(
+                rows[start:start + UPSERT_BATCH_SIZE], on_conflict=UPSERT_CONFLICT_COLUMNS
+            ))
+
+        # Drop trailing chunks of longer previous versions, one delete per chunk count
+        by_count: Dict[int, List[str]] = {}
+        for content_id, chunks in chunks_by_id.items():
+            by_count.setdefault(len(chunks), []).append(content_id)
+        for chunk_count, content_ids in by_count.items():
+            for start in range(0, len(content_ids), DELETE_BATCH_SIZE):
+                await execute(supabase.table("vector_embeddings").delete().in_(
+                    "content_id", content_ids[start:start + DELETE_BATCH_SIZE]
+                ).eq("content_type", content_type).eq("model", EMBEDDING_MODEL).gte("chunk_index", chunk_count))
+        return embeddings
+
+    async def delete(self, content_id: str, content_type: Optional[str] = None):
+        supabase = supabase_client.get_client()
+        query = supabase.table("vector_embeddings").delete().eq("content_id", content_id)
+        if content_type is not None:
+            query = query.eq("content_type", content_type)
+        await execute(query)
+
+    def _delete_content_ids(self, content_type: str, content_ids: List[str], build_query=None) -> int:
+        supabase = supabase_client.get_client()
+        for start in range(0, len(content_ids), DELETE_BATCH_SIZE):
+            query = supabase.table("vector_embeddings").delete().eq("content_type", content_type).in_(
+                "content_id", content_ids[start:start + DELETE_BATCH_SIZE]
+            )
+            if build_query is not None:
+                query = build_query(query)
+            query.execute()
+        return len(content_ids)
+
+    async def collect_garbage(self) -> Dict[str, int]:
+        """Delete vectors whose content is gone, and old-model vectors already re-embedded"""
+        report = {"orphaned": 0, "superseded": 0}
+        for content_type, (table, _, _) in _content_sources.items():
+            rows = await db.run(_fetch_rows, "vector_embeddings", "content_id, model", lambda q: q.eq("content_type", content_type))
+            if not rows:
+                continue
+
+            live_ids: Set[str] = {row["id"] for row in await db.run(_fetch_rows, table, "id")}
+            embedded_ids = {row["content_id"] for row in rows}
+            orphaned = sorted(embedded_ids - live_ids)
+            report["orphaned"] += await db.run(self._delete_content_ids, content_type, orphaned)
+
+            current = {row["content_id"] for row in rows if row["model"] == EMBEDDING_MODEL}
+            superseded = sorted({
+                row["content_id"] for row in rows
+                if row["model"] != EMBEDDING_MODEL and row["content_id"] in current and row["content_id"] in live_ids
+            })
+            report["superseded"] += await db.run(
+                self._delete_content_ids, content_type, superseded, lambda q: q.neq("model", EMBEDDING_MODEL)
+            )
+
+        if any(report.values()):
+            print(f"Embedding GC removed {report['orphaned']} orphaned and {report['superseded']} superseded contents")
+        return report
+
+    async def reembed_stale(self, limit: Optional[int] = None) -> int:
+        """Re-embed content that only has vectors from an older model"""
+        reembedded = 0
+        for content_type, (table, columns, chunker) in _content_sources.items():
+            rows = await db.run(_fetch_rows, "vector_embeddings", "content_id, model", lambda q: q.eq("content_type", content_type))
+            current = {row["content_id"] for row in rows if row["model"] == EMBEDDING_MODEL}
+            stale = sorted({row["content_id"] for row in rows if row["content_id"] not in current})
+
+            supabase = supabase_client.get_client()
+            for start in range(0, len(stale), DELETE_BATCH_SIZE):
+                sources = (await execute(supabase.table(table).select(columns).in_(
+                    "id", stale[start:start + DELETE_BATCH_SIZE]
+                ))).data or []
+                for source in sources:
+                    await self.upsert_chunks(source["id"], content_type, chunker(source))
+                    reembedded += 1
+                    if limit is not None and reembedded >= limit:
+                        return reembedded
+
+        return reembedded
+
+    async def run_maintenance(self):
+        # Re-embedding costs API calls, so workers sharing a cache tier take turns
+        if not await claim_run("embedding_maintenance", settings.EMBEDDING_GC_INTERVAL_SECONDS):
+            return
+        tag_usage("embedding_maintenance")
+        await self.collect_garbage()
+        await self.reembed_stale(limit=settings.EMBEDDING_REEMBED_BATCH)
+
+# Global instance
+embedding_store = EmbeddingStore()
+
+register_periodic_task(
+    "embedding_maintenance",
+    lambda: settings.EMBEDDING_GC_INTERVAL_SECONDS,
+    embedding_store.run_maintenance
+)
@@ -0,0 +1,113 @@
+import csv
+import io
+import json
+import zlib
+from typing import Any, Callable, Dict, Iterator, Sequence
+
+from fastapi.responses import StreamingResponse
+
+from app.services.pagination import MAX_PAGE_SIZE, keyset_page, split_page, project
+
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+# CSV rows written per chunk handed to the response
+CSV_CHUNK_ROWS = 200
+
+
+def check_format(export_format: str):
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+
+
+def iter_rows(
+    query_factory: Callable[[], Any],
+    sort_column: str,
+    fields: Sequence[str],
+    descending: bool = False,
+    page_size: int = MAX_PAGE_SIZE
+) -> Iterator[Dict[str, Any]]:
+    """Every row of a query, fetched in keyset pages so only one page is held at a time.
+
+    ``query_factory`` builds a fresh filtered select for each page.
+    """
+    cursor = None
+    while True:
+        query = keyset_page(query_factory(), sort_column, cursor, page_size, descending)
+        rows, cursor = split_page(query.execute().data or [], page_size, sort_column)
+        yield from project(rows, fields)
+        if cursor is None:
+            return
+
+
+def _field_value(row: Dict[str, Any], field: str) -> Any:
+    column, _, key = field.partition(".")
+    value = row.get(column)
+    if key:
+        value = (value or {}).get(key)
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=str)
+    return value
+
+
+def encode_ndjson(rows: Iterator[Dict[str, Any]], fields: Sequence[str]) -> Iterator[str]:
+    for row in rows:
+        yield json.dumps(row, default=str) + "\n"
+
+
+def encode_csv(rows: Iterator[Dict[str, Any]], fields: Sequence[str], rows_per_chunk: int = CSV_CHUNK_ROWS) -> Iterator[str]:
+    """CSV with one column per field; JSON values are written as JSON text"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    # The header goes out before the first page is fetched
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+
+    pending = 0
+    for row in rows:
+        writer.writerow([_field_value(row, field) for field in fields])
+        pending += 1
+        if pending == rows_per_chunk:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if pending:
+        yield buffer.getvalue()
+
+
+def gzip_stream(chunks: Iterator[str]) -> Iterator[bytes]:
+    """Gzip a text stream incrementally; each chunk is flushed so clients see progress"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode("utf-8")) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_response(
+    rows: Iterator[Dict[str, Any]],
+    fields: Sequence[str],
+    export_format: str,
+    filename: str,
+    compress: bool = False
+) -> StreamingResponse:
+    """Stream ``rows`` as NDJSON or CSV, optionally as a .gz attachment.
+
+    The encoders are plain generators, so Starlette iterates them in its
+    thread pool and the blocking page queries never run on the event loop.
+    """
+    encoder = encode_csv if export_format == "csv" else encode_ndjson
+    chunks = encoder(rows, fields)
+    filename = f"{filename}.{export_format}"
+    media_type = EXPORT_FORMATS[export_format]
+    if compress:
+        chunks = gzip_stream(chunks)
+        filename += ".gz"
+        media_type = "application/gzip"
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
@@ -0,0 +1,108 @@
+import hashlib
+import os
+import uuid
+from datetime import datetime, timezone
+from typing import Any, BinaryIO, Dict, Optional
+
+from app.services.supabase_client import supabase_client
+from app.services.db import execute
+
+FINGERPRINT_BYTES = 1024 * 1024
+MAX_STORED_ERRORS = 100
+# A running job without a checkpoint for this long is presumed dead and may be resumed
+STALE_JOB_SECONDS = 10 * 60
+
+
+def upload_fingerprint(stream: BinaryIO) -> str:
+    """Size plus a hash of the first MiB, to tell a re-upload of the same file from another file"""
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(0)
+    digest = hashlib.sha256(stream.read(FINGERPRINT_BYTES)).hexdigest()
+    stream.seek(0)
+    return f"{size}:{digest}"
+
+
+class IngestJobStore:
+    """Checkpoints of scraper ingests in the ingest_jobs table.
+
+    ``records_committed`` only advances once a batch is stored and embedded,
+    so resuming from it never skips a record. Checkpointing is best effort:
+    if the table is unavailable the ingest still runs, it just cannot be resumed.
+    """
+
+    async def create(self, source: str, fingerprint: str) -> Dict[str, Any]:
+        now = datetime.utcnow().isoformat()
+        job = {
+            "id": str(uuid.uuid4()),
+            "source": source,
+            "fingerprint": fingerprint,
+            "status": "running",
+            "records_committed": 0,
+            "counts": {"new": 0, "updated": 0, "unchanged": 0, "duplicates": 0},
+            "errors": [],
+            "created_at": now,
+            "updated_at": now
+        }
+        try:
+            supabase = supabase_client.get_client()
+            await execute(supabase.table("ingest_jobs").insert(job))
+        except Exception as e:
+            print(f"Error creating ingest job, continuing without checkpoints: {e}")
+            job["id"] = None
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        supabase = supabase_client.get_client()
+        result = await execute(supabase.table("ingest_jobs").select("*").eq("id", job_id))
+        return result.data[0] if result.data else None
+
+    def is_stale(self, job: Dict[str, Any]) -> bool:
+        """Whether a running job's last checkpoint (its heartbeat) is older than STALE_JOB_SECONDS"""
+        updated_at = datetime.fromisoformat(str(job["updated_at"]).replace("Z", "+00:00"))
+        if updated_at.tzinfo is not None:
+            updated_at = updated_at.astimezone(timezone.utc).replace(tzinfo=None)
+        return (datetime.utcnow() - updated_at).total_seconds() > STALE_JOB_SECONDS
+
+    async def claim(self, job: Dict[str, Any]) -> bool:
+        """Mark a job running again for a resume; False when another request touched it first"""
+        now = datetime.utcnow().isoformat()
+        supabase = supabase_client.get_client()
+        # Compare-and-set on updated_at, so only one of two concurrent resumes gets the job
+        result = await execute(supabase.table("ingest_jobs").update({"status": "running", "updated_at": now}).eq(
+            "id", job["id"]
+        ).eq("updated_at", job["updated_at"]))
+        if not result.data:
+            return False
+        job["status"], job["updated_at"] = "running", now
+        return True
+
+    async def _update(self, job: Dict[str, Any], values: Dict[str, Any]):
+        if job.get("id") is None:
+            return
+        values["updated_at"] = datetime.utcnow().isoformat()
+        try:
+            supabase = supabase_client.get_client()
+            await execute(supabase.table("ingest_jobs").update(values).eq("id", job["id"]))
+        except Exception as e:
+            print(f"Error saving checkpoint for ingest job {job['id']}: {e}")
+
+    async def checkpoint(self, job: Dict[str, Any]):
+        await self._update(job, {
+            "records_committed": job["records_committed"],
+            "counts": job["counts"],
+            "errors": job["errors"][-MAX_STORED_ERRORS:]
+        })
+
+    async def finish(self, job: Dict[str, Any], status: str, error: Optional[str] = None):
+        job["status"] = status
+        await self._update(job, {
+            "status": status,
+            "records_committed": job["records_committed"],
+            "counts": job["counts"],
+            "errors": job["errors"][-MAX_STORED_ERRORS:],
+            "last_error": error
+        })
+
+# Global instance
+ingest_jobs = IngestJobStore()
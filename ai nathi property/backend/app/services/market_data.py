@@ -0,0 +1,126 @@
+import asyncio
+import hashlib
+import json
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from app.core.preload import register_preloader
+from app.services.cache import cache
+from app.services.db import execute
+from app.services.supabase_client import supabase_client
+
+MARKET_SNAPSHOT_KEY = "market:cape_town_snapshot"
+# How often a worker looks for a newer snapshot (through the shared tier first)
+MARKET_SNAPSHOT_TTL_SECONDS = 300
+
+
+@dataclass(frozen=True)
+class MarketSnapshot:
+    data: Dict[str, Any]  # Shared by every request; never modified
+    fingerprint: str
+    checked_at: float
+
+
+# The current snapshot. Loaded before workers fork, so they share its pages
+# copy-on-write for as long as the data does not change.
+_snapshot: Optional[MarketSnapshot] = None
+_refresh_task: Optional[asyncio.Task] = None
+
+
+def build_market_snapshot(competitors: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Aggregate raw competitor rows into the statistics the chat context uses"""
+    prices = [comp['current_price'] for comp in competitors if comp.get('current_price')]
+    ratings = [comp['rating'] for comp in competitors if comp.get('rating')]
+
+    snapshot: Dict[str, Any] = {
+        "listing_count": len(competitors),
+        "average_price": sum(prices) / len(prices) if prices else None,
+        "min_price": min(prices) if prices else None,
+        "max_price": max(prices) if prices else None,
+        "average_rating": sum(ratings) / len(ratings) if ratings else None,
+        "areas": {},
+        "top_properties": []
+    }
+
+    area_stats: Dict[str, List[Dict[str, Any]]] = {}
+    for comp in competitors:
+        area_stats.setdefault(comp.get('area') or 'Unknown', []).append(comp)
+
+    for area, props in area_stats.items():
+        area_prices = [p['current_price'] for p in props if p.get('current_price')]
+        if area_prices:
+            snapshot["areas"][area] = {
+                "average_price": sum(area_prices) / len(area_prices),
+                "count": len(props)
+            }
+
+    top_properties = sorted([comp for comp in competitors if comp.get('rating')],
+                            key=lambda x: x['rating'], reverse=True)[:3]
+    snapshot["top_properties"] = [
+        {
+            "title": prop.get('title'),
+            "area": prop.get('area'),
+            "current_price": prop.get('current_price'),
+            "rating": prop.get('rating'),
+            "review_count": prop.get('review_count')
+        }
+        for prop in top_properties
+    ]
+
+    return snapshot
+
+
+async def load_market_snapshot() -> Dict[str, Any]:
+    """Query competitor data and aggregate it into a snapshot"""
+    supabase = supabase_client.get_client()
+    competitors_result = await execute(supabase.table("cape_town_competitors").select("*"))
+    return build_market_snapshot(competitors_result.data or [])
+
+
+def snapshot_fingerprint(data: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def install_market_snapshot(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Make ``data`` the current snapshot, keeping the existing object when nothing changed"""
+    global _snapshot
+    fingerprint = snapshot_fingerprint(data)
+    if _snapshot is not None and _snapshot.fingerprint == fingerprint:
+        data = _snapshot.data
+    _snapshot = MarketSnapshot(data, fingerprint, time.monotonic())
+    return data
+
+
+async def get_market_snapshot() -> Dict[str, Any]:
+    """The current market snapshot (read-only).
+
+    Once it is older than MARKET_SNAPSHOT_TTL_SECONDS it is still served
+    while a single background refresh looks for a newer one.
+    """
+    global _refresh_task
+    snapshot = _snapshot
+    if snapshot is None:
+        return await refresh_market_snapshot()
+    if time.monotonic() - snapshot.checked_at >= MARKET_SNAPSHOT_TTL_SECONDS and (_refresh_task is None or _refresh_task.done()):
+        _refresh_task = asyncio.create_task(_refresh_in_background())
+    return snapshot.data
+
+
+async def _refresh_in_background():
+    try:
+        await refresh_market_snapshot()
+    except Exception as e:
+        print(f"Error refreshing market snapshot: {e}")
+
+
+async def refresh_market_snapshot() -> Dict[str, Any]:
+    """Install the newest snapshot: another worker's from the shared tier, else a fresh query"""
+    data = await cache.get_async(MARKET_SNAPSHOT_KEY, shared_only=True)
+    if data is None:
+        data = await load_market_snapshot()
+        await cache.set_async(MARKET_SNAPSHOT_KEY, data, MARKET_SNAPSHOT_TTL_SECONDS, shared_only=True)
+    return install_market_snapshot(data)
+
+
+register_preloader("market_snapshot", refresh_market_snapshot)
@@ -0,0 +1,156 @@
+import re
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+# USD per million (prompt, completion) tokens, for the cost estimates in the route metrics
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4-turbo": (10.00, 30.00),
+    "gpt-3.5-turbo": (0.50, 1.50)
+}
+# Cached prompt tokens are billed at this fraction of the prompt price
+CACHED_PROMPT_PRICE_FACTOR = 0.5
+# Latency samples kept per route for the percentiles
+LATENCY_WINDOW = 500
+
+ANALYSIS_PATTERN = re.compile(
+    r"\b(analy[sz]\w*|compar\w*|strateg\w*|forecast\w*|optimi[sz]\w*|explain\w*|why|plan\w*|"
+    r"recommend\w*|roi|invest\w*|should i|break ?down|report\w*|improve\w*|trend\w*|pros|cons)\b",
+    re.IGNORECASE
+)
+# Words beyond which a question is treated as analysis whatever it asks
+QUICK_MAX_WORDS = 40
+
+
+@dataclass(frozen=True)
+class ModelRoute:
+    name: str
+    model: str
+    max_tokens: int
+    temperature: float
+    timeout_seconds: float
+
+
+def chat_routes() -> Dict[str, ModelRoute]:
+    return {
+        "quick": ModelRoute(
+            name="quick",
+            model=settings.CHAT_QUICK_MODEL,
+            max_tokens=settings.CHAT_QUICK_MAX_TOKENS,
+            temperature=0.3,
+            timeout_seconds=settings.CHAT_QUICK_TIMEOUT_SECONDS
+        ),
+        "analysis": ModelRoute(
+            name="analysis",
+            model=settings.CHAT_ANALYSIS_MODEL,
+            max_tokens=settings.CHAT_ANALYSIS_MAX_TOKENS,
+            temperature=0.7,
+            timeout_seconds=settings.CHAT_ANALYSIS_TIMEOUT_SECONDS
+        )
+    }
+
+
+def classify_request(messages: List[Dict[str, str]]) -> str:
+    """"quick" for short factual or market lookups, "analysis" for everything else"""
+    question = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+    if ANALYSIS_PATTERN.search(question):
+        return "analysis"
+    if len(question.split()) > QUICK_MAX_WORDS or question.count("?") > 1:
+        return "analysis"
+    return "quick"
+
+
+def route_for(messages: List[Dict[str, str]], route: Optional[str] = None) -> ModelRoute:
+    routes = chat_routes()
+    return routes.get(route or classify_request(messages), routes["analysis"])
+
+
+def _usage_field(value: Any, name: str) -> Any:
+    # Fields newer than this SDK version (prompt_tokens_details, usage on stream chunks) arrive as plain dicts
+    if isinstance(value, dict):
+        return value.get(name)
+    return getattr(value, name, None)
+
+
+def usage_tokens(usage: Any) -> Tuple[int, int, int]:
+    """(prompt, completion, cached prompt) tokens of a response's ``usage``, zeros when absent"""
+    details = _usage_field(usage, "prompt_tokens_details")
+    return (
+        _usage_field(usage, "prompt_tokens") or 0,
+        _usage_field(usage, "completion_tokens") or 0,
+        _usage_field(details, "cached_tokens") or 0
+    )
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0) -> float:
+    prompt_price, completion_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    prompt_cost = (prompt_tokens - cached_tokens + cached_tokens * CACHED_PROMPT_PRICE_FACTOR) * prompt_price
+    return (prompt_cost + completion_tokens * completion_price) / 1_000_000
+
+
+class RouteMetrics:
+    """Per-route request counts, latency percentiles, token usage and estimated cost for this worker"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes: Dict[str, Dict[str, Any]] = {}
+
+    def _route(self, name: str) -> Dict[str, Any]:
+        return self._routes.setdefault(name, {
+            "requests": 0,
+            "timeouts": 0,
+            "fallbacks": 0,
+            "errors": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "cached_tokens": 0,
+            "cost_usd": 0.0,
+            "latencies": deque(maxlen=LATENCY_WINDOW)
+        })
+
+    def record(self, route: str, model: str, seconds: float, usage: Any = None, fallback: bool = False):
+        prompt_tokens, completion_tokens, cached_tokens = usage_tokens(usage)
+        with self._lock:
+            stats = self._route(route)
+            stats["requests"] += 1
+            stats["fallbacks"] += int(fallback)
+            stats["prompt_tokens"] += prompt_tokens
+            stats["completion_tokens"] += completion_tokens
+            stats["cached_tokens"] += cached_tokens
+            stats["cost_usd"] += estimate_cost(model, prompt_tokens, completion_tokens, cached_tokens)
+            stats["latencies"].append(seconds)
+
+    def record_failure(self, route: str, timeout: bool):
+        with self._lock:
+            self._route(route)["timeouts" if timeout else "errors"] += 1
+
+    def report(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            report = {}
+            for name, stats in self._routes.items():
+                latencies = sorted(stats["latencies"])
+                percentile = lambda p: round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000) if latencies else None
+                requests = stats["requests"]
+                report[name] = {
+                    "requests": requests,
+                    "timeouts": stats["timeouts"],
+                    "fallbacks": stats["fallbacks"],
+                    "errors": stats["errors"],
+                    "latency_p50_ms": percentile(0.5),
+                    "latency_p95_ms": percentile(0.95),
+                    "prompt_tokens": stats["prompt_tokens"],
+                    "completion_tokens": stats["completion_tokens"],
+                    "cached_tokens": stats["cached_tokens"],
+                    "cost_usd": round(stats["cost_usd"], 6),
+                    "cost_per_request_usd": round(stats["cost_usd"] / requests, 6) if requests else None
+                }
+            return report
+
+
+# Global instance
+route_metrics = RouteMetrics()
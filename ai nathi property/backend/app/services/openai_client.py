@@ -1,22 +1,168 @@
-import openai
+import asyncio
+import dataclasses
+import hashlib
+import time
 from app.core.config import settings
-from typing import List, Dict, Any
+from app.core.lazy import LazyService
+from app.services.cache import cache
+from app.services.model_router import ModelRoute, chat_routes, route_for, route_metrics
+from app.services.usage import usage_ledger
+from typing import List, Dict, Any, AsyncIterator, Optional, Tuple
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_CACHE_TTL_SECONDS = 24 * 60 * 60
+# Completions per chat turn that may request tool calls before the model must answer
+MAX_TOOL_ROUNDS = 3
+
+def embedding_cache_key(text: str) -> str:
+    return f"embedding:{EMBEDDING_MODEL}:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
 
 class OpenAIClient:
     def __init__(self):
+        import openai  # Deferred: the SDK is slow to import and only needed once a request arrives
+        
         openai.api_key = settings.OPENAI_API_KEY
         self.client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
+        self.timeout_error = openai.APITimeoutError
+        # Failures worth one more attempt on the fallback configuration (timeouts are connection errors)
+        self.transient_errors = (openai.APIConnectionError, openai.InternalServerError, openai.RateLimitError)
+    
+    def close(self):
+        self.client.close()
     
     async def get_embedding(self, text: str) -> List[float]:
         """Get embedding for text using OpenAI's embedding model"""
-        response = self.client.embeddings.create(
-            model="text-embedding-3-small",
-            input=text
-        )
-        return response.data[0].embedding
+        return (await self.get_embeddings([text]))[0]
+    
+    async def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Get embeddings for many texts, sending cache misses in batched requests"""
+        cache_keys = [embedding_cache_key(text) for text in texts]
+        embeddings = await cache.get_many_async(cache_keys)
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        
+        batch_size = settings.EMBEDDING_BATCH_SIZE
+        for start in range(0, len(missing), batch_size):
+            batch = missing[start:start + batch_size]
+            started = time.perf_counter()
+            response = await asyncio.to_thread(
+                self.client.embeddings.create,
+                model=EMBEDDING_MODEL,
+                input=[texts[i] for i in batch]
+            )
+            usage_ledger.record(EMBEDDING_MODEL, time.perf_counter() - started, response.usage)
+            for i, item in zip(batch, sorted(response.data, key=lambda item: item.index)):
+                embeddings[i] = item.embedding
+            await cache.set_many_async({cache_keys[i]: embeddings[i] for i in batch}, EMBEDDING_CACHE_TTL_SECONDS)
+        
+        return embeddings
+    
+    async def get_chat_completion(
+        self,
+        messages: List[Dict[str, str]],
+        context: str = "",
+        route: Optional[str] = None,
+        tools: Any = None
+    ) -> str:
+        """Get chat completion with context.
+        
+        The request is routed to the "quick" or "analysis" model configuration
+        (classified from the latest user message unless ``route`` is given). If
+        that call times out or fails transiently it is retried once on
+        CHAT_FALLBACK_MODEL.
+        
+        With ``tools`` (a ChatTools) the model fetches the data it needs
+        through function calls, for up to MAX_TOOL_ROUNDS rounds.
+        """
+        full_messages = self._chat_messages(messages, context, tools)
+        chosen = route_for(messages, route)
+        
+        for round_number in range(MAX_TOOL_ROUNDS + 1):
+            options = self._tool_options(tools, round_number)
+            # The SDK client is synchronous: run it on a thread so the event loop keeps serving
+            reply = await asyncio.to_thread(self._complete_with_fallback, chosen, full_messages, options)
+            if not getattr(reply, "tool_calls", None):
+                return reply.content
+            
+            calls = [
+                {"id": call.id, "name": call.function.name, "arguments": call.function.arguments}
+                for call in reply.tool_calls
+            ]
+            await self._run_tools(full_messages, reply.content, calls, tools)
+    
+    async def stream_chat_completion(
+        self,
+        messages: List[Dict[str, str]],
+        context: str = "",
+        route: Optional[str] = None,
+        tools: Any = None
+    ) -> AsyncIterator[str]:
+        """get_chat_completion, yielding the answer's text as the model produces it"""
+        full_messages = self._chat_messages(messages, context, tools)
+        chosen = route_for(messages, route)
+        
+        for round_number in range(MAX_TOOL_ROUNDS + 1):
+            options = {
+                **self._tool_options(tools, round_number),
+                "stream": True,
+                # Not modelled by this SDK version: asks for a final chunk carrying the token usage
+                "extra_body": {"stream_options": {"include_usage": True}}
+            }
+            start = time.perf_counter()
+            stream, model = await asyncio.to_thread(self._open_stream, chosen, full_messages, options)
+            
+            content: List[str] = []
+            calls: Dict[int, Dict[str, str]] = {}
+            usage = None
+            while True:
+                chunk = await asyncio.to_thread(next, stream, None)
+                if chunk is None:
+                    break
+                if not chunk.choices:
+                    usage = getattr(chunk, "usage", None) or usage
+                    continue
+                delta = chunk.choices[0].delta
+                if delta.content:
+                    content.append(delta.content)
+                    yield delta.content
+                # Tool calls arrive in fragments keyed by their index
+                for fragment in delta.tool_calls or []:
+                    call = calls.setdefault(fragment.index, {"id": "", "name": "", "arguments": ""})
+                    if fragment.id:
+                        call["id"] = fragment.id
+                    if fragment.function and fragment.function.name:
+                        call["name"] += fragment.function.name
+                    if fragment.function and fragment.function.arguments:
+                        call["arguments"] += fragment.function.arguments
+            
+            seconds = time.perf_counter() - start
+            route_metrics.record(chosen.name, model, seconds, usage, model != chosen.model)
+            usage_ledger.record(model, seconds, usage)
+            if not calls:
+                return
+            await self._run_tools(full_messages, "".join(content) or None, [calls[index] for index in sorted(calls)], tools)
     
-    async def get_chat_completion(self, messages: List[Dict[str, str]], context: str = "") -> str:
-        """Get chat completion with context"""
+    async def summarize_conversation(self, transcript: str, previous_summary: str = "") -> str:
+        """A short summary of a conversation transcript that can stand in for it as history"""
+        earlier = f"Summary of the conversation before this transcript:\n{previous_summary}\n\n" if previous_summary else ""
+        messages = [
+            {
+                "role": "system",
+                "content": "Summarize this conversation between a short-term rental host and their property assistant "
+                           "in at most 150 words. Keep the properties, figures, decisions and open questions needed to continue it."
+            },
+            {"role": "user", "content": f"{earlier}Transcript:\n{transcript}"}
+        ]
+        # Quick model settings, reported as their own route in the metrics
+        route = dataclasses.replace(chat_routes()["quick"], name="summary")
+        reply = await asyncio.to_thread(self._complete_with_fallback, route, messages, {})
+        return reply.content or ""
+    
+    def _chat_messages(self, messages: List[Dict[str, str]], context: str, tools: Any) -> List[Dict[str, Any]]:
+        tool_note = (
+            "\n            Use the provided tools to look up market statistics, comparable listings, "
+            "or the user's properties and bookings when the question needs them."
+            if tools is not None else ""
+        )
         system_message = {
             "role": "system",
             "content": f"""You are an AI assistant specialized in property portfolio management for short-term rentals. 
@@ -26,19 +172,94 @@ class OpenAIClient:
             {context}
             
             Always provide helpful, accurate, and actionable advice based on the provided context. 
-            If you don't have enough information, ask clarifying questions."""
+            If you don't have enough information, ask clarifying questions.{tool_note}"""
         }
-        
-        full_messages = [system_message] + messages
-        
-        response = self.client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=full_messages,
-            max_tokens=1000,
-            temperature=0.7
-        )
-        
-        return response.choices[0].message.content
+        return [system_message] + messages
+    
+    def _tool_options(self, tools: Any, round_number: int) -> Dict[str, Any]:
+        if tools is None:
+            return {}
+        # The last round must answer with what it has
+        return {
+            "tools": tools.definitions,
+            "tool_choice": "auto" if round_number < MAX_TOOL_ROUNDS else "none"
+        }
+    
+    async def _run_tools(self, full_messages: List[Dict[str, Any]], content: Optional[str], calls: List[Dict[str, str]], tools: Any):
+        """Append the model's tool calls and their results to the conversation"""
+        full_messages.append({
+            "role": "assistant",
+            "content": content,
+            "tool_calls": [
+                {"id": call["id"], "type": "function", "function": {"name": call["name"], "arguments": call["arguments"]}}
+                for call in calls
+            ]
+        })
+        results = await asyncio.gather(*[tools.call(call["name"], call["arguments"]) for call in calls])
+        for call, result in zip(calls, results):
+            full_messages.append({"role": "tool", "tool_call_id": call["id"], "content": result})
+    
+    def _open_stream(self, route: ModelRoute, messages: List[Dict[str, Any]], options: Dict[str, Any]) -> Tuple[Any, str]:
+        """(chunk iterator, model) for a streamed completion, falling back like _complete_with_fallback"""
+        try:
+            return self._create(route, route.model, messages, route.timeout_seconds, options, max_retries=0), route.model
+        except self.transient_errors as e:
+            if not settings.CHAT_FALLBACK_MODEL:
+                raise
+            print(f"Chat route {route.name} failed on {route.model} ({type(e).__name__}), retrying on {settings.CHAT_FALLBACK_MODEL}")
+            fallback = settings.CHAT_FALLBACK_MODEL
+            return self._create(route, fallback, messages, settings.CHAT_FALLBACK_TIMEOUT_SECONDS, options), fallback
+    
+    def _complete_with_fallback(self, route: ModelRoute, messages: List[Dict[str, Any]], options: Dict[str, Any]) -> Any:
+        try:
+            # No SDK retries here: a slow primary goes straight to the fallback
+            return self._complete(route, route.model, messages, route.timeout_seconds, options, max_retries=0)
+        except self.transient_errors as e:
+            if not settings.CHAT_FALLBACK_MODEL:
+                raise
+            print(f"Chat route {route.name} failed on {route.model} ({type(e).__name__}), retrying on {settings.CHAT_FALLBACK_MODEL}")
+            return self._complete(
+                route, settings.CHAT_FALLBACK_MODEL, messages, settings.CHAT_FALLBACK_TIMEOUT_SECONDS, options, fallback=True
+            )
+    
+    def _complete(
+        self,
+        route: ModelRoute,
+        model: str,
+        messages: List[Dict[str, Any]],
+        timeout: float,
+        options: Dict[str, Any],
+        max_retries: int = 2,
+        fallback: bool = False
+    ) -> Any:
+        """One completion; returns the reply message"""
+        start = time.perf_counter()
+        response = self._create(route, model, messages, timeout, options, max_retries)
+        seconds = time.perf_counter() - start
+        route_metrics.record(route.name, model, seconds, response.usage, fallback)
+        usage_ledger.record(model, seconds, response.usage)
+        return response.choices[0].message
+    
+    def _create(
+        self,
+        route: ModelRoute,
+        model: str,
+        messages: List[Dict[str, Any]],
+        timeout: float,
+        options: Dict[str, Any],
+        max_retries: int = 2
+    ) -> Any:
+        try:
+            return self.client.with_options(timeout=timeout, max_retries=max_retries).chat.completions.create(
+                model=model,
+                messages=messages,
+                max_tokens=route.max_tokens,
+                temperature=route.temperature,
+                **options
+            )
+        except Exception as e:
+            route_metrics.record_failure(route.name, timeout=isinstance(e, self.timeout_error))
+            raise
 
-# Global instance
-openai_client = OpenAIClient()
+# Global instance, built on first use
+openai_client: OpenAIClient = LazyService(OpenAIClient, "openai_client")
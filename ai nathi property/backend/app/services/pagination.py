@@ -0,0 +1,126 @@
+import base64
+import json
+import re
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+# List endpoints whose body is a bare JSON array return their cursor here
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+JSON_KEY_PATTERN = re.compile(r"^[A-Za-z0-9_]+$")
+
+
+class PaginationError(ValueError):
+    """A cursor, page size or field list from the client is invalid"""
+
+
+def encode_cursor(row: Dict[str, Any], sort_column: str) -> str:
+    payload = json.dumps([row[sort_column], row["id"]])
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, Any]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return value, row_id
+    except Exception:
+        raise PaginationError("Invalid cursor")
+
+
+def page_size(limit: Optional[int]) -> int:
+    if limit is None:
+        return DEFAULT_PAGE_SIZE
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        raise PaginationError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    return limit
+
+
+def _json_path(field: str) -> Optional[Tuple[str, str]]:
+    column, _, key = field.partition(".")
+    return (column, key) if key else None
+
+
+def requested_fields(fields: Optional[str], allowed: Sequence[str], json_columns: Sequence[str] = ()) -> List[str]:
+    """The comma-separated ``fields`` the client asked for (all of ``allowed`` by default).
+
+    Keys inside the JSON columns in ``json_columns`` can be picked as
+    "column.key", e.g. "property_data.price", so summaries skip the whole blob.
+    """
+    if not fields:
+        return list(allowed)
+    requested = list(dict.fromkeys(field.strip() for field in fields.split(",") if field.strip()))
+    unknown = []
+    for field in requested:
+        path = _json_path(field)
+        if path is not None:
+            if path[0] not in json_columns or not JSON_KEY_PATTERN.match(path[1]):
+                unknown.append(field)
+        elif field not in allowed:
+            unknown.append(field)
+    if unknown:
+        raise PaginationError(f"Unknown fields: {', '.join(unknown)}")
+    return requested
+
+
+def _alias(column: str, key: str) -> str:
+    return f"{column}__{key}"
+
+
+def select_columns(fields: Sequence[str], always: Sequence[str] = ()) -> str:
+    """PostgREST select list for ``fields`` plus the columns the keyset needs"""
+    columns = []
+    for field in list(always) + list(fields):
+        path = _json_path(field)
+        columns.append(f"{_alias(*path)}:{path[0]}->{path[1]}" if path else field)
+    return ", ".join(dict.fromkeys(columns))
+
+
+def _quote(value: Any) -> str:
+    # Values inside PostgREST logic trees are double-quoted so ":", "," and "." are literal
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def keyset_page(query: Any, sort_column: str, cursor: Optional[str], limit: int, descending: bool = True) -> Any:
+    """Restrict a select to the page after ``cursor`` in (sort_column, id) order.
+
+    Fetches one row more than ``limit`` so split_page can tell whether
+    another page exists without a count query.
+    """
+    direction = ".desc" if descending else ""
+    if cursor:
+        value, row_id = decode_cursor(cursor)
+        operator = "lt" if descending else "gt"
+        # postgrest-py has no or() builder in this version, so the logic tree goes in as a raw parameter
+        query.params = query.params.add(
+            "or",
+            f"({sort_column}.{operator}.{_quote(value)},"
+            f"and({sort_column}.eq.{_quote(value)},id.{operator}.{_quote(row_id)}))"
+        )
+    # A single order parameter: repeated ones are not combined by PostgREST
+    query.params = query.params.add("order", f"{sort_column}{direction},id{direction}")
+    return query.limit(limit + 1)
+
+
+def split_page(rows: List[Dict[str, Any]], limit: int, sort_column: str) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """(rows of this page, cursor of the next page or None)"""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1], sort_column)
+
+
+def project(rows: List[Dict[str, Any]], fields: Sequence[str]) -> List[Dict[str, Any]]:
+    """Drop columns that were selected only for the keyset and nest picked JSON keys again"""
+    projected = []
+    for row in rows:
+        item: Dict[str, Any] = {}
+        for field in fields:
+            path = _json_path(field)
+            if path is None:
+                if field in row:
+                    item[field] = row[field]
+            else:
+                item.setdefault(path[0], {})[path[1]] = row.get(_alias(*path))
+        projected.append(item)
+    return projected
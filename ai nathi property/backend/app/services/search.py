@@ -0,0 +1,748 @@
+import asyncio
+import json
+import math
+import os
+import re
+import threading
+import uuid
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from app.core.background import register_periodic_task
+from app.core.config import settings
+from app.core.lazy import LazyService
+from app.core.preload import register_preloader
+from app.services.cache import cache
+from app.services.db import db, execute
+from app.services.openai_client import EMBEDDING_MODEL
+from app.services.snapshot_store import Snapshot, SnapshotStore
+from app.services.supabase_client import supabase_client
+from app.services.vector_index import VectorIndex
+
+# BM25 and reciprocal rank fusion parameters
+BM25_K1 = 1.5
+BM25_B = 0.75
+RRF_K = 60
+CANDIDATES_PER_RANKER = 50
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[.,][0-9]+)*")
+PREFIXED_NUMBER = re.compile(r"^[a-z]+([0-9][0-9.]*)$")
+
+PartitionKey = Tuple[str, str]
+
+# Catch-up after a snapshot restarts this far before the snapshot was taken,
+# covering clock skew between workers and the database
+WATERMARK_SKEW_SECONDS = 300
+# Lifetime of the shared version stamp of a partition without a delta log
+PARTITION_STAMP_TTL_SECONDS = 7 * 86400
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lexical tokens that keep exact values searchable.
+
+    Thousands separators are dropped so "R1,105" and "R1105" match, and
+    currency-prefixed numbers also index the bare number ("r1105" -> "1105").
+    """
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        token = token.replace(",", "")
+        tokens.append(token)
+        prefixed = PREFIXED_NUMBER.match(token)
+        if prefixed:
+            tokens.append(prefixed.group(1))
+    return tokens
+
+
+def parse_embedding(value: Any) -> Optional[List[float]]:
+    """pgvector columns come back from PostgREST as "[0.1,0.2,...]" strings"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return json.loads(value)
+    return list(value)
+
+
+class BM25Index:
+    """Inverted index with BM25 scoring that supports incremental updates"""
+
+    def __init__(self):
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.doc_lengths: Dict[str, int] = {}
+        self.doc_terms: Dict[str, Counter] = {}
+        self.total_length = 0
+
+    def add(self, doc_id: str, text: str):
+        self.add_terms(doc_id, Counter(tokenize(text)))
+
+    def add_terms(self, doc_id: str, terms: Counter):
+        self.remove(doc_id)
+        self.doc_terms[doc_id] = terms
+        length = sum(terms.values())
+        self.doc_lengths[doc_id] = length
+        self.total_length += length
+        for term, frequency in terms.items():
+            self.postings.setdefault(term, {})[doc_id] = frequency
+
+    def remove(self, doc_id: str):
+        terms = self.doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        self.total_length -= self.doc_lengths.pop(doc_id)
+        for term in terms:
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self.postings[term]
+
+    def search(self, query: str, allowed: Optional[set] = None, limit: int = CANDIDATES_PER_RANKER) -> List[Tuple[str, float]]:
+        doc_count = len(self.doc_lengths)
+        if doc_count == 0:
+            return []
+        average_length = self.total_length / doc_count
+
+        scores: Dict[str, float] = {}
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (doc_count - len(posting) + 0.5) / (len(posting) + 0.5))
+            for doc_id, frequency in posting.items():
+                if allowed is not None and doc_id not in allowed:
+                    continue
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[doc_id] / average_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+
+@dataclass
+class SearchDocument:
+    doc_id: str
+    text: str
+    filters: Dict[str, Any] = field(default_factory=dict)
+    embeddings: Optional[List[List[float]]] = None  # one per chunk
+
+
+@dataclass
+class SearchHit:
+    doc_id: str
+    score: float
+    lexical_rank: Optional[int] = None
+    vector_rank: Optional[int] = None
+    chunk_index: Optional[int] = None
+    filters: Dict[str, Any] = field(default_factory=dict)
+
+
+def _normalise_filter_value(value: Any) -> Any:
+    return value.lower() if isinstance(value, str) else value
+
+
+class SearchPartition:
+    """Lexical and vector indexes over one user's (or one shared) document set"""
+
+    def __init__(self, vectors: Optional[VectorIndex] = None):
+        self.lexical = BM25Index()
+        self.vectors = vectors or VectorIndex()
+        self.filters: Dict[str, Dict[str, Any]] = {}
+        self.lock = threading.Lock()
+
+    def upsert(self, document: SearchDocument):
+        with self.lock:
+            self.lexical.add(document.doc_id, document.text)
+            self.filters[document.doc_id] = document.filters
+            if document.embeddings:
+                self.vectors.add(document.doc_id, document.embeddings)
+
+    def remove(self, doc_id: str):
+        with self.lock:
+            self.lexical.remove(doc_id)
+            self.vectors.remove(doc_id)
+            self.filters.pop(doc_id, None)
+
+    @classmethod
+    def from_snapshot(cls, snapshot: Snapshot, vectors: VectorIndex) -> "SearchPartition":
+        partition = cls(vectors)
+        for document in snapshot.documents:
+            partition.lexical.add_terms(document["doc_id"], Counter(document["terms"]))
+            partition.filters[document["doc_id"]] = document.get("filters") or {}
+        vectors.attach(snapshot.codes, snapshot.scales, snapshot.full, snapshot.ids, snapshot.chunks)
+        return partition
+
+    def export(self) -> Dict[str, Any]:
+        """Vector arrays plus each document's BM25 term counts and filters; the caller holds the lock"""
+        state = self.vectors.export()
+        state["documents"] = [
+            {"doc_id": doc_id, "terms": dict(self.lexical.doc_terms.get(doc_id, {})), "filters": filters}
+            for doc_id, filters in self.filters.items()
+        ]
+        return state
+
+    def matching(self, filters: Dict[str, Any]) -> Optional[set]:
+        """Doc ids passing every filter; a list value matches any of its entries"""
+        active = {key: value for key, value in filters.items() if value not in (None, [], "")}
+        if not active:
+            return None
+
+        allowed = set()
+        for doc_id, doc_filters in self.filters.items():
+            for key, expected in active.items():
+                actual = _normalise_filter_value(doc_filters.get(key))
+                if callable(expected):
+                    if not expected(doc_filters.get(key)):
+                        break
+                elif isinstance(expected, (list, tuple, set)):
+                    if actual not in {_normalise_filter_value(item) for item in expected}:
+                        break
+                elif actual != _normalise_filter_value(expected):
+                    break
+            else:
+                allowed.add(doc_id)
+        return allowed
+
+    def search(
+        self,
+        query: str,
+        query_embedding: Optional[List[float]] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        limit: int = 10
+    ) -> List[SearchHit]:
+        """Fuse BM25 and vector rankings with reciprocal rank fusion"""
+        with self.lock:
+            allowed = self.matching(filters or {})
+            if allowed is not None and not allowed:
+                return []
+
+            lexical = self.lexical.search(query, allowed) if query else []
+            vector = self.vectors.search(query_embedding, allowed, CANDIDATES_PER_RANKER) if query_embedding is not None else []
+
+            hits: Dict[str, SearchHit] = {}
+            for rank, (doc_id, _) in enumerate(lexical, start=1):
+                hit = hits.setdefault(doc_id, SearchHit(doc_id, 0.0, filters=self.filters.get(doc_id, {})))
+                hit.lexical_rank = rank
+                hit.score += 1.0 / (RRF_K + rank)
+            for rank, (doc_id, _, chunk_index) in enumerate(vector, start=1):
+                hit = hits.setdefault(doc_id, SearchHit(doc_id, 0.0, filters=self.filters.get(doc_id, {})))
+                hit.vector_rank = rank
+                hit.chunk_index = chunk_index
+                hit.score += 1.0 / (RRF_K + rank)
+
+        return sorted(hits.values(), key=lambda hit: hit.score, reverse=True)[:limit]
+
+
+PartitionLoader = Callable[[str], Awaitable[Iterable[SearchDocument]]]
+# (owner, watermark) -> documents changed since the watermark, and every live doc id
+PartitionCatchUp = Callable[[str, str], Awaitable[Tuple[Iterable[SearchDocument], Optional[Set[str]]]]]
+
+# content_type -> coroutine building every document of one partition owner
+PARTITION_LOADERS: Dict[str, PartitionLoader] = {}
+# content_type -> coroutine catching a restored snapshot up; only these types are snapshotted
+PARTITION_CATCH_UP: Dict[str, PartitionCatchUp] = {}
+
+
+def register_partition_loader(content_type: str, loader: PartitionLoader, catch_up: Optional[PartitionCatchUp] = None):
+    PARTITION_LOADERS[content_type] = loader
+    if catch_up is not None:
+        PARTITION_CATCH_UP[content_type] = catch_up
+
+
+def snapshot_watermark() -> str:
+    return (datetime.utcnow() - timedelta(seconds=WATERMARK_SKEW_SECONDS)).isoformat()
+
+
+def partition_stamp_key(key: PartitionKey) -> str:
+    return f"search:{key[0]}:{key[1]}:stamp"
+
+
+def document_entry(document: SearchDocument) -> Dict[str, Any]:
+    return {
+        "op": "upsert",
+        "doc_id": document.doc_id,
+        "text": document.text,
+        "filters": document.filters,
+        "embeddings": document.embeddings
+    }
+
+
+class PartitionJournal:
+    """Keeps a resident partition in step with its snapshot's delta log.
+
+    Every change is appended to the log under the store lock after replaying
+    whatever other workers appended first, so all workers apply the same
+    changes in the same order. When another worker compacts, the partition
+    re-attaches to the new snapshot's mapped arrays.
+    """
+
+    def __init__(self, store: SnapshotStore, version: str, watermark: str):
+        self.store = store
+        self.version = version
+        self.watermark = watermark
+        self.offset = 0
+        self.pending = 0  # log entries not yet folded into a snapshot
+
+    def _apply(self, partition: SearchPartition, entry: Dict[str, Any]):
+        op = entry.get("op")
+        if op == "upsert":
+            partition.upsert(SearchDocument(
+                entry["doc_id"], entry.get("text") or "", entry.get("filters") or {}, entry.get("embeddings")
+            ))
+        elif op == "remove":
+            partition.remove(entry["doc_id"])
+        elif op == "watermark":
+            self.watermark = max(self.watermark, entry["value"])
+
+    def replay(self, partition: SearchPartition):
+        """Apply log entries appended since our offset; the caller holds the store lock"""
+        while True:
+            entries, self.offset = self.store.read_log(self.version, self.offset)
+            for entry in entries:
+                self._apply(partition, entry)
+            self.pending += len(entries)
+
+            current = self.store.current()
+            if current is None or current == self.version:
+                return
+            # Another worker compacted; its snapshot holds exactly what we have now
+            snapshot = self.store.open(current)
+            with partition.lock:
+                partition.vectors.attach(snapshot.codes, snapshot.scales, snapshot.full, snapshot.ids, snapshot.chunks)
+            self.version, self.offset, self.pending = current, 0, 0
+            self.watermark = snapshot.manifest["watermark"]
+
+    def sync(self, partition: SearchPartition, blocking: bool = True):
+        """Apply entries other workers appended; a busy lock is skipped unless ``blocking``"""
+        with self.store.locked(blocking) as acquired:
+            if acquired:
+                self.replay(partition)
+
+    def record(self, partition: SearchPartition, entries: List[Dict[str, Any]]):
+        with self.store.locked():
+            self.replay(partition)
+            for entry in entries:
+                self._apply(partition, entry)
+            try:
+                self.offset = self.store.append(self.version, entries)
+                self.pending += len(entries)
+            except OSError as e:
+                print(f"Error appending to search delta log {self.store.directory}: {e}")
+
+
+class HybridSearchEngine:
+    """Per-partition hybrid indexes, loaded on first query and kept current by writers.
+
+    Partitions are keyed by (content_type, owner) so that each user's
+    memories live in their own index; the least recently used partitions
+    are evicted once more than ``max_partitions`` are resident.
+
+    Content types registered with a catch-up loader are persisted under
+    ``snapshot_dir``: a cold start maps the last snapshot in place, replays
+    its delta log and then fetches only what changed since its watermark.
+    Other partitions carry a version stamp in the cache's shared tier that
+    every write replaces, and a worker rebuilds its copy once the stamp it
+    was built at is no longer current.
+    """
+
+    def __init__(
+        self,
+        max_partitions: int = 256,
+        vector_options: Optional[Dict[str, Any]] = None,
+        snapshot_dir: Optional[str] = None,
+        compact_entries: int = 500
+    ):
+        self.max_partitions = max_partitions
+        self.vector_options = vector_options or {}
+        self.snapshot_dir = snapshot_dir
+        self.compact_entries = compact_entries
+        self.partitions: "OrderedDict[PartitionKey, SearchPartition]" = OrderedDict()
+        self.journals: Dict[PartitionKey, PartitionJournal] = {}
+        self.stamps: Dict[PartitionKey, Optional[str]] = {}
+        self._loading: Dict[PartitionKey, asyncio.Lock] = {}
+
+    def loaded(self, content_type: str, owner: str) -> Optional[SearchPartition]:
+        """The resident partition, or None; writers only update partitions already in memory"""
+        return self.partitions.get((content_type, owner))
+
+    async def partition(self, content_type: str, owner: str) -> SearchPartition:
+        key = (content_type, owner)
+        partition = self.partitions.get(key)
+        if partition is not None:
+            self.partitions.move_to_end(key)
+            journal = self.journals.get(key)
+            if journal is None:
+                if await self._stamp(key) == self.stamps.get(key):
+                    return partition
+                # Another worker changed the partition since we built it
+                self.invalidate(content_type, owner)
+            else:
+                try:
+                    journal.sync(partition, blocking=False)
+                    return partition
+                except (OSError, ValueError) as e:
+                    # Our log version was pruned (or is unreadable): restore from the current snapshot
+                    print(f"Reloading search partition {content_type}/{owner}: {e}")
+                    self.invalidate(content_type, owner)
+
+        lock = self._loading.setdefault(key, asyncio.Lock())
+        try:
+            async with lock:
+                partition = self.partitions.get(key)
+                if partition is None:
+                    if self.snapshot_dir and content_type in PARTITION_CATCH_UP:
+                        partition = await self._restore(content_type, owner)
+                    else:
+                        # Read before loading, so a write during the load forces another rebuild
+                        stamp = await self._stamp(key)
+                        partition = await self._build(content_type, owner)
+                        self.stamps[key] = stamp
+                    self.partitions[key] = partition
+                    while len(self.partitions) > self.max_partitions:
+                        evicted_key, evicted = self.partitions.popitem(last=False)
+                        self.journals.pop(evicted_key, None)
+                        self.stamps.pop(evicted_key, None)
+                        evicted.vectors.close()
+        finally:
+            self._loading.pop(key, None)
+        return partition
+
+    async def _build(self, content_type: str, owner: str) -> SearchPartition:
+        partition = SearchPartition(VectorIndex(**self.vector_options))
+        for document in await PARTITION_LOADERS[content_type](owner):
+            partition.upsert(document)
+        return partition
+
+    def _store(self, content_type: str, owner: str) -> SnapshotStore:
+        name = re.sub(r"[^A-Za-z0-9_.-]", "_", f"{content_type}-{owner}")
+        return SnapshotStore(os.path.join(self.snapshot_dir, name))
+
+    def _open_snapshot(self, store: SnapshotStore) -> Optional[Snapshot]:
+        """The current snapshot, unless it is missing or was built with other index settings"""
+        version = store.current()
+        if version is None:
+            return None
+        try:
+            snapshot = store.open(version)
+        except Exception as e:
+            print(f"Error opening search snapshot {store.directory}/{version}: {e}")
+            return None
+
+        manifest = snapshot.manifest
+        if (manifest.get("dtype") != self.vector_options.get("dtype", "int8")
+                or manifest.get("model") != EMBEDDING_MODEL
+                or (self.vector_options.get("rerank_candidates", 0) > 0 and snapshot.codes is not None and snapshot.full is None)):
+            return None
+        return snapshot
+
+    def _write_snapshot(self, store: SnapshotStore, partition: SearchPartition, watermark: str) -> PartitionJournal:
+        """Fold the partition into a new snapshot and map it back in place; the caller holds the store lock.
+
+        Writers need the store lock too, so the partition cannot change
+        between the export and the attach. Searches are only held off while
+        the state is copied and while it is re-attached, not during the write.
+        """
+        with partition.lock:
+            state = partition.export()
+        arrays = {name: state[name] for name in ("codes", "scales", "full")} if state["ids"] else {}
+        version = store.write(
+            {"dtype": self.vector_options.get("dtype", "int8"), "model": EMBEDDING_MODEL, "watermark": watermark},
+            arrays, state["ids"], state["chunks"], state["documents"]
+        )
+        snapshot = store.open(version)
+        with partition.lock:
+            partition.vectors.attach(snapshot.codes, snapshot.scales, snapshot.full, snapshot.ids, snapshot.chunks)
+        return PartitionJournal(store, version, watermark)
+
+    def _first_snapshot(self, store: SnapshotStore, partition: SearchPartition, watermark: str) -> PartitionJournal:
+        with store.locked():
+            return self._write_snapshot(store, partition, watermark)
+
+    def _compact(self, journal: PartitionJournal, partition: SearchPartition) -> PartitionJournal:
+        with journal.store.locked():
+            journal.replay(partition)
+            return self._write_snapshot(journal.store, partition, journal.watermark)
+
+    async def _restore(self, content_type: str, owner: str) -> SearchPartition:
+        key = (content_type, owner)
+        store = self._store(content_type, owner)
+        watermark = snapshot_watermark()
+        snapshot = self._open_snapshot(store)
+
+        # Snapshot and delta log I/O (flock, np.save, fsync) runs in threads, off the event loop
+        if snapshot is None:
+            partition = await self._build(content_type, owner)
+            self.journals[key] = await asyncio.to_thread(self._first_snapshot, store, partition, watermark)
+            return partition
+
+        partition = SearchPartition.from_snapshot(snapshot, VectorIndex(**self.vector_options))
+        journal = PartitionJournal(store, snapshot.version, snapshot.manifest["watermark"])
+        await asyncio.to_thread(journal.sync, partition)
+
+        # Only documents present before the catch-up query may be dropped as deleted;
+        # anything another worker adds meanwhile is not in ``live_ids`` yet
+        known = set(partition.filters)
+        documents, live_ids = await PARTITION_CATCH_UP[content_type](owner, journal.watermark)
+        entries = [document_entry(document) for document in documents]
+        if live_ids is not None:
+            entries.extend({"op": "remove", "doc_id": doc_id} for doc_id in sorted(known - live_ids))
+        entries.append({"op": "watermark", "value": watermark})
+        await asyncio.to_thread(journal.record, partition, entries)
+
+        self.journals[key] = journal
+        if journal.pending >= self.compact_entries:
+            self.journals[key] = await asyncio.to_thread(self._compact, journal, partition)
+        return partition
+
+    def compact_snapshots(self, force: bool = False) -> int:
+        """Fold long delta logs into new snapshots; returns how many were written.
+
+        Blocks on the store locks and file I/O, so async callers run it in a thread.
+        """
+        written = 0
+        for key, journal in list(self.journals.items()):
+            partition = self.partitions.get(key)
+            if partition is None:
+                continue
+            with journal.store.locked():
+                # Another worker may have compacted while we waited for the lock
+                journal.replay(partition)
+                if journal.pending == 0 or (journal.pending < self.compact_entries and not force):
+                    continue
+                self.journals[key] = self._write_snapshot(journal.store, partition, journal.watermark)
+                written += 1
+        return written
+
+    async def _stamp(self, key: PartitionKey) -> Optional[str]:
+        """The partition's shared version stamp; None without a shared tier, where workers cannot see each other"""
+        if cache.shared is None:
+            return None
+        return await cache.get_async(partition_stamp_key(key), shared_only=True)
+
+    async def _restamp(self, key: PartitionKey):
+        """Mark the partition changed for every worker, after applying the change to our own copy"""
+        if cache.shared is None:
+            return
+        stamp = uuid.uuid4().hex
+        previous = await cache.update_async(partition_stamp_key(key), lambda current: (stamp, current), PARTITION_STAMP_TTL_SECONDS)
+        # Our copy stays current only if no other worker wrote since we built or last wrote it
+        if key in self.partitions and self.stamps.get(key) == previous:
+            self.stamps[key] = stamp
+
+    async def upsert(self, content_type: str, owner: str, document: SearchDocument):
+        await self.upsert_many(content_type, owner, [document])
+
+    async def upsert_many(self, content_type: str, owner: str, documents: List[SearchDocument]):
+        """Apply the documents to the partition, journalled as one delta log append"""
+        key = (content_type, owner)
+        partition = self.loaded(content_type, owner)
+        journal = self.journals.get(key)
+        if journal is not None:
+            await asyncio.to_thread(journal.record, partition, [document_entry(document) for document in documents])
+            return
+        if partition is not None:
+            for document in documents:
+                partition.upsert(document)
+        await self._restamp(key)
+
+    async def remove(self, content_type: str, owner: str, doc_id: str):
+        key = (content_type, owner)
+        partition = self.loaded(content_type, owner)
+        journal = self.journals.get(key)
+        if journal is not None:
+            await asyncio.to_thread(journal.record, partition, [{"op": "remove", "doc_id": doc_id}])
+            return
+        if partition is not None:
+            partition.remove(doc_id)
+        await self._restamp(key)
+
+    def invalidate(self, content_type: str, owner: str):
+        self.journals.pop((content_type, owner), None)
+        self.stamps.pop((content_type, owner), None)
+        partition = self.partitions.pop((content_type, owner), None)
+        if partition is not None:
+            partition.vectors.close()
+
+    async def search(
+        self,
+        content_type: str,
+        owner: str,
+        query: str,
+        query_embedding: Optional[List[float]] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        limit: int = 10
+    ) -> List[SearchHit]:
+        partition = await self.partition(content_type, owner)
+        return partition.search(query, query_embedding, filters, limit)
+
+
+def build_search_engine() -> HybridSearchEngine:
+    return HybridSearchEngine(
+        settings.SEARCH_MAX_PARTITIONS,
+        {
+            "dtype": settings.VECTOR_INDEX_DTYPE,
+            "rerank_candidates": settings.VECTOR_RERANK_CANDIDATES,
+            "spill_dir": settings.VECTOR_SPILL_DIR
+        },
+        snapshot_dir=settings.VECTOR_SNAPSHOT_DIR,
+        compact_entries=settings.VECTOR_SNAPSHOT_COMPACT_ENTRIES
+    )
+
+# Global instance, built on first use
+search_engine: HybridSearchEngine = LazyService(build_search_engine, "search_engine")
+
+SHARED_OWNER = "all"
+PAGE_SIZE = 1000
+
+
+def fetch_all_rows(query_factory: Callable[[], Any], page_size: int = PAGE_SIZE) -> List[Dict[str, Any]]:
+    """Page through a PostgREST query, which caps each response at ~1000 rows"""
+    rows: List[Dict[str, Any]] = []
+    start = 0
+    while True:
+        page = query_factory().range(start, start + page_size - 1).execute().data or []
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+        start += page_size
+
+
+def latest_embeddings(rows: Iterable[Dict[str, Any]]) -> Dict[str, List[List[float]]]:
+    """Map content_id to the chunk embeddings of its most recent version.
+
+    All chunks of one version are written with the same created_at, so older
+    versions (with possibly more chunks) are dropped here.
+    """
+    versions: Dict[str, Tuple[str, Dict[int, List[float]]]] = {}
+    for row in rows:
+        embedding = parse_embedding(row.get("embedding"))
+        if embedding is None:
+            continue
+        created_at = row.get("created_at") or ""
+        chunk_index = row.get("chunk_index") or 0
+        current = versions.get(row["content_id"])
+        if current is None or created_at > current[0]:
+            current = (created_at, {})
+            versions[row["content_id"]] = current
+        if created_at == current[0]:
+            current[1][chunk_index] = embedding
+    return {
+        content_id: [chunks[index] for index in sorted(chunks)]
+        for content_id, (_, chunks) in versions.items()
+    }
+
+
+def memory_document(memory: Dict[str, Any], embeddings: Optional[List[List[float]]] = None) -> SearchDocument:
+    return SearchDocument(
+        doc_id=memory["id"],
+        text=f"{memory.get('title') or ''}\n{memory.get('content') or ''}",
+        filters={
+            "category": memory.get("category"),
+            "created_at": memory.get("created_at")
+        },
+        embeddings=embeddings
+    )
+
+
+def property_document(row: Dict[str, Any], embeddings: Optional[List[List[float]]] = None) -> SearchDocument:
+    property_data = row.get("property_data") or {}
+    # Index every scalar value so listing ids, street names and prices match exactly
+    text = " ".join(
+        str(value) for value in property_data.values()
+        if isinstance(value, (str, int, float)) and not isinstance(value, bool)
+    )
+    return SearchDocument(
+        doc_id=row["id"],
+        text=text,
+        filters={
+            "area": property_data.get("location") or property_data.get("area"),
+            "property_type": property_data.get("property_type"),
+            "source": row.get("source")
+        },
+        embeddings=embeddings
+    )
+
+
+async def load_memory_partition(user_id: str) -> List[SearchDocument]:
+    supabase = supabase_client.get_client()
+    memories = await db.run(fetch_all_rows, lambda: supabase.table("user_memory").select(
+        "id, title, content, category, created_at"
+    ).eq("user_id", user_id).order("created_at"))
+    if not memories:
+        return []
+
+    embeddings = {}
+    memory_ids = [memory["id"] for memory in memories]
+    for start in range(0, len(memory_ids), 200):
+        # Chunked memories have several rows each, so a batch can exceed one response
+        rows = await db.run(fetch_all_rows, lambda batch=memory_ids[start:start + 200]: supabase.table(
+            "vector_embeddings"
+        ).select("content_id, chunk_index, embedding, created_at").eq("content_type", "memory").eq(
+            "model", EMBEDDING_MODEL
+        ).in_("content_id", batch).order("id"))
+        embeddings.update(latest_embeddings(rows))
+
+    return [memory_document(memory, embeddings.get(memory["id"])) for memory in memories]
+
+
+async def load_property_partition(owner: str) -> List[SearchDocument]:
+    supabase = supabase_client.get_client()
+    properties, embedding_rows = await asyncio.gather(
+        db.run(fetch_all_rows, lambda: supabase.table("scraped_properties").select(
+            "id, source, property_data"
+        ).order("processed_at")),
+        db.run(fetch_all_rows, lambda: supabase.table("vector_embeddings").select(
+            "content_id, chunk_index, embedding, created_at"
+        ).eq("content_type", "property").eq("model", EMBEDDING_MODEL).order("created_at"))
+    )
+    embeddings = latest_embeddings(embedding_rows)
+    return [property_document(row, embeddings.get(row["id"])) for row in properties]
+
+
+async def catch_up_property_partition(owner: str, since: str) -> Tuple[List[SearchDocument], Set[str]]:
+    """Properties processed or re-embedded since ``since``, plus every live property id"""
+    supabase = supabase_client.get_client()
+    live_rows, processed_rows, embedded_rows = await asyncio.gather(
+        db.run(fetch_all_rows, lambda: supabase.table("scraped_properties").select("id").order("id")),
+        db.run(fetch_all_rows, lambda: supabase.table("scraped_properties").select("id").gte("processed_at", since).order("id")),
+        db.run(fetch_all_rows, lambda: supabase.table("vector_embeddings").select("content_id").eq("content_type", "property").eq(
+            "model", EMBEDDING_MODEL
+        ).gte("created_at", since).order("id"))
+    )
+    live_ids = {row["id"] for row in live_rows}
+    changed = {row["id"] for row in processed_rows}
+    changed.update(row["content_id"] for row in embedded_rows)
+
+    changed_ids = sorted(changed & live_ids)
+    documents = []
+    for start in range(0, len(changed_ids), 200):
+        batch = changed_ids[start:start + 200]
+        property_result, embedding_rows = await asyncio.gather(
+            execute(supabase.table("scraped_properties").select("id, source, property_data").in_("id", batch)),
+            # Several chunk rows per property, so the batch can exceed one response
+            db.run(fetch_all_rows, lambda batch=batch: supabase.table("vector_embeddings").select(
+                "content_id, chunk_index, embedding, created_at"
+            ).eq("content_type", "property").eq("model", EMBEDDING_MODEL).in_("content_id", batch).order("id"))
+        )
+        rows = property_result.data or []
+        embeddings = latest_embeddings(embedding_rows)
+        documents.extend(property_document(row, embeddings.get(row["id"])) for row in rows)
+    return documents, live_ids
+
+
+async def preload_property_index():
+    await search_engine.partition("property", SHARED_OWNER)
+
+
+async def compact_search_snapshots():
+    if search_engine.is_built():
+        await asyncio.to_thread(search_engine.compact_snapshots)
+
+
+register_partition_loader("memory", load_memory_partition)
+register_partition_loader("property", load_property_partition, catch_up_property_partition)
+register_preloader("property_search_index", preload_property_index)
+register_periodic_task(
+    "search_snapshot_compaction",
+    lambda: settings.VECTOR_SNAPSHOT_INTERVAL_SECONDS if settings.VECTOR_SNAPSHOT_DIR else 0,
+    compact_search_snapshots
+)
@@ -0,0 +1,177 @@
+import fcntl
+import json
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+SNAPSHOT_FORMAT = 1
+CURRENT_FILE = "CURRENT"
+LOCK_FILE = "lock"
+DELTA_LOG = "delta.log"
+ARRAY_NAMES = ("codes", "scales", "full")
+
+
+@dataclass
+class Snapshot:
+    version: str
+    manifest: Dict[str, Any]
+    codes: Any                  # np.memmap, or None for an empty partition
+    scales: Any
+    full: Any                   # None when written without full-precision vectors
+    ids: List[str]
+    chunks: List[int]
+    documents: List[Dict[str, Any]]
+
+
+def _write_file(path: str, content: str):
+    """Write via a temp file and rename so readers never see a partial file"""
+    staging = f"{path}.{os.getpid()}.tmp"
+    with open(staging, "w") as handle:
+        handle.write(content)
+    os.replace(staging, path)
+
+
+class SnapshotStore:
+    """Versioned on-disk snapshots of one search partition plus an append-only delta log.
+
+    Layout of ``directory``:
+        CURRENT                     name of the live version directory
+        lock                        flock()ed by every writer (all workers share it)
+        <version>/manifest.json     format, dtype, model, row count and watermark
+        <version>/codes.npy         quantized vectors    } opened with
+        <version>/scales.npy        per-row scales       } np.load(mmap_mode="r")
+        <version>/full.npy          float32 vectors for re-ranking (optional)
+        <version>/rows.json         parent doc id and chunk index per matrix row
+        <version>/documents.jsonl   BM25 term counts and filters per document
+        <version>/delta.log         NDJSON changes made after the snapshot
+
+    The previous version is kept until the next one is written, so a worker
+    that has not yet noticed a new version can still finish reading its log.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def path(self, *parts: str) -> str:
+        return os.path.join(self.directory, *parts)
+
+    @contextmanager
+    def locked(self, blocking: bool = True) -> Iterator[bool]:
+        """Hold the store's writer lock; yields False if ``blocking`` is off and it is taken"""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.path(LOCK_FILE), "a") as handle:
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def current(self) -> Optional[str]:
+        try:
+            with open(self.path(CURRENT_FILE)) as handle:
+                return handle.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def open(self, version: str) -> Snapshot:
+        """Map a version's arrays in place (no copy) and read its row and document maps"""
+        import numpy as np
+
+        with open(self.path(version, "manifest.json")) as handle:
+            manifest = json.load(handle)
+        if manifest.get("format") != SNAPSHOT_FORMAT:
+            raise ValueError(f"Unsupported snapshot format {manifest.get('format')}")
+        with open(self.path(version, "rows.json")) as handle:
+            rows = json.load(handle)
+        with open(self.path(version, "documents.jsonl")) as handle:
+            documents = [json.loads(line) for line in handle if line.strip()]
+
+        arrays = {}
+        for name in ARRAY_NAMES:
+            array_path = self.path(version, f"{name}.npy")
+            arrays[name] = np.load(array_path, mmap_mode="r") if os.path.exists(array_path) else None
+
+        return Snapshot(
+            version=version,
+            manifest=manifest,
+            codes=arrays["codes"],
+            scales=arrays["scales"],
+            full=arrays["full"],
+            ids=rows["ids"],
+            chunks=rows["chunks"],
+            documents=documents
+        )
+
+    def write(
+        self,
+        manifest: Dict[str, Any],
+        arrays: Dict[str, Any],
+        ids: List[str],
+        chunks: List[int],
+        documents: Iterable[Dict[str, Any]]
+    ) -> str:
+        """Write a new version with an empty delta log and make it current; the caller holds the lock"""
+        import numpy as np
+
+        previous = self.current()
+        version = f"v{time.time_ns()}"
+        staging = self.path(f"{version}.tmp")
+        os.makedirs(staging)
+
+        for name in ARRAY_NAMES:
+            if arrays.get(name) is not None:
+                np.save(os.path.join(staging, f"{name}.npy"), np.ascontiguousarray(arrays[name]))
+        with open(os.path.join(staging, "rows.json"), "w") as handle:
+            json.dump({"ids": ids, "chunks": chunks}, handle)
+        with open(os.path.join(staging, "documents.jsonl"), "w") as handle:
+            for document in documents:
+                handle.write(json.dumps(document, default=str) + "\n")
+        with open(os.path.join(staging, "manifest.json"), "w") as handle:
+            json.dump({**manifest, "format": SNAPSHOT_FORMAT, "rows": len(ids)}, handle)
+        open(os.path.join(staging, DELTA_LOG), "w").close()
+
+        os.rename(staging, self.path(version))
+        _write_file(self.path(CURRENT_FILE), version)
+        self._prune({version, previous})
+        return version
+
+    def _prune(self, keep: set):
+        # Mapped files of removed versions stay readable until they are unmapped
+        for name in os.listdir(self.directory):
+            if name.startswith("v") and name not in keep:
+                shutil.rmtree(self.path(name), ignore_errors=True)
+
+    def append(self, version: str, entries: List[Dict[str, Any]]) -> int:
+        """Append entries to a version's delta log and return its new size; the caller holds the lock"""
+        data = "".join(json.dumps(entry, default=str) + "\n" for entry in entries)
+        with open(self.path(version, DELTA_LOG), "a") as handle:
+            handle.write(data)
+            handle.flush()
+            return handle.tell()
+
+    def read_log(self, version: str, offset: int) -> Tuple[List[Dict[str, Any]], int]:
+        """Complete entries after ``offset``, and the offset to resume from.
+
+        Raises FileNotFoundError once the version has been pruned.
+        """
+        with open(self.path(version, DELTA_LOG), "rb") as handle:
+            handle.seek(offset)
+            data = handle.read()
+
+        end = data.rfind(b"\n") + 1
+        entries = []
+        for line in data[:end].splitlines():
+            if not line.strip():
+                continue
+            try:
+                entries.append(json.loads(line))
+            except ValueError as e:
+                print(f"Skipping corrupt delta log entry in {self.directory}/{version}: {e}")
+        return entries, offset + end
@@ -1,15 +1,24 @@
-from supabase import create_client, Client
+from typing import TYPE_CHECKING
 from app.core.config import settings
+from app.core.lazy import LazyService
+
+if TYPE_CHECKING:
+    from supabase import Client
 
 class SupabaseClient:
     def __init__(self):
-        self.client: Client = create_client(
+        from supabase import create_client  # Deferred: heavy import, only needed on first query
+        
+        self.client: "Client" = create_client(
             settings.SUPABASE_URL,
             settings.SUPABASE_KEY
         )
     
-    def get_client(self) -> Client:
+    def get_client(self) -> "Client":
         return self.client
+    
+    def close(self):
+        self.client.postgrest.aclose()
 
-# Global instance
-supabase_client = SupabaseClient()
+# Global instance, built on first use
+supabase_client: SupabaseClient = LazyService(SupabaseClient, "supabase_client")
@@ -0,0 +1,201 @@
+import codecs
+import gzip
+import json
+import shutil
+import tempfile
+from typing import Any, BinaryIO, Iterator, Optional, Tuple
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+COMPRESSION_SUFFIXES = {".gz": "gzip", ".gzip": "gzip", ".zst": "zstd", ".zstd": "zstd"}
+FORMAT_SUFFIXES = {
+    ".csv": "csv",
+    ".json": "json",
+    ".ndjson": "ndjson",
+    ".jsonl": "ndjson",
+    ".parquet": "parquet",
+    ".pq": "parquet",
+    ".arrow": "arrow",
+    ".feather": "arrow",
+    ".ipc": "arrow"
+}
+SUPPORTED_UPLOADS = "CSV, JSON, NDJSON, Parquet or Arrow (optionally .gz or .zst compressed)"
+
+# Rows per DataFrame handed to the ingest pipeline
+FRAME_ROWS = 10000
+# Compressed Parquet/Arrow is decompressed to a temp file (they need random access);
+# files up to this size stay in memory
+SPOOL_MAX_BYTES = 64 * 1024 * 1024
+# JSON arrays are parsed as they stream in, this much text at a time
+JSON_READ_BYTES = 1024 * 1024
+
+
+class UnsupportedUpload(ValueError):
+    """The upload's format or compression cannot be read"""
+
+
+def detect_format(filename: str, head: bytes) -> Tuple[str, Optional[str]]:
+    """(format, compression) from the filename, with compression confirmed by magic bytes"""
+    name = (filename or "").lower()
+    compression = None
+    for suffix, codec in COMPRESSION_SUFFIXES.items():
+        if name.endswith(suffix):
+            compression = codec
+            name = name[:-len(suffix)]
+            break
+
+    if head.startswith(GZIP_MAGIC):
+        compression = "gzip"
+    elif head.startswith(ZSTD_MAGIC):
+        compression = "zstd"
+
+    for suffix, data_format in FORMAT_SUFFIXES.items():
+        if name.endswith(suffix):
+            return data_format, compression
+    raise UnsupportedUpload(f"Unsupported file type. Please upload {SUPPORTED_UPLOADS}.")
+
+
+def decompress(stream: BinaryIO, compression: Optional[str]) -> BinaryIO:
+    """Wrap ``stream`` in a streaming decompressor; nothing is decompressed up front"""
+    if compression == "gzip":
+        return gzip.GzipFile(fileobj=stream, mode="rb")
+    if compression == "zstd":
+        try:
+            import zstandard  # Optional dependency
+        except ImportError:
+            raise UnsupportedUpload("zstd-compressed uploads need the zstandard package")
+        return zstandard.ZstdDecompressor().stream_reader(stream)
+    return stream
+
+
+def _random_access(data: BinaryIO, compressed: bool) -> BinaryIO:
+    if not compressed:
+        return data
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    shutil.copyfileobj(data, spool)
+    spool.seek(0)
+    return spool
+
+
+def iter_json_array(data: BinaryIO, read_bytes: int = JSON_READ_BYTES) -> Iterator[Any]:
+    """Items of a top-level JSON array, parsed as the file is read rather than loaded whole"""
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer, position, eof = "", 0, False
+    state = "start"  # then "first", and "separator" / "value" in turn
+
+    while True:
+        while position < len(buffer) and buffer[position].isspace():
+            position += 1
+        if position == len(buffer) and not eof:
+            chunk = data.read(read_bytes)
+            eof = not chunk
+            buffer, position = utf8.decode(chunk, final=eof), 0
+            continue
+        if position == len(buffer):
+            raise ValueError("JSON upload ends before its closing ]")
+
+        char = buffer[position]
+        if state == "start":
+            if char != "[":
+                raise ValueError("A JSON upload must be an array of records")
+            position += 1
+            state = "first"
+        elif char == "]" and state in ("first", "separator"):
+            return
+        elif state == "separator":
+            if char != ",":
+                raise ValueError(f"Expected , or ] in JSON upload, found {char!r}")
+            position += 1
+            state = "value"
+        else:
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+                # A value running to the end of the buffer (a number) may continue in the next read
+                complete = end < len(buffer) or eof
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                complete = False
+            if not complete:
+                chunk = data.read(read_bytes)
+                eof = not chunk
+                buffer, position = buffer[position:] + utf8.decode(chunk, final=eof), 0
+                continue
+            position = end
+            state = "separator"
+            yield item
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow  # Optional dependency
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise UnsupportedUpload("Parquet and Arrow uploads need the pyarrow package")
+    return pyarrow
+
+
+def read_upload(stream: BinaryIO, filename: str, frame_rows: int = FRAME_ROWS) -> Iterator[Any]:
+    """DataFrames of at most ``frame_rows`` rows parsed from an uploaded file.
+
+    The format and compression are checked before anything is parsed, so an
+    unsupported upload raises UnsupportedUpload here rather than mid-ingest.
+    """
+    head = stream.read(4)
+    stream.seek(0)
+    data_format, compression = detect_format(filename, head)
+    if data_format in ("parquet", "arrow"):
+        _import_pyarrow()
+    data = decompress(stream, compression)
+    return _frames(data, data_format, compression is not None, frame_rows)
+
+
+def _frames(data: BinaryIO, data_format: str, compressed: bool, frame_rows: int) -> Iterator[Any]:
+    import pandas as pd  # Deferred: pandas adds seconds to cold start
+
+    if data_format == "csv":
+        yield from pd.read_csv(data, chunksize=frame_rows)
+    elif data_format == "ndjson":
+        # Keep values as written; ingest does its own type coercion
+        yield from pd.read_json(data, lines=True, chunksize=frame_rows, dtype=False, convert_dates=False)
+    elif data_format == "json":
+        records = []
+        for record in iter_json_array(data):
+            records.append(record)
+            if len(records) == frame_rows:
+                yield pd.DataFrame(records)
+                records = []
+        if records:
+            yield pd.DataFrame(records)
+    elif data_format == "parquet":
+        pyarrow = _import_pyarrow()
+        parquet = pyarrow.parquet.ParquetFile(_random_access(data, compressed))
+        for batch in parquet.iter_batches(batch_size=frame_rows):
+            yield batch.to_pandas()
+    else:
+        pyarrow = _import_pyarrow()
+        source = _random_access(data, compressed)
+        try:
+            reader = pyarrow.ipc.open_file(source)
+            batches = (reader.get_batch(index) for index in range(reader.num_record_batches))
+        except pyarrow.ArrowInvalid:
+            # Not the random-access file format: read it as an IPC stream
+            source.seek(0)
+            batches = pyarrow.ipc.open_stream(source)
+        # Arrow batches can be large; re-slice them to frame_rows
+        for batch in batches:
+            for start in range(0, batch.num_rows, frame_rows):
+                yield batch.slice(start, frame_rows).to_pandas()
+
+
+def skip_rows(frames: Iterator[Any], count: int) -> Iterator[Any]:
+    """Drop the first ``count`` rows of a stream of DataFrames (to resume after a checkpoint)"""
+    for frame in frames:
+        if count >= len(frame):
+            count -= len(frame)
+            continue
+        yield frame.iloc[count:] if count else frame
+        count = 0
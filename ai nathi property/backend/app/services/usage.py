@@ -0,0 +1,141 @@
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.background import register_periodic_task
+from app.core.config import settings
+from app.services.db import execute
+from app.services.model_router import estimate_cost, usage_tokens
+from app.services.supabase_client import supabase_client
+
+USAGE_DIMENSIONS = ("user", "conversation", "endpoint")
+# Endpoint recorded for calls made outside any tagged request
+UNTAGGED_ENDPOINT = "untagged"
+USAGE_COUNTERS = ("calls", "prompt_tokens", "completion_tokens", "cached_tokens", "cost_usd", "seconds")
+INSERT_BATCH_SIZE = 500
+# Unflushed rollups kept across failed flushes before they are dropped
+MAX_PENDING_ROLLUPS = 10000
+
+# Who an OpenAI call is made for. Set once per request, WebSocket session or
+# background job; asyncio tasks and asyncio.to_thread inherit it.
+_usage_tags: ContextVar[Dict[str, Optional[str]]] = ContextVar("usage_tags", default={})
+
+
+def tag_usage(endpoint: str, user_id: Optional[str] = None, conversation_id: Optional[str] = None):
+    """Attribute the OpenAI calls made from here on in the current task"""
+    _usage_tags.set({"endpoint": endpoint, "user": user_id, "conversation": conversation_id})
+
+
+def period_start(timestamp: float, period_seconds: int) -> str:
+    start = timestamp - timestamp % period_seconds
+    return datetime.fromtimestamp(start, tz=timezone.utc).isoformat()
+
+
+class UsageLedger:
+    """OpenAI tokens, estimated cost and wall time, summed per user, conversation and endpoint.
+
+    Calls are aggregated in memory per USAGE_ROLLUP_PERIOD_SECONDS period and
+    flushed to the usage_rollups table by a periodic task. Each flush inserts
+    this worker's increments, so rollups from several workers simply add up
+    when queried.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+
+    def record(self, model: str, seconds: float, usage: Any = None):
+        prompt_tokens, completion_tokens, cached_tokens = usage_tokens(usage)
+        increment = {
+            "calls": 1,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cached_tokens": cached_tokens,
+            "cost_usd": estimate_cost(model, prompt_tokens, completion_tokens, cached_tokens),
+            "seconds": seconds
+        }
+        tags = _usage_tags.get()
+        period = period_start(time.time(), settings.USAGE_ROLLUP_PERIOD_SECONDS)
+        with self._lock:
+            for dimension in USAGE_DIMENSIONS:
+                key = tags.get(dimension) or (UNTAGGED_ENDPOINT if dimension == "endpoint" else None)
+                if key is not None:
+                    self._add((period, dimension, key), increment)
+
+    def _add(self, rollup_key: Tuple[str, str, str], increment: Dict[str, Any]):
+        totals = self._pending.setdefault(rollup_key, {counter: 0 for counter in USAGE_COUNTERS})
+        for counter in USAGE_COUNTERS:
+            totals[counter] += increment[counter]
+
+    def take(self) -> List[Dict[str, Any]]:
+        """Remove and return the pending rollups as usage_rollups rows"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return [
+            {"period_start": period, "dimension": dimension, "key": key, **totals}
+            for (period, dimension, key), totals in pending.items()
+        ]
+
+    def restore(self, rows: List[Dict[str, Any]]):
+        """Put back rows a flush could not store, unless too many are already waiting"""
+        with self._lock:
+            if len(self._pending) + len(rows) > MAX_PENDING_ROLLUPS:
+                print(f"Dropping {len(rows)} usage rollups that could not be stored")
+                return
+            for row in rows:
+                self._add((row["period_start"], row["dimension"], row["key"]), row)
+
+    async def flush(self):
+        rows = self.take()
+        if not rows:
+            return
+        supabase = supabase_client.get_client()
+        for start in range(0, len(rows), INSERT_BATCH_SIZE):
+            try:
+                await execute(supabase.table("usage_rollups").insert(rows[start:start + INSERT_BATCH_SIZE]))
+            except Exception as e:
+                print(f"Error flushing usage rollups: {e}")
+                self.restore(rows[start:])
+                return
+
+
+# Global instance
+usage_ledger = UsageLedger()
+
+
+def summarize_rollups(rows: List[Dict[str, Any]], by_period: bool = False) -> List[Dict[str, Any]]:
+    """Sum usage_rollups rows per key (and period), most expensive first"""
+    summaries: Dict[Tuple[str, ...], Dict[str, Any]] = {}
+    for row in rows:
+        group = (row["key"], row["period_start"]) if by_period else (row["key"],)
+        summary = summaries.setdefault(group, {counter: 0 for counter in USAGE_COUNTERS})
+        for counter in USAGE_COUNTERS:
+            summary[counter] += row.get(counter) or 0
+
+    results = []
+    for group, summary in summaries.items():
+        result = {"key": group[0]}
+        if by_period:
+            result["period_start"] = group[1]
+        calls = summary["calls"]
+        result.update({
+            "calls": calls,
+            "prompt_tokens": summary["prompt_tokens"],
+            "completion_tokens": summary["completion_tokens"],
+            "cached_tokens": summary["cached_tokens"],
+            "cost_usd": round(summary["cost_usd"], 6),
+            "seconds": round(summary["seconds"], 3),
+            "avg_latency_ms": round(summary["seconds"] * 1000 / calls) if calls else None
+        })
+        results.append(result)
+    results.sort(key=lambda result: (result["cost_usd"], result["calls"]), reverse=True)
+    return results
+
+
+register_periodic_task(
+    "usage_rollup_flush",
+    lambda: settings.USAGE_FLUSH_SECONDS,
+    usage_ledger.flush
+)
@@ -0,0 +1,169 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Set
+
+from app.core.background import register_periodic_task
+from app.core.config import settings
+from app.services.cache import cache
+from app.services.db import db, execute
+from app.services.search import fetch_all_rows
+from app.services.supabase_client import supabase_client
+
+# Safety net for changes polling cannot see, such as deleted rows
+USER_CONTEXT_TTL_SECONDS = 60 * 60
+RECENT_BOOKINGS = 5
+# Rows updated this long before a poll are looked at again, covering clock skew and slow commits
+POLL_OVERLAP_SECONDS = 5
+# Postgres errors for an undefined table or column: polling that table can never succeed
+SCHEMA_ERROR_CODES = {"42P01", "42703"}
+
+
+def user_context_key(user_id: str) -> str:
+    return f"user_context:{user_id}"
+
+
+async def _optional_rows(query: Any) -> List[Dict[str, Any]]:
+    # profiles, properties and bookings are Host Track tables that may not exist in every deployment
+    try:
+        return (await execute(query)).data or []
+    except Exception:
+        return []
+
+
+def format_user_context(
+    profile: Dict[str, Any], properties: List[Dict[str, Any]], bookings: List[Dict[str, Any]]
+) -> str:
+    context_parts = []
+    if profile:
+        preferences = profile.get("settings") or {}
+        context_parts.append(f"\n👤 User Profile:")
+        context_parts.append(f"- Name: {profile.get('name', 'Unknown')}")
+        context_parts.append(f"- Currency: {preferences.get('currency', 'ZAR')}")
+        context_parts.append(f"- Timezone: {preferences.get('timezone', 'Africa/Johannesburg')}")
+    if properties:
+        context_parts.append("\n🏠 Your Properties:")
+        for prop in properties:
+            context_parts.append(f"- {prop['name']}: {prop['property_type']} with {prop['bedrooms']} bedrooms")
+    if bookings:
+        names = {prop["id"]: prop["name"] for prop in properties}
+        context_parts.append("\n📅 Recent Bookings:")
+        for booking in bookings:
+            context_parts.append(
+                f"- {names.get(booking['property_id'], 'Property')}: {booking['guest_name']}, "
+                f"{booking['check_in']} to {booking['check_out']} ({booking['nights']} nights, {booking['guests']} guests), "
+                f"{booking.get('currency') or 'ZAR'} {booking['total_price']} via {booking['platform']}"
+            )
+    return "\n".join(context_parts)
+
+
+async def build_user_context(user_id: str) -> Dict[str, Any]:
+    """Profile, active properties and recent confirmed bookings, plus their rendered context text"""
+    supabase = supabase_client.get_client()
+    profiles, properties = await asyncio.gather(
+        _optional_rows(supabase.table("profiles").select("name, settings").eq("id", user_id)),
+        _optional_rows(supabase.table("properties").select(
+            "id, name, city, property_type, bedrooms, bathrooms, base_price, currency"
+        ).eq("user_id", user_id).eq("status", "active"))
+    )
+
+    bookings: List[Dict[str, Any]] = []
+    if properties:
+        bookings = await _optional_rows(supabase.table("bookings").select(
+            "property_id, guest_name, check_in, check_out, nights, guests, total_price, currency, platform"
+        ).in_(
+            "property_id", [prop["id"] for prop in properties]
+        ).eq("status", "confirmed").order("check_in", desc=True).limit(RECENT_BOOKINGS))
+
+    profile = profiles[0] if profiles else {}
+    return {
+        "version": datetime.utcnow().isoformat(),
+        "profile": profile,
+        "properties": properties,
+        "bookings": bookings,
+        "text": format_user_context(profile, properties, bookings)
+    }
+
+
+async def get_user_context(user_id: str) -> Dict[str, Any]:
+    """The user's materialized context document, rebuilt only after one of its rows changed"""
+    return await cache.get_or_compute(
+        user_context_key(user_id), lambda: build_user_context(user_id), USER_CONTEXT_TTL_SECONDS
+    )
+
+
+async def invalidate_user_context(user_id: str):
+    await cache.delete_async(user_context_key(user_id))
+
+
+class UserContextPoller:
+    """Finds users whose profiles, properties or bookings rows changed since the last poll.
+
+    Each table has its own watermark: the newest ``updated_at`` seen so far.
+    Polls page through every changed row in ``updated_at`` order and re-read
+    a few seconds before the watermark, so a row committed late is not
+    missed; invalidating a user twice is harmless.
+    """
+
+    def __init__(self):
+        started = (datetime.utcnow() - timedelta(seconds=POLL_OVERLAP_SECONDS)).isoformat()
+        self.watermarks: Dict[str, str] = {"profiles": started, "properties": started, "bookings": started}
+        self.unavailable: Set[str] = set()
+
+    async def _changed(self, table: str, columns: str) -> List[Dict[str, Any]]:
+        if table in self.unavailable:
+            return []
+        supabase = supabase_client.get_client()
+        since = self.watermarks[table]
+        try:
+            rows = await db.run(fetch_all_rows, lambda: supabase.table(table).select(f"{columns}, updated_at").gte(
+                "updated_at", since
+            ).order("updated_at").order("id"))
+        except Exception as e:
+            if getattr(e, "code", None) in SCHEMA_ERROR_CODES:
+                # A missing table or column; stop polling it instead of failing every interval
+                print(f"Not polling {table} for context changes: {e}")
+                self.unavailable.add(table)
+            else:
+                # Transient (network, timeout): the watermark stays put, so the next poll catches up
+                print(f"Error polling {table} for context changes: {e}")
+            return []
+        if rows:
+            newest = max(row["updated_at"] for row in rows if row.get("updated_at"))
+            newest_at = datetime.fromisoformat(newest.replace("Z", "+00:00"))
+            if newest_at.tzinfo is not None:
+                newest_at = newest_at.astimezone(timezone.utc).replace(tzinfo=None)
+            self.watermarks[table] = max(since, (newest_at - timedelta(seconds=POLL_OVERLAP_SECONDS)).isoformat())
+        return rows
+
+    async def poll(self) -> Set[str]:
+        profiles, properties, bookings = await asyncio.gather(
+            self._changed("profiles", "id"),
+            self._changed("properties", "user_id"),
+            self._changed("bookings", "property_id")
+        )
+        users: Set[str] = {row["id"] for row in profiles}
+        users.update(row["user_id"] for row in properties)
+
+        property_ids = list({row["property_id"] for row in bookings})
+        if property_ids:
+            supabase = supabase_client.get_client()
+            owners = await _optional_rows(supabase.table("properties").select("user_id").in_("id", property_ids))
+            users.update(row["user_id"] for row in owners)
+        return users
+
+
+# Global instance
+user_context_poller = UserContextPoller()
+
+
+async def invalidate_changed_user_contexts():
+    """Periodic task: drop the context documents of users whose rows changed"""
+    for user_id in await user_context_poller.poll():
+        await invalidate_user_context(user_id)
+
+
+register_periodic_task(
+    "user_context_invalidation",
+    lambda: settings.USER_CONTEXT_POLL_SECONDS,
+    invalidate_changed_user_contexts
+)
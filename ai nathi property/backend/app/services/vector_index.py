@@ -0,0 +1,303 @@
+import os
+import shutil
+import tempfile
+from typing import Any, Dict, List, Optional, Tuple
+
+# Rows scored per matrix block, bounding the float32 scratch space per query
+SCORE_BLOCK_ROWS = 4096
+INT8_LEVELS = 127.0
+
+
+class FullPrecisionStore:
+    """float32 copies of the index rows in an unlinked temp file.
+
+    Only the handful of rows being re-ranked are read back (via pread), so
+    the full-precision vectors cost page cache rather than process memory.
+    A worker forked from the process that wrote the file copies it before
+    its first write, so processes never modify each other's rows.
+    """
+
+    def __init__(self, dim: int, directory: Optional[str] = None):
+        self.dim = dim
+        self.row_bytes = dim * 4
+        self.directory = directory
+        self.handle = tempfile.TemporaryFile(dir=directory)
+        self.pid = os.getpid()
+
+    def _own(self):
+        if self.pid == os.getpid():
+            return
+        handle = tempfile.TemporaryFile(dir=self.directory)
+        self.handle.seek(0)
+        shutil.copyfileobj(self.handle, handle)
+        self.handle = handle
+        self.pid = os.getpid()
+
+    def write(self, row: int, vector):
+        self._own()
+        os.pwrite(self.handle.fileno(), vector.astype("float32").tobytes(), row * self.row_bytes)
+
+    def read(self, rows: List[int]):
+        import numpy as np
+
+        fd = self.handle.fileno()
+        return np.stack([
+            np.frombuffer(os.pread(fd, self.row_bytes, row * self.row_bytes), dtype=np.float32)
+            for row in rows
+        ])
+
+    def read_all(self, count: int):
+        import numpy as np
+
+        data = os.pread(self.handle.fileno(), count * self.row_bytes, 0)
+        return np.frombuffer(data, dtype=np.float32).reshape(count, self.dim)
+
+    def move(self, source: int, target: int):
+        self.write(target, self.read([source])[0])
+
+    def close(self):
+        self.handle.close()
+
+
+class VectorIndex:
+    """Contiguous matrix of unit-normalised chunk embeddings searched by cosine similarity.
+
+    Vectors are stored as float32, float16 or int8 (symmetric, one scale per
+    vector), cutting memory 1x/2x/4x against float32 and far more against
+    Python lists of floats. With ``rerank_candidates`` > 0 the best quantized
+    candidates are re-scored exactly from a FullPrecisionStore.
+
+    Rows come in two segments: a read-only base attached from a snapshot
+    (memory-mapped, so it is shared through the page cache and never copied;
+    removals only tombstone its rows) followed by a writable tail holding
+    everything added since.
+
+    Each row is one chunk of a parent document; search returns each parent
+    once, ranked by its best chunk.
+    """
+
+    def __init__(self, dtype: str = "int8", rerank_candidates: int = 0, spill_dir: Optional[str] = None):
+        self.dtype = dtype
+        self.rerank_candidates = rerank_candidates
+        self.spill_dir = spill_dir
+        self.ids: List[str] = []          # parent doc id per row
+        self.chunks: List[int] = []       # chunk index per row
+        self.doc_rows: Dict[str, List[int]] = {}
+        # Base segment: rows [0, base_size)
+        self.base_codes = None
+        self.base_scales = None
+        self.base_full = None
+        self.tombstones = None
+        self.base_size = 0
+        # Tail segment: rows [base_size, size)
+        self.codes = None
+        self.scales = None
+        self.full: Optional[FullPrecisionStore] = None
+        self.size = 0
+
+    @property
+    def dim(self) -> int:
+        if self.base_codes is not None:
+            return self.base_codes.shape[1]
+        return self.codes.shape[1] if self.codes is not None else 0
+
+    def memory_bytes(self) -> int:
+        """Process memory held by the index; the mapped base segment is not counted"""
+        total = self.tombstones.nbytes if self.tombstones is not None else 0
+        if self.codes is not None:
+            total += self.codes.nbytes + self.scales.nbytes
+        return total
+
+    def _quantize(self, vector):
+        import numpy as np
+
+        if self.dtype == "int8":
+            peak = float(np.abs(vector).max())
+            scale = peak / INT8_LEVELS if peak > 0 else 1.0
+            return np.round(vector / scale).astype(np.int8), scale
+        if self.dtype == "float16":
+            return vector.astype(np.float16), 1.0
+        return vector, 1.0
+
+    def _grow(self, dim: int):
+        import numpy as np
+
+        tail_size = self.size - self.base_size
+        if self.codes is None:
+            self.codes = np.zeros((16, dim), dtype=self.dtype)
+            self.scales = np.ones(16, dtype=np.float32)
+            if self.rerank_candidates > 0:
+                self.full = FullPrecisionStore(dim, self.spill_dir)
+        elif tail_size == self.codes.shape[0]:
+            # Grow geometrically so incremental adds stay amortised O(1)
+            capacity = self.codes.shape[0] * 2
+            codes = np.zeros((capacity, dim), dtype=self.dtype)
+            codes[:tail_size] = self.codes[:tail_size]
+            scales = np.ones(capacity, dtype=np.float32)
+            scales[:tail_size] = self.scales[:tail_size]
+            self.codes, self.scales = codes, scales
+
+    def _append(self, doc_id: str, chunk_index: int, vector):
+        self._grow(vector.shape[0])
+        tail_row = self.size - self.base_size
+        self.codes[tail_row], self.scales[tail_row] = self._quantize(vector)
+        if self.full is not None:
+            self.full.write(tail_row, vector)
+        self.ids.append(doc_id)
+        self.chunks.append(chunk_index)
+        self.doc_rows.setdefault(doc_id, []).append(self.size)
+        self.size += 1
+
+    def add(self, doc_id: str, embeddings: List[List[float]]):
+        """Replace the document's chunk vectors"""
+        import numpy as np  # Deferred: only needed once a partition is loaded
+
+        self.remove(doc_id)
+        for chunk_index, embedding in enumerate(embeddings):
+            vector = np.asarray(embedding, dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            if norm > 0:
+                vector = vector / norm
+            self._append(doc_id, chunk_index, vector)
+
+    def remove(self, doc_id: str):
+        # Delete from the highest row down. Base rows are tombstoned; tail rows
+        # are filled by moving the last row into each hole so the tail stays contiguous
+        for row in sorted(self.doc_rows.pop(doc_id, []), reverse=True):
+            if row < self.base_size:
+                self.tombstones[row] = True
+                continue
+            last = self.size - 1
+            if row != last:
+                last_id = self.ids[last]
+                tail_row, tail_last = row - self.base_size, last - self.base_size
+                self.codes[tail_row] = self.codes[tail_last]
+                self.scales[tail_row] = self.scales[tail_last]
+                if self.full is not None:
+                    self.full.move(tail_last, tail_row)
+                self.ids[row] = last_id
+                self.chunks[row] = self.chunks[last]
+                last_rows = self.doc_rows[last_id]
+                last_rows[last_rows.index(last)] = row
+            self.ids.pop()
+            self.chunks.pop()
+            self.size -= 1
+
+    def attach(self, codes, scales, full, ids: List[str], chunks: List[int]):
+        """Replace the whole index with snapshot arrays (typically np.load(..., mmap_mode="r"))"""
+        import numpy as np
+
+        self.close()
+        self.base_codes, self.base_scales, self.base_full = codes, scales, full
+        self.base_size = self.size = len(ids)
+        self.tombstones = np.zeros(self.base_size, dtype=bool)
+        self.codes = self.scales = self.full = None
+        self.ids = list(ids)
+        self.chunks = list(chunks)
+        self.doc_rows = {}
+        for row, doc_id in enumerate(self.ids):
+            self.doc_rows.setdefault(doc_id, []).append(row)
+
+    def export(self) -> Dict[str, Any]:
+        """Live rows of both segments as dense arrays, in the layout ``attach`` takes"""
+        import numpy as np
+
+        live_base = np.flatnonzero(~self.tombstones) if self.base_size else np.zeros(0, dtype=np.int64)
+        tail_size = self.size - self.base_size
+        rows = live_base.tolist() + list(range(self.base_size, self.size))
+
+        codes, scales, full = [], [], []
+        if len(live_base):
+            codes.append(self.base_codes[live_base])
+            scales.append(self.base_scales[live_base])
+            if self.base_full is not None:
+                full.append(self.base_full[live_base])
+        if tail_size:
+            codes.append(self.codes[:tail_size])
+            scales.append(self.scales[:tail_size])
+            if self.full is not None:
+                full.append(self.full.read_all(tail_size))
+
+        dim = self.dim
+        return {
+            "codes": np.concatenate(codes) if codes else np.zeros((0, dim), dtype=self.dtype),
+            "scales": np.concatenate(scales) if scales else np.zeros(0, dtype=np.float32),
+            "full": np.concatenate(full) if self.rerank_candidates > 0 and full else None,
+            "ids": [self.ids[row] for row in rows],
+            "chunks": [self.chunks[row] for row in rows]
+        }
+
+    def _score_segment(self, codes, scales, count: int, query, out):
+        import numpy as np
+
+        for start in range(0, count, SCORE_BLOCK_ROWS):
+            end = min(start + SCORE_BLOCK_ROWS, count)
+            block = np.asarray(codes[start:end]).astype(np.float32, copy=False)
+            out[start:end] = (block @ query) * scales[start:end]
+
+    def _scores(self, query):
+        import numpy as np
+
+        scores = np.empty(self.size, dtype=np.float32)
+        if self.base_size:
+            self._score_segment(self.base_codes, self.base_scales, self.base_size, query, scores)
+            scores[:self.base_size][self.tombstones] = -np.inf
+        if self.size > self.base_size:
+            self._score_segment(self.codes, self.scales, self.size - self.base_size, query, scores[self.base_size:])
+        return scores
+
+    def _full_rows(self, rows):
+        import numpy as np
+
+        vectors = np.empty((len(rows), self.dim), dtype=np.float32)
+        in_base = rows < self.base_size
+        if in_base.any():
+            vectors[in_base] = self.base_full[rows[in_base]]
+        if (~in_base).any():
+            vectors[~in_base] = self.full.read((rows[~in_base] - self.base_size).tolist())
+        return vectors
+
+    def search(self, embedding: List[float], allowed: Optional[set] = None, limit: int = 50) -> List[Tuple[str, float, int]]:
+        """Top parent documents as (doc_id, best chunk score, best chunk index)"""
+        import numpy as np
+
+        if self.size == 0:
+            return []
+        query = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
+
+        scores = self._scores(query)
+        if allowed is not None:
+            mask = np.fromiter((doc_id in allowed for doc_id in self.ids), dtype=bool, count=self.size)
+            scores = np.where(mask, scores, -np.inf)
+
+        # Over-fetch chunks so that several chunks of one parent cannot crowd out others
+        candidates = min(self.size, max(limit * 4, self.rerank_candidates))
+        top = np.argpartition(-scores, candidates - 1)[:candidates]
+        top = top[np.isfinite(scores[top])]
+
+        can_rerank = self.full is not None or self.base_full is not None
+        if self.rerank_candidates > 0 and can_rerank and len(top):
+            rerank = top[np.argsort(-scores[top])][:self.rerank_candidates]
+            scores[rerank] = self._full_rows(rerank) @ query
+        top = top[np.argsort(-scores[top])]
+
+        results: List[Tuple[str, float, int]] = []
+        seen = set()
+        for row in top:
+            doc_id = self.ids[row]
+            if doc_id in seen:
+                continue
+            seen.add(doc_id)
+            results.append((doc_id, float(scores[row]), self.chunks[row]))
+            if len(results) == limit:
+                break
+        return results
+
+    def close(self):
+        if self.full is not None:
+            self.full.close()
+        # Dropping the references unmaps the base segment
+        self.base_codes = self.base_scales = self.base_full = None
@@ -1,7 +1,13 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
 from app.core.config import settings
+from app.core.lazy import LazyService
+from app.services.cache import LRUCache
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -13,6 +19,43 @@ def get_password_hash(password: str) -> str:
     """Hash a password"""
     return pwd_context.hash(password)
 
+class PasswordHasher:
+    """Runs bcrypt on its own small thread pool.
+
+    A bcrypt round takes 100-250 ms of CPU; on the event loop that would stall
+    every other request, and on the default executor a login burst would
+    queue ahead of Supabase calls. A dedicated pool caps the damage to its own
+    threads.
+    """
+
+    def __init__(self, workers: int):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, verify_password, plain_password, hashed_password)
+
+    async def hash(self, password: str) -> str:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, get_password_hash, password)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+def build_password_hasher() -> PasswordHasher:
+    return PasswordHasher(settings.AUTH_HASH_WORKERS)
+
+# Global instance
+password_hasher: PasswordHasher = LazyService(build_password_hasher, "password_hasher")
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """verify_password off the event loop"""
+    return await password_hasher.verify(plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """get_password_hash off the event loop"""
+    return await password_hasher.hash(password)
+
 def create_access_token(data: dict, expires_delta: timedelta = None):
     """Create a JWT access token"""
     to_encode = data.copy()
@@ -32,3 +75,35 @@ def verify_token(token: str):
         return payload
     except JWTError:
         return None
+
+# Decoded claims of recently seen tokens; built on first use so the size comes from settings
+_token_cache: Optional[LRUCache] = None
+
+def _claims_cache() -> LRUCache:
+    global _token_cache
+    if _token_cache is None:
+        _token_cache = LRUCache(settings.AUTH_TOKEN_CACHE_ENTRIES)
+    return _token_cache
+
+def verify_token_cached(token: str) -> Optional[Dict[str, Any]]:
+    """verify_token with the decoded claims kept in a bounded LRU.
+
+    An entry never outlives the token's ``exp`` (nor AUTH_TOKEN_CACHE_TTL_SECONDS),
+    so an expired token is rejected even if it is still cached. Invalid tokens
+    are not cached.
+    """
+    cache = _claims_cache()
+    claims = cache.get(token)
+    if claims is not None:
+        return claims
+
+    claims = verify_token(token)
+    if claims is None:
+        return None
+
+    ttl = settings.AUTH_TOKEN_CACHE_TTL_SECONDS
+    if "exp" in claims:
+        ttl = min(ttl, float(claims["exp"]) - time.time())
+    if ttl > 0:
+        cache.set(token, claims, ttl)
+    return claims
@@ -16,6 +16,18 @@ CREATE TABLE IF NOT EXISTS conversation_messages (
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+-- Create conversation_archives table (summaries and compressed messages of idle conversations)
+CREATE TABLE IF NOT EXISTS conversation_archives (
+    conversation_id UUID PRIMARY KEY,
+    user_id TEXT,
+    summary TEXT NOT NULL,
+    message_count INTEGER NOT NULL DEFAULT 0,
+    first_message_at TIMESTAMP WITH TIME ZONE,
+    last_message_at TIMESTAMP WITH TIME ZONE,
+    messages TEXT NOT NULL, -- gzipped NDJSON, base64 encoded
+    archived_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
 -- Create user_memory table
 CREATE TABLE IF NOT EXISTS user_memory (
     id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
@@ -37,6 +49,35 @@ CREATE TABLE IF NOT EXISTS scraped_properties (
     metadata JSONB DEFAULT '{}'::jsonb
 );
 
+-- Create ingest_jobs table (checkpoints for resumable scraper ingests)
+CREATE TABLE IF NOT EXISTS ingest_jobs (
+    id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
+    source TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'running' CHECK (status IN ('running', 'failed', 'completed')),
+    records_committed INTEGER NOT NULL DEFAULT 0,
+    counts JSONB DEFAULT '{}'::jsonb,
+    errors JSONB DEFAULT '[]'::jsonb,
+    last_error TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Create usage_rollups table (OpenAI tokens and cost per user, conversation and endpoint)
+CREATE TABLE IF NOT EXISTS usage_rollups (
+    id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
+    period_start TIMESTAMP WITH TIME ZONE NOT NULL,
+    dimension TEXT NOT NULL CHECK (dimension IN ('user', 'conversation', 'endpoint')),
+    key TEXT NOT NULL,
+    calls INTEGER NOT NULL DEFAULT 0,
+    prompt_tokens BIGINT NOT NULL DEFAULT 0,
+    completion_tokens BIGINT NOT NULL DEFAULT 0,
+    cached_tokens BIGINT NOT NULL DEFAULT 0,
+    cost_usd DOUBLE PRECISION NOT NULL DEFAULT 0,
+    seconds DOUBLE PRECISION NOT NULL DEFAULT 0,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
 -- Host Track Tables (Shared with Host Track Dashboard)
 -- Create users table
 CREATE TABLE IF NOT EXISTS users (
@@ -143,7 +184,10 @@ CREATE TABLE IF NOT EXISTS vector_embeddings (
     id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
     content_id UUID NOT NULL,
     content_type TEXT NOT NULL CHECK (content_type IN ('conversation', 'memory', 'property')),
+    chunk_index INTEGER NOT NULL DEFAULT 0,
+    model TEXT NOT NULL DEFAULT 'text-embedding-3-small',
     content TEXT NOT NULL,
+    content_hash TEXT,
     embedding vector(1536), -- OpenAI text-embedding-3-small dimension
     metadata JSONB DEFAULT '{}'::jsonb,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
@@ -153,6 +197,8 @@ CREATE TABLE IF NOT EXISTS vector_embeddings (
 CREATE INDEX IF NOT EXISTS idx_conversation_messages_conversation_id ON conversation_messages(conversation_id);
 CREATE INDEX IF NOT EXISTS idx_conversation_messages_user_id ON conversation_messages(user_id);
 CREATE INDEX IF NOT EXISTS idx_conversation_messages_timestamp ON conversation_messages(timestamp);
+CREATE INDEX IF NOT EXISTS idx_conversation_messages_conversation_timestamp ON conversation_messages(conversation_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_conversation_archives_user_id ON conversation_archives(user_id);
 
 CREATE INDEX IF NOT EXISTS idx_user_memory_user_id ON user_memory(user_id);
 CREATE INDEX IF NOT EXISTS idx_user_memory_category ON user_memory(category);
@@ -161,6 +207,11 @@ CREATE INDEX IF NOT EXISTS idx_user_memory_created_at ON user_memory(created_at)
 CREATE INDEX IF NOT EXISTS idx_scraped_properties_source ON scraped_properties(source);
 CREATE INDEX IF NOT EXISTS idx_scraped_properties_processed_at ON scraped_properties(processed_at);
 
+CREATE INDEX IF NOT EXISTS idx_ingest_jobs_status ON ingest_jobs(status);
+
+CREATE INDEX IF NOT EXISTS idx_usage_rollups_dimension_period ON usage_rollups(dimension, period_start);
+CREATE INDEX IF NOT EXISTS idx_usage_rollups_dimension_key ON usage_rollups(dimension, key);
+
 -- Host Track indexes
 CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);
 CREATE INDEX IF NOT EXISTS idx_users_subscription_tier ON users(subscription_tier);
@@ -189,6 +240,8 @@ CREATE INDEX IF NOT EXISTS idx_performance_metrics_date ON performance_metrics(d
 
 CREATE INDEX IF NOT EXISTS idx_vector_embeddings_content_id ON vector_embeddings(content_id);
 CREATE INDEX IF NOT EXISTS idx_vector_embeddings_content_type ON vector_embeddings(content_type);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_vector_embeddings_chunk_version
+    ON vector_embeddings(content_id, content_type, chunk_index, model);
 
 -- Create vector similarity search index
 CREATE INDEX IF NOT EXISTS idx_vector_embeddings_embedding ON vector_embeddings 
@@ -196,9 +249,12 @@ USING ivfflat (embedding vector_cosine_ops) WITH (lists = 100);
 
 -- Enable Row Level Security (RLS)
 ALTER TABLE conversation_messages ENABLE ROW LEVEL SECURITY;
+ALTER TABLE conversation_archives ENABLE ROW LEVEL SECURITY;
 ALTER TABLE user_memory ENABLE ROW LEVEL SECURITY;
 ALTER TABLE scraped_properties ENABLE ROW LEVEL SECURITY;
 ALTER TABLE vector_embeddings ENABLE ROW LEVEL SECURITY;
+ALTER TABLE ingest_jobs ENABLE ROW LEVEL SECURITY;
+ALTER TABLE usage_rollups ENABLE ROW LEVEL SECURITY;
 
 -- Host Track RLS
 ALTER TABLE users ENABLE ROW LEVEL SECURITY;
@@ -215,6 +271,9 @@ ALTER TABLE performance_metrics ENABLE ROW LEVEL SECURITY;
 CREATE POLICY "Allow all operations on conversation_messages" ON conversation_messages
     FOR ALL USING (true);
 
+CREATE POLICY "Allow all operations on conversation_archives" ON conversation_archives
+    FOR ALL USING (true);
+
 CREATE POLICY "Allow all operations on user_memory" ON user_memory
     FOR ALL USING (true);
 
@@ -224,6 +283,12 @@ CREATE POLICY "Allow all operations on scraped_properties" ON scraped_properties
 CREATE POLICY "Allow all operations on vector_embeddings" ON vector_embeddings
     FOR ALL USING (true);
 
+CREATE POLICY "Allow all operations on ingest_jobs" ON ingest_jobs
+    FOR ALL USING (true);
+
+CREATE POLICY "Allow all operations on usage_rollups" ON usage_rollups
+    FOR ALL USING (true);
+
 -- Host Track RLS policies (for MVP, we'll use simple policies)
 -- In production, you'd want more sophisticated user-based policies
 
@@ -0,0 +1,55 @@
+# Production launcher: gunicorn -c gunicorn.conf.py main:app
+#
+# Runs one uvicorn worker per core. The app and its shared data (market
+# snapshot, vector indexes) are loaded once in the master before forking, so
+# workers share those pages copy-on-write instead of each holding a copy.
+#
+# Rolling reload: `kill -HUP <master pid>` re-runs the preloaders in the master,
+# starts new workers from the refreshed state and gracefully drains the old
+# ones. Deploying new code needs a full restart (or USR2 + QUIT of the old master).
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+
+# Give in-flight chat completions time to finish during reloads and shutdown
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "60"))
+timeout = int(os.getenv("WORKER_TIMEOUT", "120"))
+keepalive = 5
+
+# Recycle workers periodically so slow leaks cannot grow without bound;
+# jitter keeps them from all restarting at once
+max_requests = int(os.getenv("MAX_REQUESTS", "5000"))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", "500"))
+
+accesslog = "-"
+errorlog = "-"
+
+
+def on_starting(server):
+    from app.core.preload import preload_shared_data
+
+    preload_shared_data()
+
+
+def on_reload(server):
+    from app.core.preload import preload_shared_data
+
+    preload_shared_data(force=True)
+
+
+def post_fork(server, worker):
+    # HTTP clients built in the master must not share sockets with workers;
+    # dropping them makes each worker build its own on first use
+    from app.services.openai_client import openai_client
+    from app.services.supabase_client import supabase_client
+    from app.services.db import db
+
+    supabase_client.drop_instance()
+    openai_client.drop_instance()
+    # Threads do not survive fork; the preloaders may have started the query pool
+    db.drop_instance()
+    server.log.info(f"Worker {worker.pid} forked from preloaded master")
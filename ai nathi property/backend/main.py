@@ -1,31 +1,56 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.api import chat, memory, ingest
-from app.core.config import settings
+from fastapi.responses import JSONResponse
+from app.api import chat, memory, ingest, usage
+from app.core.config import get_cors_origins
+from app.core.auth import authenticate
+from app.core.throttle import ThrottleMiddleware
+from app.core.background import start_background_tasks, stop_background_tasks
+from app.core.lazy import close_services
+from app.core.preload import mark_worker_ready, mark_worker_draining, readiness_report
+from app.services.pagination import NEXT_CURSOR_HEADER
+from app.services.usage import usage_ledger
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Workers forked by gunicorn.conf.py inherit preloaded data; a plain
+    # uvicorn process warms itself here instead. Clients are otherwise built
+    # lazily on first use and closed on shutdown.
+    await mark_worker_ready()
+    start_background_tasks()
+    yield
+    mark_worker_draining()
+    await stop_background_tasks()
+    # Usage recorded since the last periodic flush
+    await usage_ledger.flush()
+    close_services()
 
 app = FastAPI(
     title="AI Nathi Property API",
     description="AI-powered property portfolio management chat API",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+# Throttling runs inside CORS so 429 responses still carry CORS headers
+app.add_middleware(ThrottleMiddleware)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=[
-        settings.FRONTEND_URL,
-        "http://localhost:3000",  # Local development
-        "http://localhost:5000"   # Alternative local port
-    ],
+    allow_origins=get_cors_origins(),
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 # Include routers
-app.include_router(chat.router, prefix="/api/chat", tags=["chat"])
-app.include_router(memory.router, prefix="/api/memory", tags=["memory"])
-app.include_router(ingest.router, prefix="/api/ingest", tags=["ingest"])
+app.include_router(chat.router, prefix="/api/chat", tags=["chat"], dependencies=[Depends(authenticate)])
+app.include_router(memory.router, prefix="/api/memory", tags=["memory"], dependencies=[Depends(authenticate)])
+app.include_router(ingest.router, prefix="/api/ingest", tags=["ingest"], dependencies=[Depends(authenticate)])
+app.include_router(usage.router, prefix="/api/usage", tags=["usage"], dependencies=[Depends(authenticate)])
 
 @app.get("/")
 async def root():
@@ -35,6 +60,12 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/ready")
+async def readiness_check():
+    """Per-worker readiness: 503 until this worker has finished warming up"""
+    report = readiness_report()
+    return JSONResponse(status_code=200 if report["ready"] else 503, content=report)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
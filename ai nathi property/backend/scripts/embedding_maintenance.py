@@ -0,0 +1,38 @@
+"""Run embedding maintenance jobs outside the API process.
+
+Usage (from the backend directory):
+    python scripts/embedding_maintenance.py gc
+    python scripts/embedding_maintenance.py reembed [--limit 1000]
+
+``reembed`` re-embeds every memory and property whose vectors were made by
+an older model than EMBEDDING_MODEL; run ``gc`` afterwards to drop the
+superseded vectors.
+"""
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import main  # noqa: E402,F401  Registers the content sources declared by the routers
+from app.services.embedding_store import embedding_store  # noqa: E402
+
+
+def run() -> int:
+    parser = argparse.ArgumentParser(description="Embedding maintenance jobs")
+    parser.add_argument("job", choices=["gc", "reembed"])
+    parser.add_argument("--limit", type=int, default=None, help="Maximum contents to re-embed")
+    args = parser.parse_args()
+
+    if args.job == "gc":
+        report = asyncio.run(embedding_store.collect_garbage())
+        print(f"Removed embeddings for {report['orphaned']} orphaned and {report['superseded']} superseded contents")
+    else:
+        count = asyncio.run(embedding_store.reembed_stale(limit=args.limit))
+        print(f"Re-embedded {count} contents")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(run())
@@ -0,0 +1,73 @@
+"""Import-time report for the API entry point.
+
+Runs ``python -X importtime -c "import main"`` in a clean interpreter with no
+application settings, prints the slowest imports, and exits non-zero if a
+heavy dependency is imported eagerly or the total exceeds the budget.
+
+Usage (from the backend directory):
+    python scripts/import_report.py [--top 15] [--budget-ms 1500]
+"""
+import argparse
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import List, Tuple
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Modules that must only be imported on first use, never at startup
+DEFERRED_MODULES = ["pandas", "numpy", "pyarrow", "openai", "supabase", "postgrest", "gotrue"]
+# Total import time allowed for main, in milliseconds
+IMPORT_BUDGET_MS = 1500.0
+
+
+def collect_import_times(module: str = "main") -> List[Tuple[str, int, int]]:
+    """Return (module, self_us, cumulative_us) for every import made by ``module``"""
+    env = {key: value for key, value in os.environ.items() if key in ("PATH", "HOME", "PYTHONPATH")}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed without settings:\n{result.stderr}")
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--budget-ms", type=float, default=IMPORT_BUDGET_MS)
+    args = parser.parse_args()
+
+    rows = collect_import_times()
+    total_ms = next(cumulative for name, _, cumulative in rows if name == "main") / 1000
+
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for name, self_us, cumulative_us in sorted(rows, key=lambda row: row[2], reverse=True)[:args.top]:
+        print(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>9.1f}  {name}")
+    print(f"\nTotal import time for main: {total_ms:.0f} ms (budget {args.budget_ms:.0f} ms)")
+
+    eager = sorted({name for name, _, _ in rows if name.split(".")[0] in DEFERRED_MODULES})
+    failed = False
+    if eager:
+        print(f"FAIL: heavy modules imported at startup: {', '.join(eager)}")
+        failed = True
+    if total_ms > args.budget_ms:
+        print("FAIL: import time over budget")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,19 @@
+"""Startup import budget for the API entry point (see scripts/import_report.py)"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+from import_report import DEFERRED_MODULES, IMPORT_BUDGET_MS, collect_import_times
+
+
+def test_main_imports_within_budget():
+    rows = collect_import_times()
+    total_ms = next(cumulative for name, _, cumulative in rows if name == "main") / 1000
+    assert total_ms <= IMPORT_BUDGET_MS, f"import main took {total_ms:.0f} ms (budget {IMPORT_BUDGET_MS:.0f} ms)"
+
+
+def test_heavy_dependencies_are_deferred():
+    rows = collect_import_times()
+    eager = sorted({name for name, _, _ in rows if name.split(".")[0] in DEFERRED_MODULES})
+    assert not eager, f"imported at startup: {', '.join(eager)}"
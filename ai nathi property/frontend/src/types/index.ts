@@ -30,6 +30,10 @@ export interface IngestResponse {
   message: string;
   records_processed: number;
   records_stored: number;
+  records_new?: number;
+  records_updated?: number;
+  records_unchanged?: number;
+  job_id?: string;
   errors: string[];
 }
 